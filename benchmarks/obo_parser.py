@@ -0,0 +1,35 @@
+""" Compare the legacy regex OBO parser (obo_node_buffer_iter) to the chunked one (obo_stanza_iter)
+
+usage (from the repository root): python -m benchmarks.obo_parser path/to/go-basic.obo [repeats]
+
+Reports the best parsing time of each parser over repeats and checks that both yield
+the same records for the fields used to build the GO_tree.
+"""
+import sys, time
+from obogo.io_obo import obo_node_buffer_iter, obo_stanza_iter
+
+STRUCTURAL_KEYS = ('id', 'name', 'namespace', 'alt_id', 'is_a', 'is_obsolete', 'replaced_by', 'consider')
+
+def parse(parser, obo_file_path):
+    records = []
+    start = time.perf_counter()
+    with open(obo_file_path, 'r') as fp:
+        for buffer in parser(fp):
+            records.append({ k : buffer[k] for k in STRUCTURAL_KEYS if k in buffer })
+    return time.perf_counter() - start, records
+
+if __name__ == "__main__":
+    obo_file_path = sys.argv[1]
+    repeats       = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    timings = {}
+    records = {}
+    for parser in (obo_node_buffer_iter, obo_stanza_iter):
+        runs = [ parse(parser, obo_file_path) for _ in range(repeats) ]
+        timings[parser.__name__] = min(t for t, _ in runs)
+        records[parser.__name__] = runs[0][1]
+        print(f"{parser.__name__:<22} {len(records[parser.__name__])} terms in {timings[parser.__name__]:.3f}s")
+
+    old, new = records['obo_node_buffer_iter'], records['obo_stanza_iter']
+    mismatches = sum(1 for o, n in zip(old, new) if o != n) + abs(len(old) - len(new))
+    print(f"speedup x{timings['obo_node_buffer_iter'] / timings['obo_stanza_iter']:.2f}, {mismatches} mismatching terms")
@@ -0,0 +1,70 @@
+""" Throughput of the async ORA service against naive per-request calls
+
+usage (from the repository root):
+    python -m benchmarks.service [--terms 5000] [--proteins 4000] [--clients 32] [--requests 8]
+                                 [--samples 16] [--workers 4] [--seed 0]
+
+Simulated clients concurrently request score_ora_table for samples drawn from a pool of distinct
+samples, so that some requests are identical, as when several users look at the same dataset.
+The naive server runs every request in a thread pool executor, the OraService one coalesces
+identical in-flight requests and caches results. Both report their requests per second.
+"""
+import argparse, asyncio, os, random, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+
+from obogo.tree import reader
+from obogo.statistics import score_ora_table
+from obogo.service import OraService
+from .synthetic import make_obo, make_proteins
+
+async def run_clients(score, requests:list[list]):
+    """ one task per client, each one awaiting its requests in turn; returns the elapsed time """
+    async def client(samples):
+        for sample in samples:
+            await score(sample)
+    start = time.perf_counter()
+    await asyncio.gather(*[ client(samples) for samples in requests ])
+    return time.perf_counter() - start
+
+async def naive(tree, requests:list[list], workers:int)->float:
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return await run_clients(lambda sample: loop.run_in_executor(executor, score_ora_table, tree, sample), requests)
+
+async def service(tree, requests:list[list], workers:int)->tuple[float, OraService]:
+    async with OraService(tree, max_workers=workers) as ora_service:
+        return await run_clients(ora_service.score_ora_table, requests), ora_service
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="obogo async ORA service benchmark")
+    parser.add_argument("--terms",    type=int, default=5000)
+    parser.add_argument("--proteins", type=int, default=4000)
+    parser.add_argument("--clients",  type=int, default=32)
+    parser.add_argument("--requests", type=int, default=8, help="requests per client")
+    parser.add_argument("--samples",  type=int, default=16, help="number of distinct samples requested")
+    parser.add_argument("--workers",  type=int, default=4, help="executor threads")
+    parser.add_argument("--seed",     type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        obo_file_path = os.path.join(tmp_dir, "synthetic.obo")
+        go_ids   = make_obo(obo_file_path, n_terms=args.terms, seed=args.seed)
+        proteins = make_proteins(go_ids, n_proteins=args.proteins, seed=args.seed)
+        tree = reader(obo_file_path)
+    tree.load_proteins("background", proteins)
+    tree.load_proteins("measured", proteins[: args.proteins // 4])
+    tree.percolate()
+    score_ora_table(tree, []) # population matrix, shared by both servers
+
+    rng      = random.Random(args.seed)
+    measured = [ p.id for p in proteins[: args.proteins // 4] ]
+    pool     = [ rng.sample(measured, len(measured) // 10) for _ in range(args.samples) ]
+    requests = [ [ rng.choice(pool) for _ in range(args.requests) ] for _ in range(args.clients) ]
+    n_requests = args.clients * args.requests
+
+    naive_s = asyncio.run(naive(tree, requests, args.workers))
+    service_s, ora_service = asyncio.run(service(tree, requests, args.workers))
+    print(f"naive    {n_requests / naive_s:8.1f} requests/s ({naive_s:.2f}s)")
+    print(f"service  {n_requests / service_s:8.1f} requests/s ({service_s:.2f}s), "
+          f"{ora_service.computed} computed, {ora_service.coalesced} coalesced, {ora_service.cache.hits} cache hits")
+    print(f"speedup x{naive_s / service_s:.2f}")
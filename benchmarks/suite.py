@@ -0,0 +1,170 @@
+""" Benchmark suite of the GO_tree pipeline on synthetic data
+
+usage (from the repository root):
+    python -m benchmarks.suite [--terms 5000] [--proteins 4000] [--repeats 3] [--compact] [--profile]
+                               [--depth 12] [--fan-in 3] [--alias-ratio 0.05] [--obsolete-ratio 0.02]
+                               [--output results.json] [--baseline baseline.json] [--tolerance 1.25]
+
+The synthetic ontology shape is set by --depth, --fan-in, --alias-ratio and --obsolete-ratio
+(see benchmarks.synthetic.make_obo).
+Each step of the pipeline (reader, load_proteins, percolate, get_proteins, compute_node_ora,
+score_ora_tree and its vectorized score_ora_table counterpart) is timed over repeats, on a
+freshly prepared tree, and its peak memory is measured with tracemalloc in a separate run
+so that tracing does not bias timings. With --profile, one more run is made with obogo.profiling
+enabled, and the counters of each step (eg: get_go_node calls, set unions, Fisher tests) are reported
+along with its timings.
+The memory retained by the protein populations of a loaded and percolated tree is reported for
+both storages (python sets and compact ProteinSet), as traced allocations and as pickled size.
+Results are written as JSON. When a baseline results file is provided, steps slower than
+tolerance x their baseline time are reported as regressions and the exit code is 1.
+"""
+import argparse, json, os, pickle, platform, random, sys, tempfile, time, tracemalloc
+
+from obogo import profiling
+from obogo.tree import reader
+from obogo.statistics import compute_node_ora, score_ora_tree, score_ora_table
+from .synthetic import make_obo, make_proteins
+
+def measure(setup, run, repeats=3, profile=False)->dict:
+    """ best and median wall time of run(setup()) over repeats, then peak traced memory of one more run
+        profile: add the obogo.profiling counters of yet another run
+    """
+    timings = []
+    for _ in range(repeats):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        timings.append(time.perf_counter() - start)
+    state = setup()
+    tracemalloc.start()
+    run(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    timings.sort()
+    result = { "best_s" : timings[0], "median_s" : timings[len(timings) // 2], "peak_bytes" : peak }
+    if profile:
+        state = setup()
+        with profiling.profiled() as stats:
+            run(state)
+        result["counters"] = dict(stats.counters)
+    return result
+
+def population_memory(obo_file_path:str, proteins:list, measured:list)->dict:
+    """ bytes retained by the protein populations (load_proteins then percolate) of a tree read from
+        obo_file_path, stored as python sets and as compact ProteinSet, along with the pickled tree size
+    """
+    memory = {}
+    for storage, compact in ( ("sets", False), ("compact", True) ):
+        tree = reader(obo_file_path, compact=compact)
+        tree.closure # built beforehand, it is not part of the populations
+        tracemalloc.start()
+        tree.load_proteins("background", proteins)
+        tree.load_proteins("measured", measured)
+        tree.percolate()
+        retained, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memory[storage] = { "retained_bytes" : retained,
+                            "pickle_bytes"   : len(pickle.dumps(tree, protocol=pickle.HIGHEST_PROTOCOL)) }
+    return memory
+
+def run_suite(n_terms=5000, n_proteins=4000, repeats=3, compact=False, n_queries=200, seed=0,
+              depth=12, fan_in=3, alias_ratio=0.05, obsolete_ratio=0.02, profile=False)->dict:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        obo_file_path = os.path.join(tmp_dir, "synthetic.obo")
+        go_ids   = make_obo(obo_file_path, n_terms=n_terms, depth=depth, fan_in=fan_in,
+                            alias_ratio=alias_ratio, obsolete_ratio=obsolete_ratio, seed=seed)
+        proteins = make_proteins(go_ids, n_proteins=n_proteins, seed=seed)
+        measured = proteins[: n_proteins // 4]
+        rng      = random.Random(seed)
+        queries  = rng.sample(go_ids, min(n_queries, len(go_ids)))
+        delta    = [ p.id for p in rng.sample(measured, len(measured) // 10) ]
+
+        def new_tree():
+            return reader(obo_file_path, compact=compact)
+        def loaded_tree():
+            tree = new_tree()
+            tree.load_proteins("background", proteins)
+            tree.load_proteins("measured", measured)
+            return tree
+        def percolated_tree():
+            tree = loaded_tree()
+            tree.percolate()
+            return tree
+        def load(tree):
+            tree.load_proteins("background", proteins)
+            tree.load_proteins("measured", measured)
+        def get_proteins(tree):
+            for go_id in queries:
+                tree.get_proteins(go_id, "background")
+        def node_ora(tree):
+            for go_id in queries:
+                compute_node_ora(tree, delta, go_id)
+
+        shared = percolated_tree()
+        steps = { "reader"           : measure(lambda: None,    lambda _: new_tree(),                   repeats, profile),
+                  "load_proteins"    : measure(new_tree,        load,                                   repeats, profile),
+                  "percolate"        : measure(loaded_tree,     lambda tree: tree.percolate(),          repeats, profile),
+                  "get_proteins"     : measure(lambda: shared,  get_proteins,                           repeats, profile),
+                  "compute_node_ora" : measure(lambda: shared,  node_ora,                               repeats, profile),
+                  "score_ora_tree"   : measure(lambda: shared,  lambda tree: list(score_ora_tree(tree, delta)), repeats, profile),
+                  "score_ora_table"  : measure(lambda: shared,  lambda tree: score_ora_table(tree, delta),      repeats, profile) }
+        memory = population_memory(obo_file_path, proteins, measured)
+
+    return { "config" : { "n_terms" : n_terms, "n_proteins" : n_proteins, "repeats" : repeats,
+                          "compact" : compact, "n_queries" : n_queries, "seed" : seed,
+                          "depth" : depth, "fan_in" : fan_in, "alias_ratio" : alias_ratio, "obsolete_ratio" : obsolete_ratio },
+             "tree"   : { "nodes" : len(shared), "edges" : shared.number_of_edges() },
+             "python" : platform.python_version(),
+             "steps"  : steps,
+             "memory" : memory }
+
+def compare(results:dict, baseline:dict, tolerance=1.25)->list[str]:
+    """ names of the steps whose best time exceeds tolerance x the baseline one """
+    if results["config"] != baseline["config"]:
+        sys.stderr.write("Warning: baseline was run with a different configuration\n")
+    regressions = []
+    for step, r in results["steps"].items():
+        if not step in baseline["steps"]:
+            continue
+        ratio = r["best_s"] / baseline["steps"][step]["best_s"]
+        mem_ratio = r["peak_bytes"] / max(1, baseline["steps"][step]["peak_bytes"])
+        flag = "REGRESSION" if ratio > tolerance else ""
+        print(f"{step:<18} time x{ratio:.2f}  memory x{mem_ratio:.2f}  {flag}")
+        if ratio > tolerance:
+            regressions.append(step)
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="obogo benchmark suite on synthetic ontologies and proteomes")
+    parser.add_argument("--terms",     type=int,   default=5000)
+    parser.add_argument("--proteins",  type=int,   default=4000)
+    parser.add_argument("--repeats",   type=int,   default=3)
+    parser.add_argument("--queries",   type=int,   default=200, help="number of terms queried by get_proteins and compute_node_ora")
+    parser.add_argument("--seed",      type=int,   default=0)
+    parser.add_argument("--depth",          type=int,   default=12)
+    parser.add_argument("--fan-in",         type=int,   default=3, help="maximal number of is_a parents of a term")
+    parser.add_argument("--alias-ratio",    type=float, default=0.05)
+    parser.add_argument("--obsolete-ratio", type=float, default=0.02)
+    parser.add_argument("--compact",   action="store_true", help="compact protein storage (sorted positions over a protein index, bitmaps when dense)")
+    parser.add_argument("--profile",   action="store_true", help="report obogo.profiling counters of each step")
+    parser.add_argument("--output",    help="JSON results file")
+    parser.add_argument("--baseline",  help="JSON results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    results = run_suite(args.terms, args.proteins, args.repeats, args.compact, args.queries, args.seed,
+                        args.depth, args.fan_in, args.alias_ratio, args.obsolete_ratio, args.profile)
+    for step, r in results["steps"].items():
+        print(f"{step:<18} best {r['best_s']:.4f}s  median {r['median_s']:.4f}s  peak {r['peak_bytes'] / 2**20:.1f}MB")
+        if "counters" in r:
+            print("    " + "  ".join( f"{name}={value}" for name, value in sorted(r["counters"].items()) ))
+    for storage, m in results["memory"].items():
+        print(f"{storage + ' populations':<20} retained {m['retained_bytes'] / 2**20:.1f}MB  pickled tree {m['pickle_bytes'] / 2**20:.1f}MB")
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(results, fp, indent=2)
+    if args.baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
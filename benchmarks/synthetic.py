@@ -0,0 +1,81 @@
+""" Synthetic ontologies and proteomes for the benchmarks
+
+make_obo writes a GO-like OBO file: three namespaces, each a layered DAG where terms get
+their is_a parents from the few levels above them. A fraction of the terms carry alt_id
+aliases, another one is made obsolete (with a replaced_by or consider forward).
+make_proteins draws UniprotDatum records annotated with random valid terms.
+Both are seeded, so that the same parameters always produce the same data.
+"""
+import random
+from uniprot_redis.store.schemas import UniprotDatum, GODatum
+
+NAMESPACES = ("biological_process", "molecular_function", "cellular_component")
+
+def make_obo(file_path:str, n_terms=5000, depth=12, fan_in=3, alias_ratio=0.05, obsolete_ratio=0.02, seed=0)->list[str]:
+    """ Write a synthetic OBO file, returns the identifiers of its valid (non obsolete) terms
+        depth: maximal number of levels below each namespace root
+        fan_in: maximal number of is_a parents of a term, most terms have a single one
+    """
+    rng      = random.Random(seed)
+    go_ids   = [ f"GO:{i:07d}" for i in range(1, n_terms + 1) ]
+    n_alias  = int(n_terms * alias_ratio)
+    alt_ids  = iter( f"GO:{i:07d}" for i in range(n_terms + 1, n_terms + 1 + n_alias) )
+    levels   = {} # (namespace, level) -> term ids
+    valid    = []
+    lines    = [ "format-version: 1.2", "ontology: go", "" ]
+    for i, go_id in enumerate(go_ids):
+        i_ns  = i % len(NAMESPACES)
+        level = 0 if i < len(NAMESPACES) else min(depth, 1 + int(rng.expovariate(0.35)))
+        lines += [ "[Term]", f"id: {go_id}", f"name: synthetic term {i}", f"namespace: {NAMESPACES[i_ns]}",
+                   f"def: \"Synthetic definition of term {i}.\" [GOC:bench]" ]
+        if level and valid and rng.random() < obsolete_ratio:
+            lines += [ "is_obsolete: true" ]
+            if rng.random() < 0.5:
+                lines += [ f"replaced_by: {rng.choice(valid)}" ]
+            else:
+                lines += [ f"consider: {consider_id}" for consider_id in set(rng.sample(valid, min(len(valid), 3))) ]
+            lines += [ "" ]
+            continue
+        if rng.random() < alias_ratio:
+            alt_id = next(alt_ids, None)
+            if not alt_id is None:
+                lines += [ f"alt_id: {alt_id}" ]
+        if level:
+            n_parents = 1 if rng.random() < 0.6 else rng.randint(1, fan_in)
+            parents   = set()
+            for _ in range(n_parents):
+                parent_level = rng.randint(max(0, level - 3), level - 1)
+                while not levels.get((i_ns, parent_level)):
+                    parent_level -= 1
+                parents.add(rng.choice(levels[(i_ns, parent_level)]))
+            lines += [ f"is_a: {parent_id} ! synthetic parent" for parent_id in sorted(parents) ]
+        levels.setdefault((i_ns, level), []).append(go_id)
+        valid.append(go_id)
+        lines += [ "" ]
+    lines += [ "[Typedef]", "id: part_of", "name: part of", "" ]
+
+    with open(file_path, "w") as fp:
+        fp.write("\n".join(lines))
+    return valid
+
+_ALNUM = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+def synthetic_accession(i:int)->str:
+    """ i-th accession of the Q[0-9][A-Z0-9]{3}[0-9] uniprot pattern """
+    i, last = divmod(i, 10)
+    i, c3   = divmod(i, 36)
+    i, c2   = divmod(i, 36)
+    i, c1   = divmod(i, 36)
+    return f"Q{i % 10}{_ALNUM[c1]}{_ALNUM[c2]}{_ALNUM[c3]}{last}"
+
+def make_proteins(go_ids:list[str], n_proteins=4000, max_annotations=8, seed=0)->list[UniprotDatum]:
+    """ UniprotDatum records, each annotated with 1 to max_annotations random terms of go_ids """
+    rng = random.Random(seed)
+    proteins = []
+    for i in range(n_proteins):
+        annotations = rng.sample(go_ids, rng.randint(1, max_annotations))
+        proteins.append( UniprotDatum(id=synthetic_accession(i), full_name=f"synthetic protein {i}", name=f"SYN{i}_BENCH",
+                                      gene_name=None, taxid=0, sequence="M", subcellular_location=[],
+                                      review_level="TrEMBL", keywords=[],
+                                      go=[ GODatum(id=go_id, evidence="IEA", term="synthetic") for go_id in annotations ]) )
+    return proteins
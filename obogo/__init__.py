@@ -1 +1,3 @@
 from .tree import reader as create_tree_from_obo
+from .tree import namespace_trees
+from .snapshot import save_tree, load_tree, load_population
@@ -0,0 +1,81 @@
+""" Streaming readers of protein GO annotations
+
+Each reader yields (uniprot AC, [GO identifiers]) records, one at a time, to be fed to
+GO_tree.load_annotations. Only the accession and the GO identifiers are extracted, so that
+large proteomes can be loaded without building UniprotDatum collections first.
+Files ending with .gz are transparently decompressed.
+"""
+from typing import Iterator, TextIO
+import gzip
+import xml.etree.ElementTree as ET
+
+from uniprot_redis.store.schemas import UniprotAC
+
+AnnotationRecord = tuple[UniprotAC, list[str]]
+
+UNIPROT_NS = "{http://uniprot.org/uniprot}"
+
+def _open(file_path:str, mode="rt"):
+    if file_path.endswith(".gz"):
+        return gzip.open(file_path, mode)
+    return open(file_path, mode)
+
+def iter_uniprot_xml(file_path:str)->Iterator[AnnotationRecord]:
+    """ UniProt XML entries, the primary (first) accession of each entry is used
+        Entries are cleared once read so that memory does not grow with the file size
+    """
+    with _open(file_path, "rb") as fp:
+        context = ET.iterparse(fp, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event != "end" or elem.tag != f"{UNIPROT_NS}entry":
+                continue
+            accession = elem.find(f"{UNIPROT_NS}accession")
+            go_ids = [ ref.get("id") for ref in elem.iter(f"{UNIPROT_NS}dbReference") if ref.get("type") == "GO" ]
+            if not accession is None:
+                yield accession.text, go_ids
+            elem.clear()
+            root.clear()
+
+def iter_uniprot_tsv(file_path:str, ac_column="Entry", go_column="Gene Ontology IDs")->Iterator[AnnotationRecord]:
+    """ UniProt TSV export, as obtained from the uniprot website with the "Gene Ontology IDs" column
+        GO identifiers are "; " separated in their column
+    """
+    with _open(file_path) as fp:
+        header = fp.readline().rstrip("\n").split("\t")
+        for column in (ac_column, go_column):
+            if not column in header:
+                raise ValueError(f"{file_path} has no \"{column}\" column")
+        i_ac, i_go = header.index(ac_column), header.index(go_column)
+        for line in fp:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) <= max(i_ac, i_go):
+                continue
+            go_ids = [ go_id.strip() for go_id in fields[i_go].split(";") if go_id.strip() ]
+            yield fields[i_ac], go_ids
+
+def iter_gaf(file_path:str, db="UniProtKB")->Iterator[AnnotationRecord]:
+    """ GO Annotation File (GAF 2.x), one record per annotation line
+        NOT qualified annotations are skipped, as well as objects from other databases than db
+    """
+    with _open(file_path) as fp:
+        for line in fp:
+            if line.startswith("!"):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 5 or fields[0] != db:
+                continue
+            if "NOT" in fields[3].split("|"):
+                continue
+            yield fields[1], [ fields[4] ]
+
+def iter_annotations(file_path:str)->Iterator[AnnotationRecord]:
+    """ Pick the reader from the file extension: .xml, .tsv/.tab, .gaf (optionally .gz) """
+    name = file_path[:-3] if file_path.endswith(".gz") else file_path
+    if name.endswith(".xml"):
+        return iter_uniprot_xml(file_path)
+    if name.endswith((".tsv", ".tab")):
+        return iter_uniprot_tsv(file_path)
+    if name.endswith(".gaf"):
+        return iter_gaf(file_path)
+    raise ValueError(f"Can not guess the annotation format of {file_path}")
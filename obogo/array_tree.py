@@ -0,0 +1,424 @@
+""" Array backed GO tree
+
+ArrayGOTree is an alternative to the networkx based GO_tree, for processes holding several
+ontologies in memory. Terms get integer ids, the DAG is stored as CSR parent -> children and
+child -> parents arrays, and term attributes (name, namespace, proteins, ...) as one column
+per attribute. Alias ids are entries of a lookup table instead of ghost nodes.
+
+Nodes are accessed through TermView, a mutable mapping over the attribute columns of one term,
+so that functions written for GO_tree node dictionaries (eg: obogo.statistics) work unchanged.
+The topology is fixed once built, to_networkx converts to a GO_tree on demand.
+"""
+from collections import Counter
+from collections.abc import MutableMapping
+from typing import Iterable, Iterator, Union, get_args
+import threading
+import numpy as np
+
+from .io_obo import obo_stanza_iter
+from .proteins import ProteinIndex
+from .type_checkers import literal_arg_checker
+from . import profiling
+from .tree import GO_tree, NodeID, NodeName, ProteinsType, PercolateType, _Obsolete, _as_set, _keep_stanza
+
+class TermView(MutableMapping):
+    """ dict-like view of the attributes of one term of an ArrayGOTree """
+    __slots__ = ("tree", "i")
+
+    def __init__(self, tree:"ArrayGOTree", i:int):
+        self.tree = tree
+        self.i    = i
+
+    def __getitem__(self, k):
+        if k == '_id':
+            return self.tree.ids[self.i]
+        column = self.tree.columns.get(k)
+        if column is None or column[self.i] is None:
+            raise KeyError(k)
+        return column[self.i]
+
+    def __setitem__(self, k, v):
+        if k == '_id':
+            raise KeyError("term identifiers are read-only")
+        if not k in self.tree.columns:
+            self.tree.columns[k] = [ None ] * len(self.tree.ids)
+        self.tree.columns[k][self.i] = v
+
+    def __delitem__(self, k):
+        column = self.tree.columns.get(k)
+        if k == '_id' or column is None or column[self.i] is None:
+            raise KeyError(k)
+        column[self.i] = None
+
+    def __contains__(self, k):
+        if k == '_id':
+            return True
+        column = self.tree.columns.get(k)
+        return not column is None and not column[self.i] is None
+
+    def __iter__(self):
+        yield '_id'
+        for k, column in self.tree.columns.items():
+            if not column[self.i] is None:
+                yield k
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __eq__(self, other):
+        if isinstance(other, TermView):
+            return self.tree is other.tree and self.i == other.i
+        return dict(self) == other
+
+    def __hash__(self):
+        return hash((id(self.tree), self.i))
+
+    def __repr__(self):
+        return repr(dict(self))
+
+class ArrayGOTree:
+    """ GO tree over integer term ids, CSR adjacency arrays and columnar attributes
+        Offers the public methods of GO_tree (get_go_node, successors, concrete_nodes, load_proteins,
+        percolate, get_proteins, ...), but not the networkx graph API nor the incremental
+        add/remove of proteins. Use to_networkx for those.
+    """
+    def __init__(self, compact=False):
+        self.ids           = []   # term index -> GO identifier
+        self.index         = {}   # GO identifier -> term index
+        self.aliases       = {}   # alt_id -> term index
+        self.columns       = {}   # attribute -> list of values over the term index, None if absent
+        self.relationships = []   # relationship code -> relationship name
+        self.children_indptr  = np.zeros(1, dtype=np.int32)
+        self.children_indices = np.zeros(0, dtype=np.int32)
+        self.children_types   = np.zeros(0, dtype=np.int8)
+        self.parents_indptr   = np.zeros(1, dtype=np.int32)
+        self.parents_indices  = np.zeros(0, dtype=np.int32)
+        self.order         = np.zeros(0, dtype=np.int32) # topological order, parents first
+
+        self.version     = 0
+        self._resolution = None
+        self._cache      = {}
+        self._cache_lock = threading.Lock()
+        self._cache_version = 0
+        self.protein_index       = ProteinIndex() if compact else None
+        self.protein_load_status = (False, False)
+        self.percolated_status   = (False, False)
+        self.uniprot_omega       = (self.new_protein_set(), self.new_protein_set())
+        self.names_index = {}
+        self.slim_map    = {}
+        self.obsolete_warnings = Counter()
+
+    # term resolution and protein loading only rely on node views, they are shared with GO_tree
+    compact           = GO_tree.compact
+    new_protein_set   = GO_tree.new_protein_set
+    get_go_node       = GO_tree.get_go_node
+    resolve_many      = GO_tree.resolve_many
+    _resolve_obsolete = GO_tree._resolve_obsolete
+    _warn_obsolete    = GO_tree._warn_obsolete
+    view_go_node      = GO_tree.view_go_node
+    load_proteins     = GO_tree.load_proteins
+    load_annotations  = GO_tree.load_annotations
+    _attach_protein   = GO_tree._attach_protein
+    _annotation_nodes = GO_tree._annotation_nodes
+    ora_rdy           = GO_tree.ora_rdy
+    _changed          = GO_tree._changed
+    cached            = GO_tree.cached
+    __getstate__      = GO_tree.__getstate__
+    __setstate__      = GO_tree.__setstate__
+
+    @classmethod
+    def from_records(cls, records:Iterable, relationships_to_consider=['is_a'], compact=False)->"ArrayGOTree":
+        """ Build from parsed OBO stanzas (io_obo.Buffer)
+            Relationships toward terms absent from the records are dropped, alt_ids are resolved.
+        """
+        tree  = cls(compact=compact)
+        edges = []
+        for node_buffer in records:
+            i = tree._add_term(node_buffer['id'], node_buffer.nx_node_param)
+            for relationship, node_parents in node_buffer.relationship_iter(relationships_to_consider).items():
+                for node_parent_id in node_parents:
+                    edges.append( (node_parent_id, i, relationship) )
+        tree._set_edges( (tree.index.get(parent_id, tree.aliases.get(parent_id)), i, relationship)
+                         for parent_id, i, relationship in edges )
+        return tree
+
+    @classmethod
+    def from_networkx(cls, G:GO_tree)->"ArrayGOTree":
+        """ Build from a GO_tree, proteins and populations are shared with it rather than copied """
+        tree = cls()
+        tree.protein_index = G.protein_index
+        for node_id, n_dict in G.nodes.items():
+            if not "alias_to" in n_dict:
+                tree._add_term(node_id, { k : v for k, v in n_dict.items() if k != '_id' })
+        for node_id, n_dict in G.nodes.items():
+            if "alias_to" in n_dict:
+                tree.aliases[node_id] = tree.index[ n_dict["alias_to"]["_id"] ]
+        tree._set_edges( (tree.index[u], tree.index[v], e_dict.get("type")) for u, v, e_dict in G.edges(data=True)
+                         if u in tree.index and v in tree.index )
+        tree.slim_map            = G.slim_map
+        tree.uniprot_omega       = G.uniprot_omega
+        tree.protein_load_status = G.protein_load_status
+        tree.percolated_status   = G.percolated_status
+        return tree
+
+    def to_networkx(self)->GO_tree:
+        """ GO_tree copy of the tree, proteins and populations are shared rather than copied """
+        G = GO_tree()
+        G.protein_index = self.protein_index
+        for i, node_id in enumerate(self.ids):
+            G.add_node(node_id, **dict(self.node(i)))
+        G.add_edges_from( (self.ids[i], self.ids[j], { "type" : self.relationships[t] })
+                          for i, j, t in self._edges() )
+        G.slim_map            = self.slim_map
+        G.uniprot_omega       = self.uniprot_omega
+        G.protein_load_status = self.protein_load_status
+        G.percolated_status   = self.percolated_status
+        return G
+
+    def _add_term(self, node_id:NodeID, params:dict)->int:
+        i = len(self.ids)
+        self.ids.append(node_id)
+        self.index[node_id] = i
+        for column in self.columns.values():
+            column.append(None)
+        node = self.node(i)
+        for k, v in params.items():
+            if k != '_id':
+                node[k] = v
+        if 'name' in params:
+            self.names_index[ params['name'] ] = node_id
+        if 'alt_id' in params:
+            for alt_id in params['alt_id'] if type(params['alt_id']) is list else [ params['alt_id'] ]:
+                self.aliases[alt_id] = i
+        return i
+
+    def _set_edges(self, edges:Iterable[tuple[int, int, str]]):
+        """ CSR adjacency arrays and topological order from (parent, child, relationship) triplets """
+        edges = [ (i, j, relationship) for i, j, relationship in edges if not i is None ]
+        for _, _, relationship in edges:
+            if not relationship in self.relationships:
+                self.relationships.append(relationship)
+        n = len(self.ids)
+        parents  = np.array([ i for i, _, _ in edges ], dtype=np.int32)
+        children = np.array([ j for _, j, _ in edges ], dtype=np.int32)
+        types    = np.array([ self.relationships.index(r) for _, _, r in edges ], dtype=np.int8)
+
+        by_parent = np.lexsort((children, parents))
+        self.children_indices = children[by_parent]
+        self.children_types   = types[by_parent]
+        self.children_indptr  = np.concatenate(([0], np.cumsum(np.bincount(parents, minlength=n)))).astype(np.int32)
+        by_child = np.lexsort((parents, children))
+        self.parents_indices = parents[by_child]
+        self.parents_indptr  = np.concatenate(([0], np.cumsum(np.bincount(children, minlength=n)))).astype(np.int32)
+        self.order       = self._topological_order()
+        self._resolution = None
+        self._changed()
+
+    def _topological_order(self)->np.ndarray:
+        n_parents = np.diff(self.parents_indptr).tolist()
+        indptr, indices = self.children_indptr.tolist(), self.children_indices.tolist()
+        order = [ i for i in range(len(self.ids)) if not n_parents[i] ]
+        for i in order: # order grows while iterated
+            for j in indices[ indptr[i]:indptr[i + 1] ]:
+                n_parents[j] -= 1
+                if not n_parents[j]:
+                    order.append(j)
+        if len(order) != len(self.ids):
+            raise ValueError("Relationships do not form a DAG")
+        return np.array(order, dtype=np.int32)
+
+    def _edges(self)->Iterator[tuple[int, int, int]]:
+        indptr = self.children_indptr
+        for i in range(len(self.ids)):
+            for e in range(indptr[i], indptr[i + 1]):
+                yield i, int(self.children_indices[e]), int(self.children_types[e])
+
+    def _children(self, i:int)->np.ndarray:
+        return self.children_indices[ self.children_indptr[i]:self.children_indptr[i + 1] ]
+
+    def _parents(self, i:int)->np.ndarray:
+        return self.parents_indices[ self.parents_indptr[i]:self.parents_indptr[i + 1] ]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, node_id:NodeID):
+        return node_id in self.index or node_id in self.aliases
+
+    def number_of_edges(self)->int:
+        return len(self.children_indices)
+
+    def node(self, i:int)->TermView:
+        return TermView(self, i)
+
+    @property
+    def nodes(self)->dict[NodeID, TermView]:
+        """ GO identifier -> term view, alias ids excluded
+            Built on each access, use get_go_node or node for single terms
+        """
+        return { node_id : TermView(self, i) for i, node_id in enumerate(self.ids) }
+
+    def _resolution_table(self)->dict[str, Union[TermView, _Obsolete]]:
+        """ see GO_tree._resolution_table """
+        table = {}
+        is_obsolete = self.columns.get('is_obsolete', [ None ] * len(self.ids))
+        replaced_by = self.columns.get('replaced_by', [ None ] * len(self.ids))
+        for i, node_id in enumerate(self.ids):
+            if is_obsolete[i] is None:
+                table[node_id] = self.node(i)
+            elif not replaced_by[i] is None:
+                if replaced_by[i] in self.index:
+                    table[node_id] = self.node( self.index[ replaced_by[i] ] )
+            else:
+                table[node_id] = _Obsolete(node_id, self.node(i))
+        for alt_id, i in self.aliases.items():
+            table[alt_id] = self.node(i)
+        for name, node_id in self.names_index.items():
+            if node_id in table:
+                table[name] = table[node_id]
+        return table
+
+    def _resolve(self, node_id:Union[NodeID, NodeName])->int:
+        return self.index[ self.get_go_node(node_id)['_id'] ]
+
+    def _concrete_mask(self)->np.ndarray:
+        is_obsolete = self.columns.get('is_obsolete', [ None ] * len(self.ids))
+        return np.array([ v is None for v in is_obsolete ], dtype=bool)
+
+    def concrete_nodes(self)->Iterator[TermView]:
+        """ node iterator over guaranteed concrete nodes only """
+        for i in np.flatnonzero(self._concrete_mask()).tolist():
+            yield self.node(i)
+
+    def maybe_concrete(self, node_id:NodeID)->Union[TermView, None]:
+        """ the term of node_id if it is not obsolete nor an alias, None otherwise """
+        if not node_id in self.index:
+            if node_id in self.aliases:
+                return None
+            raise KeyError(node_id)
+        n = self.node(self.index[node_id])
+        return None if 'is_obsolete' in n else n
+
+    def successors(self, node_id:NodeID, many_to_consider=False)->Iterator[NodeID]:
+        """ GO identifiers of the children of a term, aliases being forwarded """
+        go_node = self.get_go_node(node_id, many_to_consider)
+        go_nodes = go_node if type(go_node) is list else [ go_node ]
+        for g in go_nodes:
+            for j in self._children(self.index[ g['_id'] ]).tolist():
+                yield self.ids[j]
+
+    def predecessors(self, node_id:NodeID)->Iterator[NodeID]:
+        for j in self._parents(self._resolve(node_id)).tolist():
+            yield self.ids[j]
+
+    def ancestor_ids(self, node_id:Union[NodeID, NodeName])->set[NodeID]:
+        return set( self.ids[j] for j in self._traverse(self._resolve(node_id), self.parents_indptr, self.parents_indices) )
+
+    def descendant_ids(self, node_id:Union[NodeID, NodeName])->set[NodeID]:
+        return set( self.ids[j] for j in self._traverse(self._resolve(node_id), self.children_indptr, self.children_indices) )
+
+    def is_ancestor(self, ancestor_id:Union[NodeID, NodeName], node_id:Union[NodeID, NodeName])->bool:
+        return self._resolve(ancestor_id) in self._traverse(self._resolve(node_id), self.parents_indptr, self.parents_indices)
+
+    def _traverse(self, i:int, indptr:np.ndarray, indices:np.ndarray)->set[int]:
+        """ term indices reachable from i through the indptr/indices adjacency, i excluded """
+        seen  = set()
+        stack = [ i ]
+        while stack:
+            k = stack.pop()
+            for j in indices[ indptr[k]:indptr[k + 1] ].tolist():
+                if not j in seen:
+                    seen.add(j)
+                    stack.append(j)
+        return seen
+
+    @literal_arg_checker
+    def clear_proteins(self, k:ProteinsType):
+        """ clear all the protein lists: "perc_" and "classic" of the specified type: "background" or "measured" """
+        self.columns.pop(k, None)
+        self.columns.pop(f"perc_{k}", None)
+        self.protein_load_status = (False, self.protein_load_status[1]) if k == "background" \
+        else (self.protein_load_status[0], False)
+        self._changed()
+
+    @property
+    def root_ids(self)->set[NodeID]:
+        return set( n['_id'] for n in self.concrete_nodes() if not '_is_a' in n )
+
+    @property
+    def leave_ids(self)->Iterator[NodeID]:
+        leaves = self._concrete_mask() & ( np.diff(self.children_indptr) == 0 )
+        for i in np.flatnonzero(leaves).tolist():
+            yield self.ids[i]
+
+    def percolation_order(self)->Iterator[NodeID]:
+        """ Iterate over all node ids, children first (ie: reverse topological order of the is_a DAG) """
+        for i in self.order[::-1].tolist():
+            yield self.ids[i]
+
+    @literal_arg_checker
+    def get_proteins(self, node_id:NodeID, k:ProteinsType="background", deep=True):
+        """ Get all proteins attached to subtree rooted at provided node id """
+        curr_node = self.get_go_node(node_id)
+        if not deep:
+            return curr_node[k] if k in curr_node else self.new_protein_set()
+        results = self.new_protein_set(curr_node[k]) if k in curr_node else self.new_protein_set()
+        column  = self.columns.get(k)
+        if column is None:
+            return results
+        for j in self._traverse(self.index[ curr_node['_id'] ], self.children_indptr, self.children_indices):
+            if not column[j] is None:
+                results |= column[j]
+        return results
+
+    @literal_arg_checker
+    @profiling.timed("percolate")
+    def percolate(self, percol_type:PercolateType="both"):
+        """ makes the perc_background/measure attribute of one term the union of its descendants
+            Same single children first pass as GO_tree.percolate, over the term indices
+        """
+        perc_keys = [ k for k in get_args(ProteinsType) if percol_type in ["both", k] ]
+        n       = len(self.ids)
+        leaves  = ( self._concrete_mask() & ( np.diff(self.children_indptr) == 0 ) ).tolist()
+        visited = [ False ] * n
+        unions  = 0
+        indptr, indices = self.children_indptr.tolist(), self.children_indices.tolist()
+        for k in perc_keys:
+            for key in (k, f"perc_{k}"):
+                if not key in self.columns:
+                    self.columns[key] = [ None ] * n
+        for i in self.order[::-1].tolist():
+            children = [ j for j in indices[ indptr[i]:indptr[i + 1] ] if visited[j] ]
+            if not children and not leaves[i]:
+                continue
+            visited[i] = True
+            unions += len(children) * len(perc_keys)
+            for k in perc_keys:
+                own, perc_column = self.columns[k][i], self.columns[f"perc_{k}"]
+                # Previous percolation results are kept, as repeated calls used to accumulate
+                if not perc_column[i] is None:
+                    perc = perc_column[i]
+                else:
+                    perc = own if not own is None else self.new_protein_set()
+                perc_column[i] = perc.union( *[ perc_column[j] for j in children ] )
+
+        for root_id in self.root_ids:
+            root = self.node(self.index[root_id])
+            if percol_type in ["both", "background"]:
+                self.uniprot_omega = ( self.uniprot_omega[0] | root['perc_background'], self.uniprot_omega[1])
+            if percol_type in ["both", "measured"]:
+                self.uniprot_omega = ( self.uniprot_omega[0],  self.uniprot_omega[1] | root['perc_measured'])
+
+        profiling.count("percolated_nodes", sum(visited))
+        profiling.count("set_unions", unions)
+        self.percolated_status= ( True if percol_type in ["both", "background"] else self.percolated_status[0],
+                                  True if percol_type in ["both", "measured"]   else self.percolated_status[1] )
+        self._changed()
+
+@profiling.timed("reader")
+def array_reader(obo_file_path:str, keep_obsolete=True, ns=None, relationships_to_consider = ['is_a'], compact=False)->ArrayGOTree:
+    """ ArrayGOTree counterpart of tree.reader, straight from the obo file without building a networkx graph """
+    namespaces = _as_set(ns)
+    with open(obo_file_path, 'r') as fp:
+        records = ( node_buffer for node_buffer in obo_stanza_iter(fp) if _keep_stanza(node_buffer, keep_obsolete, namespaces) )
+        return ArrayGOTree.from_records(records, relationships_to_consider, compact)
@@ -0,0 +1,94 @@
+from array import array
+from bisect import bisect_left
+from typing import Iterator, Hashable
+import networkx as nx
+
+class ClosureIndex:
+    """ Transitive closure of a DAG
+
+        Nodes are split into weakly connected components (the GO namespaces, plus isolated
+        alias and obsolete nodes). Within a component, each node gets a position following a
+        topological order, and its ancestors (resp. descendants) are stored as a sorted array
+        of positions. Ancestors are merged from the parents in one topological pass, descendants
+        are obtained by inverting the ancestor arrays, so the cost is linear in the closure size.
+        The topological order and leaves are available at once, closure arrays are built on first query.
+    """
+    def __init__(self, graph:nx.DiGraph):
+        self.order     = list(nx.topological_sort(graph)) # parents first
+        self.component = {}
+        components = list(nx.weakly_connected_components(graph))
+        for i_comp, members in enumerate(components):
+            for node_id in members:
+                self.component[node_id] = i_comp
+        self.members  = [ [] for _ in components ]
+        self.position = {}
+        for node_id in self.order:
+            members = self.members[ self.component[node_id] ]
+            self.position[node_id] = len(members)
+            members.append(node_id)
+
+        self.leaves = [ node_id for node_id in graph if not graph.succ[node_id] ]
+        self._graph       = graph
+        self._ancestors   = None
+        self._descendants = None
+
+    def _build(self):
+        """ ancestor and descendant arrays, computed on first closure query """
+        graph        = self._graph
+        ancestors_of = {}
+        descendants  = { node_id : [] for node_id in self.order }
+        for node_id in self.order:
+            parents = graph.pred[node_id]
+            if len(parents) == 1:
+                parent_id = next(iter(parents))
+                ancestors = ancestors_of[parent_id].tolist()
+                ancestors.insert(bisect_left(ancestors, self.position[parent_id]), self.position[parent_id])
+            else:
+                ancestors = set()
+                for parent_id in parents:
+                    ancestors.update(ancestors_of[parent_id])
+                    ancestors.add(self.position[parent_id])
+                ancestors = sorted(ancestors)
+            ancestors_of[node_id] = array('I', ancestors)
+            # nodes are visited by increasing position, descendant lists come out sorted
+            members = self.members[ self.component[node_id] ]
+            for i in ancestors:
+                descendants[ members[i] ].append(self.position[node_id])
+        self._descendants = { node_id : array('I', positions) for node_id, positions in descendants.items() }
+        self._ancestors   = ancestors_of
+        self._graph       = None
+
+    def _ancestor_positions(self, node_id:Hashable)->array:
+        if self._ancestors is None or self._descendants is None:
+            self._build()
+        return self._ancestors[node_id]
+
+    def _descendant_positions(self, node_id:Hashable)->array:
+        if self._ancestors is None or self._descendants is None:
+            self._build()
+        return self._descendants[node_id]
+
+    def _decode(self, node_id:Hashable, positions:array)->Iterator[Hashable]:
+        members = self.members[ self.component[node_id] ]
+        for i in positions:
+            yield members[i]
+
+    def ancestors(self, node_id:Hashable)->Iterator[Hashable]:
+        return self._decode(node_id, self._ancestor_positions(node_id))
+
+    def descendants(self, node_id:Hashable)->Iterator[Hashable]:
+        return self._decode(node_id, self._descendant_positions(node_id))
+
+    def n_ancestors(self, node_id:Hashable)->int:
+        return len(self._ancestor_positions(node_id))
+
+    def n_descendants(self, node_id:Hashable)->int:
+        return len(self._descendant_positions(node_id))
+
+    def is_ancestor(self, ancestor_id:Hashable, node_id:Hashable)->bool:
+        """ True if ancestor_id is a strict ancestor of node_id """
+        if self.component[ancestor_id] != self.component[node_id]:
+            return False
+        positions = self._ancestor_positions(node_id)
+        i = bisect_left(positions, self.position[ancestor_id])
+        return i < len(positions) and positions[i] == self.position[ancestor_id]
@@ -0,0 +1,194 @@
+""" Differences between two releases of the ontology, and migration of protein data across them
+
+diff_trees compares two GO_trees in a single pass over their terms and edges, and sorts the
+terms of the old release that are no longer valid in the new one:
+    - merged   : now an alt_id of another term
+    - replaced : obsolete, with a replaced_by term
+    - obsoleted: obsolete, possibly with consider terms
+    - removed  : absent from the new release
+
+migrate_proteins moves the proteins loaded (and percolated) in the old tree into the new one,
+without reloading nor percolating again: proteins of each old term are forwarded the way
+load_proteins would, and only the terms whose populations may differ (terms receiving forwarded
+proteins, added terms, parents of added or removed edges, and all their ancestors) are
+percolated again, the percolated populations of all other terms being copied over.
+"""
+from typing import Iterable, Union, get_args
+
+from .tree import GO_tree, NodeID, ProteinsType, PercolateType
+from .proteins import ProteinSet
+from .type_checkers import literal_arg_checker
+from . import profiling
+
+class TreeDiff:
+    """ changes from an old to a new GO_tree """
+    def __init__(self):
+        self.added     = set()   # concrete terms of the new tree that were not concrete in the old one
+        self.merged    = {}      # old term -> term it is now an alt_id of
+        self.replaced  = {}      # old term -> replaced_by term
+        self.obsoleted = {}      # old term -> list of consider terms (may be empty)
+        self.removed   = set()   # old terms missing from the new tree
+        self.added_edges   = set() # (parent, child, relationship)
+        self.removed_edges = set()
+
+    def __repr__(self):
+        return f"TreeDiff(added={len(self.added)}, merged={len(self.merged)}, replaced={len(self.replaced)}, " + \
+               f"obsoleted={len(self.obsoleted)}, removed={len(self.removed)}, " + \
+               f"added_edges={len(self.added_edges)}, removed_edges={len(self.removed_edges)})"
+
+    def __bool__(self):
+        return any( (self.added, self.merged, self.replaced, self.obsoleted, self.removed,
+                     self.added_edges, self.removed_edges) )
+
+    def forward(self, node_id:NodeID)->list[NodeID]:
+        """ new terms standing for a concrete term of the old tree, empty if it was removed
+            or made obsolete without consider terms
+        """
+        if node_id in self.merged:
+            return [ self.merged[node_id] ]
+        if node_id in self.replaced:
+            return [ self.replaced[node_id] ]
+        if node_id in self.obsoleted:
+            return list(self.obsoleted[node_id])
+        if node_id in self.removed:
+            return []
+        return [ node_id ]
+
+def _is_concrete(n:Union[dict, None])->bool:
+    return not n is None and not 'is_obsolete' in n and not 'alias_to' in n
+
+@profiling.timed("diff_trees")
+def diff_trees(old:GO_tree, new:GO_tree)->TreeDiff:
+    """ structured differences between two GO_trees, see TreeDiff """
+    diff = TreeDiff()
+    old_nodes, new_nodes = old.nodes, new.nodes
+    for node_id in set(old_nodes) | set(new_nodes):
+        o = old_nodes[node_id] if node_id in old_nodes else None
+        n = new_nodes[node_id] if node_id in new_nodes else None
+        if _is_concrete(n):
+            if not _is_concrete(o):
+                diff.added.add(node_id)
+            continue
+        if not _is_concrete(o):
+            continue
+        if n is None:
+            diff.removed.add(node_id)
+        elif 'alias_to' in n:
+            diff.merged[node_id] = n['alias_to']['_id']
+        elif 'replaced_by' in n:
+            diff.replaced[node_id] = n['replaced_by']
+        else:
+            diff.obsoleted[node_id] = list(n.get('consider', []))
+
+    old_edges = set( old.edges(data="type") )
+    new_edges = set( new.edges(data="type") )
+    diff.added_edges   = new_edges - old_edges
+    diff.removed_edges = old_edges - new_edges
+    return diff
+
+@literal_arg_checker
+@profiling.timed("migrate_proteins")
+def migrate_proteins(old:GO_tree, new:GO_tree, diff:Union[TreeDiff, None]=None,
+                     percol_type:PercolateType="both", move=False)->set[NodeID]:
+    """
+    Move the protein populations of old into new, in place of load_proteins and percolate
+    diff: diff_trees(old, new), computed here if not provided
+    percol_type: population(s) to migrate, only the ones loaded in old are
+    move: hand the protein collections of old over to new rather than copying them,
+          the migrated populations of old are cleared
+    Proteins attached to a term of the old tree are attached to the term(s) the new tree resolves
+    its identifier to (eg: the term it was merged into, its replaced_by or consider terms), and are
+    dropped if the new tree does not know it.
+    Returns the identifiers of the terms percolated again, the percolated populations of
+    the others being taken from old.
+    """
+    diff = diff_trees(old, new) if diff is None else diff
+    pop_keys = [ k for k in get_args(ProteinsType)
+                 if percol_type in ["both", k] and old.protein_load_status[ get_args(ProteinsType).index(k) ] ]
+    if new.compact and old.compact and not len(new.protein_index):
+        # nothing loaded yet, bitmaps are copied as is by sharing the protein index
+        new.protein_index = old.protein_index
+        new.uniprot_omega = (new.new_protein_set(), new.new_protein_set())
+
+    # terms whose direct population, or set of children, is not the old one
+    dirty = set(diff.added)
+    dirty.update( parent for parent, _, _ in diff.added_edges | diff.removed_edges if parent in new.nodes )
+    forwards = {}
+    for node_id, n in old.nodes.items():
+        if not any(k in n for k in pop_keys):
+            continue
+        try:
+            targets = new.get_go_node(node_id, many_to_consider=True, warn=False)
+        except KeyError:
+            targets = []
+        targets = targets if type(targets) is list else [ targets ]
+        forwards[node_id] = [ t['_id'] for t in targets ]
+        dirty.update( t['_id'] for t in targets if t['_id'] != node_id )
+    dirty = _with_ancestors(new, dirty)
+
+    for k in pop_keys:
+        new.clear_proteins(k)
+        for node_id, targets in forwards.items():
+            if not k in old.nodes[node_id]:
+                continue
+            for i_target, target_id in enumerate(targets):
+                t = new.nodes[target_id]
+                if not k in t:
+                    # a collection handed over is attached once, other targets get copies
+                    t[k] = _transfer(new, old.nodes[node_id][k], copy=not move or i_target > 0)
+                else:
+                    t[k] |= _transfer(new, old.nodes[node_id][k], copy=False)
+        _repercolate(old, new, k, dirty, move)
+        i = get_args(ProteinsType).index(k)
+        new.protein_load_status = tuple( True if j == i else s for j, s in enumerate(new.protein_load_status) )
+        new.percolated_status   = tuple( old.percolated_status[i] if j == i else s for j, s in enumerate(new.percolated_status) )
+        if move:
+            old.clear_proteins(k)
+    new._changed()
+    return dirty
+
+def _with_ancestors(tree:GO_tree, node_ids:set[NodeID])->set[NodeID]:
+    """ node_ids and their ancestors, from a single children first pass (the closure arrays are not needed) """
+    marked = set(node_ids)
+    for node_id in tree.percolation_order():
+        if not node_id in marked and any( c in marked for c in super(GO_tree, tree).successors(node_id) ):
+            marked.add(node_id)
+    return marked
+
+def _transfer(new:GO_tree, proteins:Iterable, copy=True)->Union[set, ProteinSet]:
+    """ protein collection of another tree in the representation of new, a copy unless copy is False
+        and the collection can be used as is
+    """
+    if new.compact != isinstance(proteins, ProteinSet) or \
+       ( new.compact and not proteins.index is new.protein_index ):
+        return new.new_protein_set(proteins) if not new.compact else ProteinSet(new.protein_index, proteins)
+    return new.new_protein_set(proteins) if copy else proteins
+
+def _repercolate(old:GO_tree, new:GO_tree, k:ProteinsType, dirty:set[NodeID], move=False):
+    """ percolated populations of new: copied from old for clean terms, rebuilt children first for dirty ones,
+        as GO_tree.percolate would
+    """
+    if not old.percolated_status[ get_args(ProteinsType).index(k) ]:
+        return
+    perc_key = f"perc_{k}"
+    leaves   = set(new.leave_ids)
+    unions   = 0
+    for node_id in new.percolation_order():
+        n = new.nodes[node_id]
+        if not node_id in dirty:
+            if _is_concrete(n) and node_id in old.nodes and perc_key in old.nodes[node_id]:
+                n[perc_key] = _transfer(new, old.nodes[node_id][perc_key], copy=not move)
+            continue
+        children = [ c for c in super(GO_tree, new).successors(node_id) if perc_key in new.nodes[c] ]
+        if not children and not node_id in leaves:
+            continue
+        perc = n[k] if k in n else new.new_protein_set()
+        unions += len(children)
+        n[perc_key] = perc.union( *[ new.nodes[c][perc_key] for c in children ] )
+    profiling.count("set_unions", unions)
+
+    omega = new.new_protein_set()
+    for root_id in new.root_ids:
+        if perc_key in new.nodes[root_id]:
+            omega |= new.nodes[root_id][perc_key]
+    new.uniprot_omega = (omega, new.uniprot_omega[1]) if k == "background" else (new.uniprot_omega[0], omega)
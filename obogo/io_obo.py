@@ -1,5 +1,7 @@
 from io import TextIOWrapper
 import re
+
+from . import profiling
 """
 [Term]
 id: GO:0000001
@@ -17,8 +19,9 @@ class Buffer:
         Basically, all dict values are lists
         Beware, the __getitem__ method will coherce any list dict value of len 1 into a scalar
     """
-    def __init__(self):
+    def __init__(self, stanza="Term"):
         self.data = {}
+        self.stanza = stanza
 
     def __iter__(self):
         for k in self.data:
@@ -112,3 +115,76 @@ def obo_node_buffer_iter(fp:TextIOWrapper):
         yield buffer
     fp.close()
 
+_QUOTED_VALUE = re.compile(r'"((?:[^"\\]|\\.)*)"')
+_ESCAPED_CHAR = re.compile(r'\\(.)')
+
+def obo_stanza_iter(fp:TextIOWrapper, stanzas=("Term",), chunk_size=1 << 20):
+    """ Fast OBO parser, reading fp by chunks of chunk_size characters
+        Yields one new Buffer per stanza whose type (eg: Term, Typedef) is listed in stanzas,
+        a stanza ends at the next [header] or at the end of file.
+        Lines are dispatched on their tag:
+            - quoted values (def, synonym) are unescaped and stripped of their trailing modifiers
+            - "relationship: part_of GO:0000001" is stored under the relationship type (part_of)
+            - other values are stripped of their trailing "! comment" and "{...}" qualifiers
+    """
+    buffer = None
+    data   = None
+    for line in _chunked_lines(fp, chunk_size):
+        line = line.strip()
+        if not line or line[0] == '!':
+            continue
+        if line[0] == '[' and line[-1] == ']':
+            if buffer:
+                profiling.count("obo_stanzas")
+                yield buffer
+            buffer = Buffer(line[1:-1]) if line[1:-1] in stanzas else None
+            data   = buffer.data if buffer is not None else None
+            continue
+        if buffer is None: # header or unwanted stanza
+            continue
+
+        tag, sep, value = line.partition(':')
+        if not sep:
+            raise ValueError(line)
+        value = value.strip()
+        if value[:1] == '"':
+            if '\\' in value:
+                m = _QUOTED_VALUE.match(value)
+                if not m:
+                    raise ValueError(line)
+                value = _ESCAPED_CHAR.sub(r'\1', m[1])
+            else:
+                end = value.find('"', 1)
+                if end < 0:
+                    raise ValueError(line)
+                value = value[1:end]
+        else:
+            if ' !' in value:
+                value = value.split(' !', 1)[0].rstrip()
+            if value[-1:] == '}' and ' {' in value:
+                value = value[:value.rindex(' {')].rstrip()
+            if tag == 'relationship':
+                tag, _, value = value.partition(' ')
+                value = value.split(' ', 1)[0]
+
+        if tag in data:
+            data[tag].append(value)
+        else:
+            data[tag] = [value]
+
+    # pop trailer
+    if buffer:
+        profiling.count("obo_stanzas")
+        yield buffer
+
+def _chunked_lines(fp:TextIOWrapper, chunk_size:int):
+    tail = ''
+    while True:
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            break
+        lines = (tail + chunk).split('\n')
+        tail = lines.pop()
+        yield from lines
+    if tail:
+        yield tail
@@ -0,0 +1,108 @@
+""" Process-pool ORA scoring
+
+The GO term x protein population matrix is placed once in shared memory, workers attach to it
+by name instead of receiving a pickled copy of the tree or of the matrix.
+Work is split into contiguous chunks of samples (or of GO terms when there are fewer samples
+than workers) and reassembled in chunk order, so that results are identical to the serial path.
+Workers read the matrix in place, and a caller scoring repeatedly can pass its own executor so
+that the worker processes are started once rather than on every call.
+"""
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Optional
+from multiprocessing import shared_memory
+from scipy.sparse import csr_matrix
+import numpy as np
+
+class SharedCSR:
+    """ Copy of a csr_matrix data/indices/indptr arrays into shared memory blocks
+        The picklable descriptor attribute is what workers need to attach to the matrix.
+        Use as a context manager, blocks are unlinked on exit.
+    """
+    def __init__(self, M:csr_matrix):
+        self.blocks     = []
+        self.descriptor = { "shape" : M.shape, "arrays" : {} }
+        for k in ("data", "indices", "indptr"):
+            a = getattr(M, k)
+            shm = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+            np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf)[:] = a
+            self.blocks.append(shm)
+            self.descriptor["arrays"][k] = (shm.name, a.shape, a.dtype.str)
+
+    def close(self):
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+@contextmanager
+def attach_csr(descriptor:dict):
+    """ csr_matrix view of a SharedCSR descriptor, blocks are closed (not unlinked) on exit
+        The matrix must be deleted before leaving the context, shared blocks can not be closed while it is referenced
+    """
+    blocks = []
+    arrays = {}
+    try:
+        for k, (name, shape, dtype) in descriptor["arrays"].items():
+            shm = shared_memory.SharedMemory(name=name)
+            blocks.append(shm)
+            arrays[k] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        yield csr_matrix( (arrays["data"], arrays["indices"], arrays["indptr"]), shape=descriptor["shape"], copy=False )
+    finally:
+        arrays.clear()
+        for shm in blocks:
+            shm.close()
+
+def _row_view(M:csr_matrix, a:int, b:int)->csr_matrix:
+    """ rows a:b of M over its data and indices arrays
+        (M[a:b] copies them, and so would the csr_matrix constructor for slices under half of the arrays)
+    """
+    start, end = M.indptr[a], M.indptr[b]
+    view = csr_matrix( (b - a, M.shape[1]), dtype=M.dtype )
+    view.data, view.indices, view.indptr = M.data[start:end], M.indices[start:end], M.indptr[a:b + 1] - start
+    return view
+
+def _score_chunk(descriptor:dict, rows:tuple[int, int], D:csr_matrix, alternative):
+    """ worker: score the rows[0]:rows[1] GO terms of the shared population matrix against D """
+    from .statistics import score_counts
+    with attach_csr(descriptor) as M:
+        # scored in place, results are new arrays that do not reference shared memory
+        chunk   = M if rows == (0, M.shape[0]) else _row_view(M, *rows)
+        results = score_counts(chunk, D, alternative)
+        del M, chunk
+    return results
+
+def _chunks(n:int, n_chunks:int)->list[tuple[int, int]]:
+    bounds = np.linspace(0, n, min(n_chunks, n) + 1).astype(int) if n else [0, 0]
+    return [ (int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) ]
+
+@contextmanager
+def process_pool(n_jobs:int, executor:Optional[Executor]=None):
+    """ executor if provided, left running, or a new pool of n_jobs processes shut down on exit """
+    if not executor is None:
+        yield executor
+        return
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        yield pool
+
+def parallel_score_counts(M:csr_matrix, D:csr_matrix, alternative, n_jobs:int, executor:Optional[Executor]=None):
+    """ Same as statistics.score_counts, computed in n_jobs chunks by executor, or by a new pool of n_jobs processes """
+    n_terms, n_samples = M.shape[0], D.shape[1]
+    with SharedCSR(M) as shared, process_pool(n_jobs, executor) as pool:
+        if n_samples >= n_jobs:
+            futures = [ pool.submit(_score_chunk, shared.descriptor, (0, n_terms), D[:, a:b], alternative)
+                        for a, b in _chunks(n_samples, n_jobs) ]
+            axis = 0
+        else:
+            futures = [ pool.submit(_score_chunk, shared.descriptor, (a, b), D, alternative)
+                        for a, b in _chunks(n_terms, n_jobs) ]
+            axis = 1
+        chunks = [ f.result() for f in futures ]
+
+    return tuple( np.concatenate([ c[i] for c in chunks ], axis=axis) for i in range(6) )
@@ -0,0 +1,164 @@
+""" Permutation based ORA
+
+Empirical p-values of the Fisher tests, from random samples of the same size as the "abundant"
+protein set drawn from the reference population (norm). With the margins of the contingency
+table fixed by the population, the p-value of a GO term only depends on its s11 count: p-values
+are tabulated once per GO term and every permutation is reduced to a lookup of its counts.
+
+Permutations are processed in batches: the random samples of a batch form a sparse protein x
+permutation indicator matrix, and the counts of all GO terms come from a single product with the
+GO term x protein population matrix. Each batch draws from its own child of a SeedSequence, so
+that results only depend on the seed and batch size, not on how batches are spread over processes.
+
+Family-wise adjusted values follow the single-step minP procedure of Westfall and Young, the
+family being all GO terms carrying at least one protein of the population.
+"""
+from concurrent.futures import Executor
+from typing import Iterator, Optional, Union
+from scipy.sparse import csr_matrix
+from scipy.special import gammaln
+import numpy as np
+
+from .tree import GO_tree
+from . import profiling
+from .statistics import OraNormalizer, OraAlternative, ORA_TABLE_DTYPE, ora_population, population_matrix, \
+                        sample_matrix, contingency_counts, fisher_exact_vec, ora_table_iter
+from uniprot_redis.store.schemas import UniprotAC, UniprotDatum
+
+PERMUTATION_TABLE_DTYPE = ORA_TABLE_DTYPE + [ ('empirical_p', np.float64), ('fwer', np.float64) ]
+
+@profiling.timed("score_ora_permutation")
+def score_ora_permutation(tree:GO_tree, delta_prot:Union[ Iterator[UniprotDatum], Iterator[UniprotAC]],
+                            n_permutations:int=1000, norm:OraNormalizer="background",
+                            alternative:OraAlternative="greater", seed:Optional[int]=None,
+                            batch_size:int=128, n_jobs:int=1, executor:Optional[Executor]=None)->np.recarray:
+    """
+    Fisher tests of score_ora_table, along with their permutation based empirical p-values
+    n_permutations random samples of the size of delta_prot (restricted to the norm population)
+    are drawn and scored against all GO terms.
+    seed: any numpy SeedSequence entropy, results are reproducible for a given seed
+    batch_size: number of permutations counted at once, memory grows as GO terms x batch_size
+    n_jobs > 1 splits the batches over a pool of n_jobs processes, with identical results.
+    executor: process pool running these n_jobs chunks, reused across calls (see parallel.process_pool)
+    Returns a record array with one row per GO term carrying at least one protein of delta_prot,
+    in concrete_nodes order, in the score_ora_table format plus the fields:
+        empirical_p: fraction of permutations scoring the GO term at least as well
+        fwer       : fraction of permutations scoring any GO term at least as well (minP)
+    Both include the observed sample, ie: (1 + hits) / (1 + n_permutations)
+    """
+    N, pop_key        = ora_population(tree, norm)
+    nodes, M, columns = tree.cached( ("population_matrix", pop_key), lambda: population_matrix(tree, N, pop_key) )
+    s11, s12, s21, s22 = [ _[0] for _ in contingency_counts(M, sample_matrix([delta_prot], columns)) ]
+    n = int(s11[0] + s12[0]) if len(s11) else 0
+
+    odds_ratio, p_value = fisher_exact_vec(s11, s12, s21, s22, alternative)
+    # observed and permuted counts are compared through the same p-values table
+    lookup, offsets = pvalue_lookup(M, n, alternative)
+    p_obs = lookup[offsets[:-1] + s11]
+
+    seeds = np.random.SeedSequence(seed).spawn( -(-n_permutations // batch_size) )
+    sizes = [ min(batch_size, n_permutations - i * batch_size) for i in range(len(seeds)) ]
+    if n_jobs > 1 and len(seeds) > 1:
+        exceed, min_p = _parallel_permutations(M, n, lookup, offsets, p_obs, seeds, sizes, n_jobs, executor)
+    else:
+        exceed, min_p = permutation_counts(M, n, lookup, offsets, p_obs, seeds, sizes)
+
+    hit = np.flatnonzero(s11)
+    table = np.recarray( len(hit), dtype=PERMUTATION_TABLE_DTYPE )
+    table.go_id      = [ nodes[i]['_id'] for i in hit ]
+    table.name       = [ nodes[i]['name'] for i in hit ]
+    table.count      = s11[hit]
+    table.odds_ratio = odds_ratio[hit]
+    table.p_value    = p_value[hit]
+    table.s11, table.s12, table.s21, table.s22 = s11[hit], s12[hit], s21[hit], s22[hit]
+    table.empirical_p = (1 + exceed[hit]) / (1 + n_permutations)
+    table.fwer        = (1 + np.searchsorted(np.sort(min_p), p_obs[hit], side="right")) / (1 + n_permutations)
+    return table
+
+def pvalue_lookup(M:csr_matrix, n:int, alternative:OraAlternative="greater")->tuple[np.ndarray, np.ndarray]:
+    """ Fisher p-values of every GO term of M for all its possible counts in a sample of n proteins
+        The p-value of row i for a count of k is lookup[ offsets[i] + k ], for k in 0..min(K_i, n)
+        p-values only depend on the GO term population size K_i, they are computed once per distinct size.
+    """
+    T = M.shape[1]
+    K = np.diff(M.indptr).astype(np.int64)
+    sizes   = np.minimum(K, n) + 1
+    offsets = np.concatenate([ [0], np.cumsum(sizes) ]).astype(np.int64)
+    lookup  = np.empty(offsets[-1])
+    for size_K, rows in _group_rows(K):
+        p = _hypergeom_pvalues(T, size_K, n, alternative)
+        for i in rows.tolist():
+            lookup[ offsets[i]:offsets[i + 1] ] = p
+    return lookup, offsets
+
+def _group_rows(K:np.ndarray):
+    order  = np.argsort(K, kind="stable")
+    bounds = np.flatnonzero(np.diff(K[order])) + 1
+    for rows in np.split(order, bounds) if len(order) else []:
+        yield int(K[rows[0]]), rows
+
+def _hypergeom_pvalues(T:int, K:int, n:int, alternative:OraAlternative)->np.ndarray:
+    """ Fisher p-values of the counts 0..min(K, n) of a K proteins GO term in a n proteins sample, out of T
+        Tail sums run from the smallest probabilities, two-sided p-values follow scipy.stats.fisher_exact
+    """
+    k   = np.arange(min(K, n) + 1)
+    pmf = np.zeros(len(k))
+    ok  = n - k <= T - K
+    pmf[ok] = np.exp( _log_binom(K, k[ok]) + _log_binom(T - K, n - k[ok]) - _log_binom(T, n) )
+    if alternative == "greater":
+        p = np.cumsum(pmf[::-1])[::-1]
+    elif alternative == "less":
+        p = np.cumsum(pmf)
+    else:
+        ranked = np.sort(pmf)
+        p = np.cumsum(ranked)[ np.searchsorted(ranked, pmf * (1 + 1e-7), side="right") - 1 ]
+    return np.minimum(p, 1.0)
+
+def _log_binom(a, b):
+    return gammaln(a + 1) - gammaln(b + 1) - gammaln(a - b + 1)
+
+def random_samples(rng:np.random.Generator, n_proteins:int, n:int, n_samples:int)->csr_matrix:
+    """ protein x sample indicator matrix of n_samples random samples of n out of n_proteins """
+    indices = np.concatenate([ np.sort(rng.choice(n_proteins, n, replace=False)) for _ in range(n_samples) ]) \
+              if n_samples else np.zeros(0, dtype=np.int64)
+    indptr  = np.arange(n_samples + 1, dtype=np.int64) * n
+    R = csr_matrix( ( np.ones(len(indices), dtype=np.int64), indices, indptr ), shape=(n_samples, n_proteins) )
+    return R.T.tocsr()
+
+def permutation_counts(M:csr_matrix, n:int, lookup:np.ndarray, offsets:np.ndarray, p_obs:np.ndarray,
+                       seeds:list[np.random.SeedSequence], sizes:list[int])->tuple[np.ndarray, np.ndarray]:
+    """ Per GO term number of permutations with a p-value at most the observed one,
+        and the smallest p-value over GO terms of each permutation. One batch per seed, of sizes permutations.
+    """
+    exceed = np.zeros(M.shape[0], dtype=np.int64)
+    min_p  = []
+    family = np.diff(M.indptr) > 0
+    for seed, size in zip(seeds, sizes):
+        R = random_samples(np.random.default_rng(seed), M.shape[1], n, size)
+        counts = (M @ R).toarray()
+        p = lookup[ offsets[:-1, None] + counts ]
+        exceed += (p <= p_obs[:, None]).sum(axis=1)
+        profiling.count("permutations", size)
+        min_p.append( p[family].min(axis=0) if family.any() else np.ones(size) )
+    return exceed, np.concatenate(min_p) if min_p else np.zeros(0)
+
+def _permutation_chunk(descriptor:dict, n, lookup, offsets, p_obs, seeds, sizes):
+    """ worker: permutation_counts of some batches over the shared population matrix """
+    from .parallel import attach_csr
+    with attach_csr(descriptor) as M:
+        results = permutation_counts(M, n, lookup, offsets, p_obs, seeds, sizes)
+        del M
+    return results
+
+def _parallel_permutations(M:csr_matrix, n, lookup, offsets, p_obs, seeds, sizes, n_jobs:int, executor=None):
+    from .parallel import SharedCSR, process_pool, _chunks
+    with SharedCSR(M) as shared, process_pool(n_jobs, executor) as pool:
+        futures = [ pool.submit(_permutation_chunk, shared.descriptor, n, lookup, offsets, p_obs, seeds[a:b], sizes[a:b])
+                    for a, b in _chunks(len(seeds), n_jobs) ]
+        chunks = [ f.result() for f in futures ]
+    return sum( c[0] for c in chunks ), np.concatenate([ c[1] for c in chunks ])
+
+def permutation_table_iter(table:np.recarray):
+    """ tuple view of a permutation record array, the ora_table_iter tuples followed by the empirical p-value and fwer """
+    for r, t in zip(table, ora_table_iter(table)):
+        yield t + ( float(r.empirical_p), float(r.fwer) )
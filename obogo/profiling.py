@@ -0,0 +1,135 @@
+""" Opt-in instrumentation of the obogo pipeline
+
+While profiling is enabled, pipeline stages (reader, load_proteins, percolate, ORA scoring) are
+timed, and their work is counted (get_go_node calls, alias and obsolete forwards, unmatched GO
+identifiers, percolated nodes and set unions, Fisher tests) into a Stats object:
+
+    from obogo import profiling
+    with profiling.profiled() as stats:
+        tree = create_tree_from_obo('go-basic.obo')
+        tree.load_proteins('background', my_collection)
+        tree.percolate()
+    print(stats)
+
+Generator stages (score_ora_tree) are timed over their whole run with timed_iter.
+A hook, called with (stage, elapsed seconds, stats) each time a stage completes, can be given to
+enable or profiled, eg: logging_hook() to send stage timings to the "obogo" logger.
+When profiling is disabled (the default), instrumented code only tests STATS against None.
+"""
+import logging, sys, time
+from collections import Counter
+from typing import Callable, Optional
+from decorator import decorator
+
+Hook = Callable[[str, float, "Stats"], None]
+
+# the active Stats object, None when profiling is disabled
+STATS = None
+
+class Stats:
+    """ stage timers, as [calls, total seconds], and event counters """
+    def __init__(self, hook:Optional[Hook]=None):
+        self.timers   = {}
+        self.counters = Counter()
+        self.hook     = hook
+
+    def count(self, name:str, n:int=1):
+        self.counters[name] += n
+
+    def add_time(self, stage:str, elapsed:float):
+        if not stage in self.timers:
+            self.timers[stage] = [0, 0.0]
+        self.timers[stage][0] += 1
+        self.timers[stage][1] += elapsed
+        if not self.hook is None:
+            self.hook(stage, elapsed, self)
+
+    def reset(self):
+        self.timers.clear()
+        self.counters.clear()
+
+    def as_dict(self)->dict:
+        return { "timers"   : { stage : { "calls" : calls, "total_s" : total } for stage, (calls, total) in self.timers.items() },
+                 "counters" : dict(self.counters) }
+
+    def __repr__(self):
+        lines = [ f"{stage:<20} {calls:>6} calls {total:10.4f}s" for stage, (calls, total) in self.timers.items() ]
+        lines += [ f"{name:<20} {value:>12}" for name, value in sorted(self.counters.items()) ]
+        return "\n".join(lines)
+
+    def report(self, fp=None):
+        fp = sys.stderr if fp is None else fp
+        fp.write(f"{self}\n")
+
+def enable(hook:Optional[Hook]=None)->Stats:
+    """ start collecting into a new Stats object, which is returned """
+    global STATS
+    STATS = Stats(hook)
+    return STATS
+
+def disable()->Optional[Stats]:
+    """ stop collecting, returns the Stats object collected so far """
+    global STATS
+    stats, STATS = STATS, None
+    return stats
+
+class profiled:
+    """ context manager enabling profiling within its block, the previous Stats object is restored on exit """
+    def __init__(self, hook:Optional[Hook]=None):
+        self.hook = hook
+
+    def __enter__(self)->Stats:
+        self.previous = STATS
+        return enable(self.hook)
+
+    def __exit__(self, *exc):
+        global STATS
+        STATS = self.previous
+
+def count(name:str, n:int=1):
+    """ add n to a counter of the active Stats, if any """
+    if not STATS is None:
+        STATS.count(name, n)
+
+def timed(stage:str):
+    """ decorator adding the wall time of each call to the stage timer of the active Stats, if any """
+    @decorator
+    def _timed(f, *args, **kwargs):
+        stats = STATS
+        if stats is None:
+            return f(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            stats.add_time(stage, time.perf_counter() - start)
+    return _timed
+
+def timed_iter(stage:str):
+    """ timed counterpart for generator functions, the stage timer gets the time spent producing the items
+        of each run, once the generator is exhausted or closed
+    """
+    @decorator
+    def _timed_iter(f, *args, **kwargs):
+        stats = STATS
+        if stats is None:
+            yield from f(*args, **kwargs)
+            return
+        elapsed = 0.0
+        try:
+            start = time.perf_counter()
+            for item in f(*args, **kwargs):
+                elapsed += time.perf_counter() - start
+                yield item
+                start = time.perf_counter()
+            elapsed += time.perf_counter() - start
+        finally:
+            stats.add_time(stage, elapsed)
+    return _timed_iter
+
+def logging_hook(logger:Optional[logging.Logger]=None, level:int=logging.INFO)->Hook:
+    """ hook writing each completed stage to logger (default: the "obogo" logger) """
+    logger = logging.getLogger("obogo") if logger is None else logger
+    def hook(stage:str, elapsed:float, stats:Stats):
+        logger.log(level, "%s done in %.4fs", stage, elapsed)
+    return hook
@@ -0,0 +1,307 @@
+from array import array
+from typing import Iterable, Iterator, Optional, Union
+import numpy as np
+from uniprot_redis.store.schemas import UniprotDatum, UniprotAC
+from pyproteinsext.uniprot import Entry as Uniprot
+
+ProteinLike = Union[UniprotDatum, Uniprot]
+
+if hasattr(int, "bit_count"):
+    def popcount(bits:int)->int:
+        return bits.bit_count()
+else: # python 3.9
+    def popcount(bits:int)->int:
+        return bin(bits).count("1")
+
+class ProteinIndex:
+    """ Tree-wide protein to integer index
+        Proteins are registered once, under their uniprot accession, and get the next free position.
+        A set of proteins is then a sorted array of positions, or a python int where bit i is set
+        if protein i is a member (see ProteinSet).
+    """
+    def __init__(self):
+        self.data      = [] # position -> protein datum
+        self.positions = {} # uniprot AC -> position
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, uniprot_id:UniprotAC):
+        return uniprot_id in self.positions
+
+    def register(self, datum:ProteinLike)->int:
+        """ returns the position of the datum, registering it on first encounter """
+        if not datum.id in self.positions:
+            self.positions[datum.id] = len(self.data)
+            self.data.append(datum)
+        return self.positions[datum.id]
+
+    def positions_of(self, proteins:Iterable[Union[ProteinLike, UniprotAC]])->np.ndarray:
+        """ sorted positions of the provided proteins or uniprot ACs, unregistered ones are ignored """
+        positions = []
+        for p in proteins:
+            uniprot_id = p if isinstance(p, str) else p.id
+            if uniprot_id in self.positions:
+                positions.append(self.positions[uniprot_id])
+        return sorted_union([ np.array(positions, dtype=np.int32) ])
+
+def positions_to_bits(positions:np.ndarray)->int:
+    """ bitmap of a sorted array of positions """
+    if not len(positions):
+        return 0
+    mask = np.zeros(int(positions[-1]) + 1, dtype=bool)
+    mask[positions] = True
+    return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+def bits_to_positions(bits:int)->np.ndarray:
+    """ sorted array of the positions set in a bitmap """
+    if not bits:
+        return np.zeros(0, dtype=np.int32)
+    packed = np.frombuffer(bits.to_bytes((bits.bit_length() + 7) // 8, "little"), dtype=np.uint8)
+    return np.flatnonzero( np.unpackbits(packed, bitorder="little") ).astype(np.int32)
+
+def _bit_test(bits:int, positions:np.ndarray)->np.ndarray:
+    """ boolean array, whether each position is set in the bitmap """
+    packed = np.frombuffer(bits.to_bytes((bits.bit_length() + 7) // 8, "little"), dtype=np.uint8)
+    inside = positions < len(packed) * 8
+    test   = np.zeros(len(positions), dtype=bool)
+    test[inside] = ( packed[ positions[inside] >> 3 ] >> ( positions[inside] & 7 ).astype(np.uint8) ) & 1 == 1
+    return test
+
+def sorted_union(arrays:list[np.ndarray])->np.ndarray:
+    """ sorted unique values of some arrays (a sort of their concatenation, faster than np.unique) """
+    values = np.concatenate(arrays) if len(arrays) > 1 else np.array(arrays[0])
+    values.sort()
+    if len(values) > 1:
+        values = values[ np.concatenate(( [True], values[1:] != values[:-1] )) ]
+    return values
+
+# below this number of values, sorted merges run on python sets rather than numpy arrays
+_SMALL_MERGE = 256
+
+def _merge(chunks:list[bytes], extra:list[int]=())->bytes:
+    """ int32 bytes of the sorted union of some int32 bytes chunks and extra values """
+    if sum(map(len, chunks)) // 4 + len(extra) < _SMALL_MERGE:
+        values = set(extra)
+        for chunk in chunks:
+            values.update( memoryview(chunk).cast("i") )
+        return array("i", sorted(values)).tobytes()
+    arrays = [ np.frombuffer(chunk, dtype=np.int32) for chunk in chunks ]
+    if extra:
+        arrays.append( np.array(extra, dtype=np.int32) )
+    return sorted_union(arrays).tobytes()
+
+class ProteinSet:
+    """ set-like collection of proteins over a ProteinIndex
+        Supports the set operations used across obogo (add, |, &, -, len, iteration over protein data)
+        so that it can stand in for the python set of UniprotDatum of a GO node.
+        Members are stored as the bytes of a sorted int32 array of index positions, so that memory
+        grows with the number of members, until they exceed 1/DENSE_RATIO of the index: the set then
+        switches to a bitmap (python int), which is smaller from there on and faster to combine.
+        Proteins added one at a time are buffered, and merged on the next read.
+        Operations run at python level on each set: this saves memory over python sets of UniprotDatum,
+        not time (percolating a tree of ProteinSet is about 2 times slower).
+    """
+    __slots__ = ("index", "_members", "_pending")
+
+    DENSE_RATIO = 32 # bits per member of a positions array
+
+    def __init__(self, index:ProteinIndex, proteins:Iterable[ProteinLike]=(), bits:Optional[int]=None,
+                 positions:Optional[np.ndarray]=None):
+        """ bits: bitmap of the members, or positions: their sorted and unique index positions """
+        self.index    = index
+        self._pending = None
+        if not bits is None:
+            self._members = bits
+        else:
+            self._members = b"" if positions is None else np.asarray(positions, dtype=np.int32).tobytes()
+        for p in proteins:
+            self.add(p)
+        self._flush()
+        self._rebalance()
+
+    def _wrap(self, members:Union[bytes, int])->"ProteinSet":
+        """ new set over the same index, from int32 bytes or a bitmap """
+        wrapped = ProteinSet.__new__(ProteinSet)
+        wrapped.index, wrapped._members, wrapped._pending = self.index, members, None
+        wrapped._rebalance()
+        return wrapped
+
+    def _flush(self):
+        """ merge the buffered additions """
+        if self._pending:
+            pending, self._pending = self._pending, None
+            self._members = _merge([ self._members ], pending)
+            self._rebalance()
+
+    def _sparse(self)->np.ndarray:
+        return np.frombuffer(self._members, dtype=np.int32)
+
+    def _rebalance(self):
+        """ switch between positions and bitmap storage, whichever is smaller
+            (with some slack, so that a set around the threshold does not flip back and forth)
+        """
+        capacity = len(self.index)
+        if type(self._members) is bytes:
+            if len(self._members) // 4 * self.DENSE_RATIO > capacity:
+                self._members = positions_to_bits( self._sparse() )
+        elif popcount(self._members) * self.DENSE_RATIO * 2 < capacity:
+            self._members = bits_to_positions(self._members).tobytes()
+
+    @property
+    def dense(self)->bool:
+        if self._pending:
+            self._flush()
+        return type(self._members) is int
+
+    @property
+    def bits(self)->int:
+        """ members as a bitmap """
+        return self._members if self.dense else positions_to_bits( self._sparse() )
+
+    @property
+    def positions(self)->np.ndarray:
+        """ members as a sorted, read-only, array of index positions """
+        return bits_to_positions(self._members) if self.dense else self._sparse()
+
+    def _other(self, other)->"ProteinSet":
+        if isinstance(other, ProteinSet):
+            if not other.index is self.index:
+                raise ValueError("ProteinSet operands must share the same ProteinIndex")
+            if other._pending:
+                other._flush()
+            return other
+        return self._wrap( self.index.positions_of(other).tobytes() )
+
+    def _filter(self, other:"ProteinSet", keep_members:bool)->"ProteinSet":
+        """ members of a sparse self that are (keep_members) or are not in a dense other """
+        positions = self._sparse()
+        return self._wrap( positions[ _bit_test(other._members, positions) == keep_members ].tobytes() )
+
+    def union(self, *others)->"ProteinSet":
+        """ new set of the members of self and all others, merged at once """
+        members = []
+        for operand in (self,) + others:
+            operand = self._other(operand)
+            if operand._members:
+                members.append(operand._members)
+        if any( type(m) is int for m in members ):
+            bits = 0
+            for m in members:
+                bits |= m if type(m) is int else positions_to_bits( np.frombuffer(m, dtype=np.int32) )
+            return self._wrap(bits)
+        if len(members) < 2:
+            # bytes are immutable, a single operand is shared rather than copied
+            return self._wrap(members[0] if members else b"")
+        return self._wrap( _merge(members) )
+
+    def add(self, datum:ProteinLike):
+        position = self.index.register(datum)
+        if type(self._members) is int:
+            self._members |= 1 << position
+        elif self._pending is None:
+            self._pending = [ position ]
+        else:
+            self._pending.append(position)
+
+    def discard(self, datum:Union[ProteinLike, UniprotAC]):
+        uniprot_id = datum if isinstance(datum, str) else datum.id
+        if not uniprot_id in self.index.positions:
+            return
+        position = self.index.positions[uniprot_id]
+        if self.dense:
+            self._members &= ~(1 << position)
+        else:
+            positions = self._sparse()
+            self._members = positions[ positions != position ].tobytes()
+        self._rebalance()
+
+    def copy(self)->"ProteinSet":
+        # bytes and int members are immutable, they are shared
+        self._flush()
+        return self._wrap(self._members)
+
+    def ids(self)->set[UniprotAC]:
+        return set(p.id for p in self)
+
+    def __iter__(self)->Iterator[ProteinLike]:
+        data = self.index.data
+        for i in self.positions.tolist():
+            yield data[i]
+
+    def __len__(self):
+        return popcount(self._members) if self.dense else len(self._members) // 4
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __contains__(self, p:Union[ProteinLike, UniprotAC]):
+        uniprot_id = p if isinstance(p, str) else p.id
+        if not uniprot_id in self.index.positions:
+            return False
+        position = self.index.positions[uniprot_id]
+        if self.dense:
+            return bool(self._members >> position & 1)
+        positions = self._sparse()
+        i = np.searchsorted(positions, position)
+        return i < len(positions) and positions[i] == position
+
+    def __eq__(self, other):
+        if isinstance(other, ProteinSet):
+            if not self.index is other.index:
+                return False
+            if self.dense == other.dense:
+                return self._members == other._members
+            return np.array_equal(self.positions, other.positions)
+        return NotImplemented
+
+    def __or__(self, other):
+        return self.union(other)
+
+    def __and__(self, other):
+        other = self._other(other)
+        if self.dense and other.dense:
+            return self._wrap(self._members & other._members)
+        if self.dense:
+            return other._filter(self, True)
+        if other.dense:
+            return self._filter(other, True)
+        return self._wrap( np.intersect1d(self._sparse(), other._sparse(), assume_unique=True).tobytes() )
+
+    def __sub__(self, other):
+        other = self._other(other)
+        if not self.dense and other.dense:
+            return self._filter(other, False)
+        if self.dense:
+            return self._wrap(self._members & ~other.bits)
+        return self._wrap( np.setdiff1d(self._sparse(), other._sparse(), assume_unique=True).tobytes() )
+
+    def __ior__(self, other):
+        self._members = self.union(other)._members
+        return self
+
+    __ror__  = __or__
+    __rand__ = __and__
+
+    def __repr__(self):
+        return f"ProteinSet({ sorted(self.ids()) })"
+
+class ProteinRef:
+    """ Minimal protein record carrying only its uniprot accession
+        Stands in for UniprotDatum when proteins are not materialized (eg: tree snapshots)
+    """
+    __slots__ = ("id",)
+
+    def __init__(self, id:UniprotAC):
+        self.id = id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __eq__(self, other):
+        if isinstance(other, ProteinRef):
+            return self.id == other.id
+        return NotImplemented
+
+    def __repr__(self):
+        return f"ProteinRef({self.id!r})"
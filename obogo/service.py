@@ -0,0 +1,163 @@
+""" asyncio front end to the ORA scoring functions
+
+Scoring functions are CPU bound and synchronous: OraService runs them in an executor, so that the
+event loop stays responsive, and avoids scoring the same request twice:
+    - identical requests in flight (same function, parameters, sample and tree version) are
+      coalesced, later callers awaiting the result of the first one
+    - results are kept in an LRU cache, bounded by their total (pickled) size in bytes
+
+Samples are keyed by a hash of their sorted uniprot accessions. Keys carry the tree version, so
+that results computed before any change of the tree (protein load, percolation, ...) are never
+served again, and are dropped from the cache as soon as a result of the new version is stored.
+
+    service = OraService(obogo_tree)
+    table   = await service.score_ora_table(sample)
+"""
+import asyncio, hashlib, pickle
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Hashable, Iterator, Optional, Union
+
+from .tree import GO_tree, NodeID, NodeName
+from .statistics import OraNormalizer, OraAlternative, compute_node_ora, score_ora_table, score_ora_tree, _as_ids
+from uniprot_redis.store.schemas import UniprotAC, UniprotDatum
+
+_MISSING = object()
+
+def sample_key(delta_prot:Union[ Iterator[UniprotDatum], Iterator[UniprotAC]])->str:
+    """ hash of the set of uniprot accessions of a sample, regardless of their order and repeats """
+    h = hashlib.blake2b(digest_size=16)
+    for uniprot_id in sorted(_as_ids(delta_prot)):
+        h.update(uniprot_id.encode())
+        h.update(b"\n")
+    return h.hexdigest()
+
+class ResultCache:
+    """ LRU mapping bounded by the total size of its values, in bytes """
+    def __init__(self, max_bytes:int=64 << 20):
+        self.max_bytes = max_bytes
+        self.n_bytes   = 0
+        self._entries  = OrderedDict() # key -> (value, size)
+        self.hits      = 0
+        self.misses    = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key:Hashable):
+        return key in self._entries
+
+    def get(self, key:Hashable, default=None):
+        if not key in self._entries:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def put(self, key:Hashable, value, size:Optional[int]=None):
+        """ values larger than the whole cache are not stored """
+        size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)) if size is None else size
+        self.pop(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self.n_bytes += size
+        while self.n_bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.n_bytes -= evicted
+
+    def pop(self, key:Hashable):
+        if key in self._entries:
+            _, size = self._entries.pop(key)
+            self.n_bytes -= size
+
+    def discard_if(self, predicate):
+        """ drop the entries whose key matches predicate """
+        for key in [ k for k in self._entries if predicate(k) ]:
+            self.pop(key)
+
+    def clear(self):
+        self._entries.clear()
+        self.n_bytes = 0
+
+class OraService:
+    """
+    Async ORA scoring over a percolated tree
+    executor: where scoring runs, a ThreadPoolExecutor of max_workers threads by default
+              (tree caches are shared by threads, the tree is not copied)
+    max_cache_bytes: size bound of the result cache, 0 disables caching (in-flight requests are still coalesced)
+    n_jobs > 1 splits the scoring of each request over a pool of n_jobs processes, started once and
+              shared by all requests (see statistics.score_ora_table)
+    Use as an async context manager, or call close(), to shut the default executor and the process pool down.
+    """
+    def __init__(self, tree:GO_tree, executor:Optional[Executor]=None, max_workers:Optional[int]=None,
+                 max_cache_bytes:int=64 << 20, n_jobs:int=1):
+        self.tree      = tree
+        self._own      = executor is None
+        self.executor  = ThreadPoolExecutor(max_workers=max_workers) if executor is None else executor
+        self.n_jobs    = n_jobs
+        self.pool      = ProcessPoolExecutor(max_workers=n_jobs) if n_jobs > 1 else None
+        self.cache     = ResultCache(max_cache_bytes)
+        self._inflight = {}
+        self.coalesced = 0
+        self.computed  = 0
+
+    async def score_ora_table(self, delta_prot:Union[ Iterator[UniprotDatum], Iterator[UniprotAC]],
+                              norm:OraNormalizer="background", alternative:OraAlternative="two-sided"):
+        """ score_ora_table record array """
+        delta = frozenset(_as_ids(delta_prot))
+        return await self._submit(("score_ora_table", norm, alternative), delta,
+                                  partial(score_ora_table, self.tree, delta, norm, alternative,
+                                          n_jobs=self.n_jobs, executor=self.pool))
+
+    async def score_ora_tree(self, delta_prot:Union[ Iterator[UniprotDatum], Iterator[UniprotAC]],
+                             norm:OraNormalizer="background", vectorized=False)->list[tuple]:
+        """ list of the score_ora_tree tuples """
+        delta = frozenset(_as_ids(delta_prot))
+        return await self._submit(("score_ora_tree", norm, vectorized), delta,
+                                  lambda: list(score_ora_tree(self.tree, delta, norm, vectorized,
+                                                              n_jobs=self.n_jobs, executor=self.pool)))
+
+    async def compute_node_ora(self, delta_prot:Union[ Iterator[UniprotDatum], Iterator[UniprotAC]],
+                               go_id:Union[NodeID, NodeName], norm:OraNormalizer="background"):
+        """ compute_node_ora tuple, or None if the GO term carries no protein of the sample """
+        delta = frozenset(_as_ids(delta_prot))
+        return await self._submit(("compute_node_ora", go_id, norm), delta,
+                                  partial(compute_node_ora, self.tree, delta, go_id, norm))
+
+    async def _submit(self, request:tuple, delta:frozenset, compute):
+        version = self.tree.version
+        key = request + (version, sample_key(delta))
+        result = self.cache.get(key, _MISSING)
+        if not result is _MISSING:
+            return result
+        if key in self._inflight:
+            self.coalesced += 1
+            # shielded, so that a cancelled caller does not cancel the computation awaited by the others
+            return await asyncio.shield(self._inflight[key])
+
+        future = asyncio.get_running_loop().run_in_executor(self.executor, compute)
+        self._inflight[key] = future
+        self.computed += 1
+        try:
+            result = await asyncio.shield(future)
+        finally:
+            del self._inflight[key]
+        if self.cache.max_bytes > 0 and self.tree.version == version:
+            self.cache.discard_if(lambda k: k[-2] != version)
+            self.cache.put(key, result)
+        return result
+
+    def close(self):
+        if self._own:
+            self.executor.shutdown(wait=True)
+        if not self.pool is None:
+            self.pool.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
@@ -0,0 +1,255 @@
+""" Binary snapshot of a GO_tree
+
+A snapshot is an uncompressed NumPy .npz archive of flat arrays:
+    - node ids and string attributes (name, namespace, alt_id, _is_a, consider, replaced_by, ...)
+      as utf-8 blobs with offsets, one CSR per attribute over the node index
+    - alias ghost nodes as an alias -> concrete node index array
+    - edges as a CSR parent -> children adjacency, with an edge type code per edge
+    - a protein accession table, and per node protein memberships (background, measured
+      and their perc_ counterparts) as CSR arrays of protein indices
+    - the omega populations and the load/percolation status
+
+load_tree rebuilds the whole GO_tree from these arrays (networkx graph, node attributes and
+protein collections), it costs about as much as reading the OBO file again, but restores the
+proteins and percolated populations without their source.
+load_population is the fast read path for scoring, eg: in worker processes: the GO term x protein
+population matrix is sliced straight out of the perc_ membership arrays, memory-mapped from the
+file (members of the archive are stored uncompressed), and only the node identifiers, names and
+protein accessions are decoded. The tree itself is never built.
+"""
+from typing import Iterable, Union
+from typing import get_args
+import json, struct, zipfile
+import networkx as nx
+import numpy as np
+
+from scipy.sparse import csr_matrix
+from uniprot_redis.store.schemas import UniprotAC
+
+from .tree import GO_tree, ProteinsType
+from .proteins import ProteinRef, ProteinSet
+from .statistics import ORA_error, OraNormalizer
+
+PROTEIN_KEYS = [ prefix + k for k in get_args(ProteinsType) for prefix in ("", "perc_") ]
+SNAPSHOT_VERSION = 1
+
+def save_tree(tree:GO_tree, file_path:str):
+    """ Write a binary snapshot of a loaded (and possibly percolated) tree """
+    node_ids = list(tree.nodes)
+    node_idx = { node_id : i for i, node_id in enumerate(node_ids) }
+    arrays   = {}
+    _pack_strings(arrays, "node_ids", node_ids)
+
+    # string attributes, alias ghost nodes
+    attributes = []
+    alias_to   = np.full(len(node_ids), -1, dtype=np.int64)
+    for i, (node_id, n_dict) in enumerate(tree.nodes.items()):
+        if "alias_to" in n_dict:
+            alias_to[i] = node_idx[ n_dict["alias_to"]["_id"] ]
+        for k in n_dict:
+            if not k in attributes and not k in PROTEIN_KEYS and k != "alias_to":
+                attributes.append(k)
+    arrays["alias_to"] = alias_to
+    for k in attributes:
+        values, indptr, is_list = [], [0], np.zeros(len(node_ids), dtype=bool)
+        for i, n_dict in enumerate(tree.nodes.values()):
+            v = n_dict.get(k, [])
+            if not isinstance(v, (str, list)):
+                v = []
+            is_list[i] = isinstance(v, list)
+            values.extend( v if is_list[i] else [v] )
+            indptr.append(len(values))
+        _pack_strings(arrays, f"attr.{k}", values)
+        arrays[f"attr.{k}.indptr"]  = np.array(indptr, dtype=np.int64)
+        arrays[f"attr.{k}.is_list"] = is_list
+
+    # edges
+    edge_types = []
+    indptr, children, types = [0], [], []
+    for node_id in node_ids:
+        for child_id, e_dict in tree.adj[node_id].items():
+            edge_type = e_dict.get("type")
+            if not edge_type in edge_types:
+                edge_types.append(edge_type)
+            children.append(node_idx[child_id])
+            types.append(edge_types.index(edge_type))
+        indptr.append(len(children))
+    arrays["edges.indptr"]   = np.array(indptr,   dtype=np.int64)
+    arrays["edges.children"] = np.array(children, dtype=np.int64)
+    arrays["edges.type"]     = np.array(types,    dtype=np.int16)
+
+    # proteins
+    if tree.compact:
+        accessions = [ p.id for p in tree.protein_index.data ]
+    else:
+        accessions = sorted( set(p.id for n_dict in tree.nodes.values() for k in PROTEIN_KEYS for p in n_dict.get(k, ()))
+                           | set(p.id for omega in tree.uniprot_omega for p in omega) )
+    protein_idx = { uniprot_id : i for i, uniprot_id in enumerate(accessions) }
+    _pack_strings(arrays, "proteins", accessions)
+    for k in PROTEIN_KEYS:
+        indptr, members = [0], []
+        for n_dict in tree.nodes.values():
+            members.extend( sorted( protein_idx[p.id] for p in n_dict.get(k, ()) ) )
+            indptr.append(len(members))
+        arrays[f"{k}.indptr"]  = np.array(indptr,  dtype=np.int64)
+        arrays[f"{k}.members"] = np.array(members, dtype=np.int64)
+        # Absence of the key on a node is not the same as an empty population
+        arrays[f"{k}.present"] = np.array([ k in n_dict for n_dict in tree.nodes.values() ], dtype=bool)
+    for k, omega in zip(get_args(ProteinsType), tree.uniprot_omega):
+        arrays[f"omega.{k}"] = np.array(sorted( protein_idx[p.id] for p in omega ), dtype=np.int64)
+
+    meta = { "version"             : SNAPSHOT_VERSION,
+             "compact"             : tree.compact,
+             "attributes"          : attributes,
+             "edge_types"          : edge_types,
+             "slim_map"            : tree.slim_map,
+             "protein_load_status" : list(tree.protein_load_status),
+             "percolated_status"   : list(tree.percolated_status) }
+    arrays["meta"] = np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)
+
+    with open(file_path, "wb") as fp:
+        np.savez(fp, **arrays)
+
+def _read_meta(arrays:dict)->dict:
+    meta = json.loads( bytes(arrays["meta"]).decode() )
+    if meta["version"] != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {meta['version']}")
+    return meta
+
+def load_tree(file_path:str, mmap=True, compact=None)->GO_tree:
+    """ Rebuild a GO_tree from a snapshot written by save_tree
+        Proteins are restored as ProteinRef records, carrying their uniprot accession only.
+        mmap: memory-map the snapshot arrays instead of reading them, all of them are still converted
+              to python objects, see load_population to score without rebuilding the tree
+        compact: override the protein storage (python sets or ProteinSet) of the saved tree
+    """
+    arrays = read_snapshot(file_path, mmap)
+    meta   = _read_meta(arrays)
+
+    tree     = GO_tree(compact=meta["compact"] if compact is None else compact)
+    node_ids = _unpack_strings(arrays, "node_ids")
+    nx.DiGraph.add_nodes_from(tree, node_ids)
+    nodes = [ tree.nodes[node_id] for node_id in node_ids ]
+
+    for k in meta["attributes"]:
+        values  = _unpack_strings(arrays, f"attr.{k}")
+        indptr  = arrays[f"attr.{k}.indptr"].tolist()
+        is_list = arrays[f"attr.{k}.is_list"].tolist()
+        for i, n_dict in enumerate(nodes):
+            a, b = indptr[i], indptr[i + 1]
+            if is_list[i]:
+                if a < b:
+                    n_dict[k] = values[a:b]
+            else:
+                n_dict[k] = values[a]
+    for i, j in enumerate(arrays["alias_to"].tolist()):
+        if j >= 0:
+            nodes[i]["alias_to"] = nodes[j]
+    for node_id, n_dict in zip(node_ids, nodes):
+        if "name" in n_dict and not "alias_to" in n_dict:
+            tree.names_index[ n_dict["name"] ] = node_id
+
+    indptr   = arrays["edges.indptr"].tolist()
+    children = arrays["edges.children"].tolist()
+    types    = arrays["edges.type"].tolist()
+    nx.DiGraph.add_edges_from(tree, ( (node_ids[i], node_ids[children[e]], { "type" : meta["edge_types"][types[e]] })
+                                      for i in range(len(node_ids)) for e in range(indptr[i], indptr[i + 1]) ))
+
+    proteins = [ ProteinRef(uniprot_id) for uniprot_id in _unpack_strings(arrays, "proteins") ]
+    if tree.compact:
+        for p in proteins:
+            tree.protein_index.register(p)
+    for k in PROTEIN_KEYS:
+        indptr  = arrays[f"{k}.indptr"]
+        members = arrays[f"{k}.members"]
+        for i in np.flatnonzero(arrays[f"{k}.present"]).tolist():
+            nodes[i][k] = _protein_set(tree, proteins, members[ indptr[i]:indptr[i + 1] ])
+    tree.uniprot_omega = tuple( _protein_set(tree, proteins, arrays[f"omega.{k}"]) for k in get_args(ProteinsType) )
+
+    tree.slim_map            = meta.get("slim_map", {})
+    tree.protein_load_status = tuple(meta["protein_load_status"])
+    tree.percolated_status   = tuple(meta["percolated_status"])
+    return tree
+
+def load_population(file_path:str, norm:OraNormalizer="background", mmap=True)->tuple[list[dict], csr_matrix, dict[UniprotAC, int]]:
+    """ population_matrix of the saved tree, read from the snapshot arrays without rebuilding the tree
+        Score it with statistics.score_population, results are the ones of score_ora_samples on the tree.
+        Returns the concrete nodes (as records of their _id and name), the sparse GO term x protein
+        matrix restricted to the norm population, and the protein AC to column mapping.
+    """
+    arrays = read_snapshot(file_path, mmap)
+    meta   = _read_meta(arrays)
+    if not all(meta["protein_load_status"]) or not all(meta["percolated_status"]):
+        raise ORA_error("GO term tree not ready")
+
+    # concrete nodes: neither aliases nor obsolete
+    node_ids = _unpack_strings(arrays, "node_ids")
+    concrete = np.asarray(arrays["alias_to"]) < 0
+    if "is_obsolete" in meta["attributes"]:
+        concrete &= np.diff(arrays["attr.is_obsolete.indptr"]) == 0
+    rows   = np.flatnonzero(concrete)
+    names  = _unpack_strings(arrays, "attr.name") if "name" in meta["attributes"] else []
+    starts = np.asarray(arrays["attr.name.indptr"]).tolist() if names else []
+    nodes  = [ { "_id" : node_ids[i], "name" : names[ starts[i] ] } if names and starts[i] < starts[i + 1] else { "_id" : node_ids[i] }
+               for i in rows.tolist() ]
+
+    # columns: the norm population, in uniprot AC order
+    accessions = _unpack_strings(arrays, "proteins")
+    omega      = sorted( np.asarray(arrays[f"omega.{norm}"]).tolist(), key=accessions.__getitem__ )
+    columns    = { accessions[p] : j for j, p in enumerate(omega) }
+    column_of  = np.full(len(accessions), -1, dtype=np.int64)
+    column_of[omega] = np.arange(len(omega))
+
+    indptr  = np.asarray(arrays[f"perc_{norm}.indptr"])
+    members = arrays[f"perc_{norm}.members"]
+    lengths = indptr[rows + 1] - indptr[rows]
+    # member positions of the selected rows, gathered at once
+    gather  = np.repeat(indptr[rows] - np.concatenate(( [0], np.cumsum(lengths)[:-1] )), lengths) + np.arange(lengths.sum())
+    cols    = column_of[ np.asarray(members[gather]) ] if len(gather) else np.zeros(0, dtype=np.int64)
+    row_of  = np.repeat(np.arange(len(rows)), lengths)
+    kept    = cols >= 0
+    M = csr_matrix( ( np.ones(int(kept.sum()), dtype=np.int64), (row_of[kept], cols[kept]) ), shape=(len(rows), len(omega)) )
+    M.sort_indices()
+    return nodes, M, columns
+
+def _protein_set(tree:GO_tree, proteins:list[ProteinRef], positions:np.ndarray)->Union[set, ProteinSet]:
+    if not tree.compact:
+        return set( proteins[i] for i in positions.tolist() )
+    return ProteinSet(tree.protein_index, positions=positions)
+
+def _pack_strings(arrays:dict, key:str, values:Iterable[str]):
+    """ store strings as one utf-8 blob and their offsets """
+    encoded = [ v.encode() for v in values ]
+    arrays[f"{key}.blob"]    = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    arrays[f"{key}.offsets"] = np.cumsum([0] + [ len(v) for v in encoded ], dtype=np.int64)
+
+def _unpack_strings(arrays:dict, key:str)->list[str]:
+    blob    = bytes(arrays[f"{key}.blob"])
+    offsets = arrays[f"{key}.offsets"].tolist()
+    return [ blob[a:b].decode() for a, b in zip(offsets[:-1], offsets[1:]) ]
+
+def read_snapshot(file_path:str, mmap=True)->dict[str, np.ndarray]:
+    """ Arrays of a snapshot archive, memory-mapped from the file if mmap is True """
+    if not mmap:
+        with np.load(file_path) as npz:
+            return { k : npz[k] for k in npz.files }
+
+    arrays = {}
+    with zipfile.ZipFile(file_path) as zf, open(file_path, "rb") as fp:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{file_path} member {info.filename} is compressed and can not be memory-mapped")
+            # data starts after the local file header, whose extra field may differ from the central directory one
+            fp.seek(info.header_offset)
+            name_len, extra_len = struct.unpack("<HH", fp.read(30)[26:30])
+            fp.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(fp)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(fp)
+            key = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if not np.prod(shape, dtype=np.int64):
+                arrays[key] = np.empty(shape, dtype=dtype)
+            else:
+                arrays[key] = np.memmap(file_path, dtype=dtype, mode="r", offset=fp.tell(), shape=shape,
+                                        order="F" if fortran_order else "C")
+    return arrays
@@ -1,16 +1,29 @@
 from .tree import GO_tree, NodeID, NodeName
+from .proteins import ProteinSet
+from . import profiling
 from uniprot_redis.store.schemas import UniprotAC, UniprotDatum
 import scipy.stats as stats 
-from typing import Literal, Union, Iterator
+from scipy.sparse import csr_matrix
+import numpy as np
+from concurrent.futures import Executor
+from typing import Literal, Optional, Union, Iterator, get_args
 
 SortCrit = Literal['pvalue', 'count', 'bkfq']
 OraNormalizer = Literal["background", "measured"]
+OraAlternative = Literal["two-sided", "less", "greater"]
+Correction     = Literal["bh", "bonferroni"]
+
+ORA_TABLE_DTYPE = [ ('go_id', object), ('name', object), ('count', np.int64),
+                    ('odds_ratio', np.float64), ('p_value', np.float64),
+                    ('s11', np.int64), ('s12', np.int64), ('s21', np.int64), ('s22', np.int64) ]
 
 class ORA_error(Exception):
     pass
     
+@profiling.timed_iter("score_ora_tree")
 def score_ora_tree(tree:GO_tree, delta_prot:Union[ Iterator[UniprotDatum], Iterator[UniprotAC]],
-                         norm:OraNormalizer="background"):
+                         norm:OraNormalizer="background", vectorized=False, n_jobs:int=1,
+                         n_permutations:int=0, seed:Optional[int]=None, executor:Optional[Executor]=None):
     """
     Compute pvalue of Fisher Test on every Go term
     Parameters : tree, a GO_tree object where both measured and background protein sets have been percolated
@@ -19,52 +32,92 @@ def score_ora_tree(tree:GO_tree, delta_prot:Union[ Iterator[UniprotDatum], Itera
                             - 'background' will use the whole proteome as background population
                             - 'measured' will use the experimentally measured proteome as background population
     Implicitly background protein sets is a superset of the measured which is a superset of the delta_prot
+    If vectorized is True, all GO terms are scored at once by score_ora_table
+    n_jobs > 1 implies vectorized scoring split over a pool of n_jobs processes
+    executor: process pool running these n_jobs chunks, reused across calls instead of a new pool per call
+    If n_permutations > 0, the Fisher tests are completed by empirical p-values over
+    n_permutations random samples (see permutation.score_ora_permutation), appended to each tuple
+    along with their family-wise adjusted value
     Returns:
 
     """
+    if n_permutations > 0:
+        from .permutation import score_ora_permutation, permutation_table_iter
+        yield from permutation_table_iter( score_ora_permutation(tree, delta_prot, n_permutations, norm,
+                                                                 alternative="two-sided", seed=seed, n_jobs=n_jobs,
+                                                                 executor=executor) )
+        return
+    if vectorized or n_jobs > 1:
+        yield from ora_table_iter( score_ora_table(tree, delta_prot, norm, n_jobs=n_jobs, executor=executor) )
+        return
+
     delta, N, pop_key = ora_validator(tree, delta_prot, norm)
+    delta_N = delta & N
 
     for n in tree.concrete_nodes():
-        _ = _node_ora(n, delta, N, pop_key)
+        _ = _node_ora(n, delta, N, pop_key, node_path(tree, n, N, pop_key), delta_N)
         if not _ is None:
             yield _
 
-def ora_validator(tree, delta_prot, norm):
-    """ coherce delta into strings, set the backgroud pop and convert it into strings
+def ora_population(tree, norm):
+    """ returns the population of reference proteins and the node key of their GO term members
     """
     if not tree.ora_rdy:
         raise ORA_error("GO term tree not ready")
-    inputs_as_string = False
     omega_bkg, omega_mea = tree.uniprot_omega
-    N = omega_bkg if norm == "background" else omega_mea
+    return omega_bkg if norm == "background" else omega_mea, f"perc_{norm}"
+
+def ora_validator(tree, delta_prot, norm):
+    """ coherce delta into strings, set the backgroud pop and convert it into strings
+    """
+    N, pop_key = ora_population(tree, norm)
     # consume iterator into persitent list of uniprotDatum and convert to uniprotACs
-    delta = set([ _ if type(_) is str else _.id for _ in delta_prot ])
-    N     = set([ _.id for _ in N ])
+    delta = set([ _ if isinstance(_, str) else _.id for _ in delta_prot ])
+    if tree.compact:
+        # ACs unknown to the tree protein index can not belong to N and are dropped
+        delta = ProteinSet(tree.protein_index, positions=tree.protein_index.positions_of(delta))
+    else:
+        # GO term populations lie within N (the union of the root ones), the sample is taken as the
+        # UniprotDatum of N so that populations are intersected as they are stored, without copies
+        members = tree.cached( ("population_members", pop_key), lambda: { _.id : _ for _ in N } )
+        delta   = set([ members[_] for _ in delta if _ in members ])
     
-    return delta, N, f"perc_{norm}"
+    return delta, N, pop_key
 
+@profiling.timed("compute_node_ora")
 def compute_node_ora(tree:GO_tree, delta_prot:Union[ Iterator[UniprotDatum], Iterator[UniprotAC]], 
                         go_id:Union[NodeID, NodeName],
                         norm:OraNormalizer="background"):
     delta, N , pop_key = ora_validator(tree, delta_prot, norm)
     n = tree.get_go_node(go_id)
-    return _node_ora(n, delta, N, pop_key)
+    return _node_ora(n, delta, N, pop_key, node_path(tree, n, N, pop_key))
 
-def _node_ora(n:dict, delta:set[UniprotAC], N:set[UniprotAC], pop_key):
-    
+def node_path(tree:GO_tree, n:dict, N, pop_key)->tuple:
+    """ population of the GO term and its number of members in N, the number only is cached on the tree until it changes
+    """
+    n_path = n[pop_key]
+    return n_path, tree.cached( ("node_path", pop_key, n['_id']), lambda: len(N & n_path) )
+
+def _node_ora(n:dict, delta:Union[set, ProteinSet], N:Union[set, ProteinSet], pop_key, path=None, delta_N=None):
+    """ delta, N: as returned by ora_validator
+        path: node_path of n, computed here if not provided
+        delta_N: delta & N, computed here if not provided
+    """
     # proteins abundant and path member
-    n_path = set( [ _.id for _ in n[pop_key] ] )
-    n_not_path = N - n_path
-    s11 = delta & n_path
+    if path is None:
+        path = n[pop_key], len(N & n[pop_key])
+    n_path, n_path_N = path
+    s11 = len(delta & n_path)
 
     if not s11:
         return None
     
-    delta_0  = N - delta
-    # proteins abundant and  not path member
-    s12 = delta   & n_not_path
-    s21 = delta_0 & n_path
-    s22 = delta_0 & n_not_path
+    delta_N = delta & N if delta_N is None else delta_N
+    # the contingency table is counted from set sizes: delta_0 = N - delta, n_not_path = N - n_path
+    s11_N = len(delta_N & n_path)
+    s12   = len(delta_N) - s11_N          # delta   & n_not_path
+    s21   = n_path_N - s11_N              # delta_0 & n_path
+    s22   = len(N) - len(delta_N) - s21   # delta_0 & n_not_path
     
     """     | Path   | not(Path)
     --------------------------s
@@ -74,10 +127,270 @@ def _node_ora(n:dict, delta:set[UniprotAC], N:set[UniprotAC], pop_key):
         
     """
     
-    odd_ratio, p_value = stats.fisher_exact( [ ( len( s11 ) , len( s12 ) ),
-                                                ( len( s21 ) , len( s22 ) )
+    profiling.count("fisher_tests")
+    odd_ratio, p_value = stats.fisher_exact( [ ( s11 , s12 ),
+                                                ( s21 , s22 )
                                             ])
-    return  ( n['_id'], n['name'], len(s11), odd_ratio, p_value,\
-                    [ ( len( s11 ) , len( s12 ) ),
-                        ( len( s21 ) , len( s22 ) )
-                ])
\ No newline at end of file
+    return  ( n['_id'], n['name'], s11, odd_ratio, p_value,\
+                    [ ( s11 , s12 ),
+                        ( s21 , s22 )
+                ])
+
+@profiling.timed("score_ora_table")
+def score_ora_table(tree:GO_tree, delta_prot:Union[ Iterator[UniprotDatum], Iterator[UniprotAC]],
+                         norm:OraNormalizer="background", alternative:OraAlternative="two-sided",
+                         n_jobs:int=1, executor:Optional[Executor]=None)->np.recarray:
+    """
+    Vectorized counterpart of score_ora_tree
+    The contingency tables of all GO terms are built at once from a sparse GO term x protein matrix
+    and the Fisher tests are computed as array operations over the hypergeometric distribution.
+    With n_jobs > 1, the GO terms are scored by a pool of n_jobs processes, or by executor if provided.
+    Returns a record array with one row per GO term carrying at least one protein of delta_prot,
+    in concrete_nodes order, with fields:
+        go_id, name, count, odds_ratio, p_value, s11, s12, s21, s22
+    """
+    return score_ora_samples(tree, [delta_prot], norm, alternative, n_jobs=n_jobs, executor=executor).table(0)
+
+def _ora_records(go_ids, names, s11, s12, s21, s22, odds_ratio, p_value)->np.recarray:
+    table = np.recarray( len(go_ids), dtype=ORA_TABLE_DTYPE )
+    table.go_id      = go_ids
+    table.name       = names
+    table.count      = s11
+    table.odds_ratio = odds_ratio
+    table.p_value    = p_value
+    table.s11, table.s12, table.s21, table.s22 = s11, s12, s21, s22
+    return table
+
+class OraBatch:
+    """ Sample x GO term matrices of a multi-sample ORA, as returned by score_ora_samples
+        Rows follow the samples order, columns the go_ids order (concrete nodes).
+        GO terms carrying no protein of a sample are not tested: their p-value is NaN.
+    """
+    def __init__(self, go_ids:list[NodeID], names:list[NodeName], s11, s12, s21, s22, odds_ratios, p_values,
+                 correction=None, adjusted=None):
+        self.go_ids      = go_ids
+        self.names       = names
+        self.counts      = s11
+        self.s11, self.s12, self.s21, self.s22 = s11, s12, s21, s22
+        self.odds_ratios = odds_ratios
+        self.p_values    = p_values
+        self.correction  = correction
+        self.adjusted    = adjusted
+
+    def __len__(self):
+        return self.p_values.shape[0]
+
+    def table(self, i_sample:int)->np.recarray:
+        """ record array of one sample, in the score_ora_table format """
+        hit = np.flatnonzero(self.s11[i_sample])
+        return _ora_records([ self.go_ids[i] for i in hit ], [ self.names[i] for i in hit ],
+                            *[ _[i_sample, hit] for _ in (self.s11, self.s12, self.s21, self.s22,
+                                                          self.odds_ratios, self.p_values) ])
+
+@profiling.timed("score_ora_samples")
+def score_ora_samples(tree:GO_tree, samples:Iterator[Union[ Iterator[UniprotDatum], Iterator[UniprotAC]]],
+                        norm:OraNormalizer="background", alternative:OraAlternative="two-sided",
+                        correction:Optional[Correction]=None, n_jobs:int=1, executor:Optional[Executor]=None)->OraBatch:
+    """
+    Score many "abundant" protein sets against the same percolated tree in one call
+    The GO term x protein matrix of the population is built once, the contingency tables
+    of all samples and GO terms come from a single sparse matrix product, and all Fisher tests
+    are vectorized. Optionally apply a multiple testing correction per sample
+    ("bh": Benjamini-Hochberg, "bonferroni") over the tested GO terms of that sample.
+    With n_jobs > 1, the samples (or the GO terms if there are fewer samples than jobs) are split
+    across a pool of n_jobs processes sharing the population matrix, with identical results.
+    executor: process pool running these n_jobs chunks, reused across calls (see parallel.process_pool)
+    """
+    N, pop_key        = ora_population(tree, norm)
+    nodes, M, columns = tree.cached( ("population_matrix", pop_key), lambda: population_matrix(tree, N, pop_key) )
+    return score_population(nodes, M, columns, samples, alternative, correction, n_jobs, executor)
+
+def score_population(nodes:list[dict], M:csr_matrix, columns:dict[UniprotAC, int],
+                     samples:Iterator[Union[ Iterator[UniprotDatum], Iterator[UniprotAC]]],
+                     alternative:OraAlternative="two-sided", correction:Optional[Correction]=None, n_jobs:int=1,
+                     executor:Optional[Executor]=None)->OraBatch:
+    """ score_ora_samples over a population_matrix (nodes, M, columns), eg: as read from a snapshot
+        by snapshot.load_population, without the tree
+    """
+    D = sample_matrix(samples, columns)
+    if n_jobs > 1:
+        from .parallel import parallel_score_counts
+        s11, s12, s21, s22, odds_ratios, p_values = parallel_score_counts(M, D, alternative, n_jobs, executor)
+    else:
+        s11, s12, s21, s22, odds_ratios, p_values = score_counts(M, D, alternative)
+
+    adjusted = None
+    if not correction is None:
+        adjusted = np.vstack([ adjust_pvalues(_, correction) for _ in p_values ]) if len(p_values) \
+                   else np.full(p_values.shape, np.nan)
+
+    return OraBatch([ n['_id'] for n in nodes ], [ n['name'] for n in nodes ],
+                    s11, s12, s21, s22, odds_ratios, p_values, correction, adjusted)
+
+def score_counts(M:csr_matrix, D:csr_matrix, alternative:OraAlternative="two-sided"):
+    """ sample x GO term contingency counts, odds ratios and p-values of the population matrix M
+        against the protein x sample indicator matrix D. Untested GO terms have NaN statistics
+    """
+    s11, s12, s21, s22 = contingency_counts(M, D)
+    odds_ratios = np.full(s11.shape, np.nan)
+    p_values    = np.full(s11.shape, np.nan)
+    hit = s11 > 0
+    odds_ratios[hit], p_values[hit] = fisher_exact_vec(s11[hit], s12[hit], s21[hit], s22[hit], alternative)
+    return s11, s12, s21, s22, odds_ratios, p_values
+
+def adjust_pvalues(p_values, method:Correction="bh")->np.ndarray:
+    """ Multiple testing correction of a p-value array, NaN values are left out of the family """
+    p_values = np.asarray(p_values, dtype=np.float64)
+    adjusted = np.full(p_values.shape, np.nan)
+    tested   = np.flatnonzero(~np.isnan(p_values))
+    m        = len(tested)
+    if not m:
+        return adjusted
+    p = p_values[tested]
+    if method == "bonferroni":
+        adjusted[tested] = np.minimum(p * m, 1.0)
+    elif method == "bh":
+        order = np.argsort(p, kind="stable")
+        ranked = p[order] * m / np.arange(1, m + 1)
+        ranked = np.minimum.accumulate(ranked[::-1])[::-1]
+        adjusted[ tested[order] ] = np.minimum(ranked, 1.0)
+    else:
+        raise ValueError(f"Unknown multiple testing correction \"{method}\", valid ones are {get_args(Correction)}")
+    return adjusted
+
+def ora_table_iter(table:np.recarray):
+    """ tuple view of an ORA record array, in the score_ora_tree/compute_node_ora format """
+    for r in table:
+        yield ( r.go_id, r.name, int(r.count), float(r.odds_ratio), float(r.p_value),
+                [ ( int(r.s11), int(r.s12) ),
+                  ( int(r.s21), int(r.s22) )
+                ])
+
+def _as_ids(proteins)->set[UniprotAC]:
+    if isinstance(proteins, ProteinSet):
+        return proteins.ids()
+    return set( _ if isinstance(_, str) else _.id for _ in proteins )
+
+def sample_matrix(samples, columns:dict[UniprotAC, int])->csr_matrix:
+    """ Sparse protein x sample indicator matrix, proteins outside the columns population are ignored """
+    indptr  = [0]
+    indices = []
+    for delta_prot in samples:
+        indices.extend( sorted( columns[_] for _ in _as_ids(delta_prot) if _ in columns ) )
+        indptr.append( len(indices) )
+    D = csr_matrix( ( np.ones(len(indices), dtype=np.int64), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64) ),
+                    shape=(len(indptr) - 1, len(columns)) )
+    return D.T.tocsr()
+
+def contingency_counts(M:csr_matrix, D:csr_matrix)->tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """ s11, s12, s21, s22 sample x GO term count matrices from the GO term x protein population matrix
+        and the protein x sample indicator matrix
+    """
+    s11 = (M @ D).toarray().T
+    n   = np.asarray( D.sum(axis=0) ).reshape(-1, 1)
+    K   = np.diff(M.indptr).reshape(1, -1)
+    s12 = n - s11
+    s21 = K - s11
+    s22 = M.shape[1] - n - s21
+    return s11, s12, s21, s22
+
+@profiling.timed("population_matrix")
+def population_matrix(tree:GO_tree, N, pop_key)->tuple[list[dict], csr_matrix, dict[UniprotAC, int]]:
+    """ Sparse GO term x protein membership matrix of the concrete nodes, restricted to the N population
+        Returns the list of concrete nodes (matrix rows), the matrix, and the protein AC to column mapping
+    """
+    columns = { uniprot_id : i for i, uniprot_id in enumerate( sorted(_as_ids(N)) ) }
+    nodes   = []
+    indptr  = [0]
+    indices = []
+    for n in tree.concrete_nodes():
+        nodes.append(n)
+        indices.extend( sorted( columns[_.id] for _ in n.get(pop_key, ()) if _.id in columns ) )
+        indptr.append( len(indices) )
+    M = csr_matrix( ( np.ones(len(indices), dtype=np.int64), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64) ),
+                    shape=(len(nodes), len(columns)) )
+    return nodes, M, columns
+
+def fisher_exact_vec(s11, s12, s21, s22, alternative:OraAlternative="two-sided")->tuple[np.ndarray, np.ndarray]:
+    """ Element-wise scipy.stats.fisher_exact over arrays of 2x2 contingency tables
+            | s11 | s12
+            | s21 | s22
+        Follows the scipy computation, where the two-sided p-value binary search over the
+        hypergeometric pmf is run simultaneously for all tables.
+        Returns the arrays of odds ratios and p-values
+    """
+    c00, c01, c10, c11 = [ np.asarray(_, dtype=np.int64) for _ in (s11, s12, s21, s22) ]
+    profiling.count("fisher_tests", c00.size)
+    odds_ratio = np.full(c00.shape, np.nan)
+    p_value    = np.ones(c00.shape)
+
+    # If both values in a row or column are zero, the p-value is 1 and the odds ratio is NaN.
+    ok = (c00 + c01 > 0) & (c10 + c11 > 0) & (c00 + c10 > 0) & (c01 + c11 > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        odds_ratio[ok] = np.where( (c10 > 0) & (c01 > 0), c00 * c11 / (c10 * c01), np.inf )[ok]
+
+    x  = c00[ok]
+    n1 = (c00 + c01)[ok]
+    n2 = (c10 + c11)[ok]
+    n  = (c00 + c10)[ok]
+    hypergeom = stats.hypergeom(n1 + n2, n1, n)
+
+    if alternative == "less":
+        p = hypergeom.cdf(x)
+    elif alternative == "greater":
+        p = stats.hypergeom.cdf(c01[ok], n1 + n2, n1, (c01 + c11)[ok])
+    elif alternative == "two-sided":
+        mode   = ( (n + 1) * (n1 + 1) / (n1 + n2 + 2) ).astype(np.int64)
+        pexact = hypergeom.pmf(x)
+        pmode  = hypergeom.pmf(mode)
+        epsilon = 1e-14
+        gamma   = 1 + epsilon
+
+        p     = np.ones(x.shape)
+        at_mode = np.abs(pexact - pmode) / np.maximum(pexact, pmode) <= epsilon
+        lower   = ~at_mode & (x < mode)
+        upper   = ~at_mode & ~lower
+
+        # x below the mode: tail on the left plus the tail of lower pmf on the right of the mode
+        p[lower] = hypergeom.cdf(x)[lower]
+        search   = lower & ~( hypergeom.pmf(n) > pexact * gamma )
+        guess    = _pmf_binary_search(n1 + n2, n1, n, -1, pexact * gamma, mode, n, search)
+        p[search] += stats.hypergeom.sf(guess[search], (n1 + n2)[search], n1[search], n[search])
+
+        # x above the mode: tail on the right plus the tail of lower pmf on the left of the mode
+        p[upper] = hypergeom.sf(x - 1)[upper]
+        search   = upper & ~( hypergeom.pmf(0) > pexact * gamma )
+        guess    = _pmf_binary_search(n1 + n2, n1, n, 1, pexact * gamma, np.zeros_like(mode), mode, search)
+        p[search] += stats.hypergeom.cdf(guess[search], (n1 + n2)[search], n1[search], n[search])
+    else:
+        raise ValueError("`alternative` should be one of {'two-sided', 'less', 'greater'}")
+
+    p_value[ok] = np.minimum(p, 1.0)
+    return odds_ratio, p_value
+
+def _pmf_binary_search(M, n, N, sign, d, lo, hi, active):
+    """ Vectorized scipy _binary_search_for_binom_tst over a = sign * hypergeom.pmf and searched value sign * d
+        Returns for each active element the index i between lo and hi such that a(i) <= sign * d < a(i+1)
+    """
+    lo, hi = lo.copy(), hi.copy()
+    d      = sign * d
+    found  = np.full(lo.shape, -1, dtype=np.int64)
+    running = active.copy()
+    while True:
+        running &= (lo < hi)
+        if not running.any():
+            break
+        i      = np.flatnonzero(running)
+        mid    = lo[i] + (hi[i] - lo[i]) // 2
+        midval = sign * stats.hypergeom.pmf(mid, M[i], n[i], N[i])
+        below  = midval < d[i]
+        above  = midval > d[i]
+        lo[ i[below] ] = mid[below] + 1
+        hi[ i[above] ] = mid[above] - 1
+        equal = ~below & ~above
+        found[ i[equal] ] = mid[equal]
+        running[ i[equal] ] = False
+
+    i = np.flatnonzero(active & (found < 0))
+    found[i] = np.where( sign * stats.hypergeom.pmf(lo[i], M[i], n[i], N[i]) <= d[i], lo[i], lo[i] - 1 )
+    return found
@@ -0,0 +1,194 @@
+""" Topology aware ORA
+
+GO terms are not independent: the population of a term contains the ones of all its descendants,
+so that the parents of a significant term tend to be significant as well. The algorithms below
+decorrelate the tests along the DAG, after topGO (Alexa et al. 2006) and Grossmann et al. 2007:
+    - elim: proteins of a significant term are removed from the populations of its ancestors
+    - weight_single_pass: proteins of a term get a weight in each ancestor, lowered when a child
+      term is more significant than its parent. A single pass approximation of topGO's weight
+      algorithm, see _weight
+    - parent_child: a term is tested against the union of its parents' populations instead of
+      the whole reference population
+
+elim and weight_single_pass run as one bottom-up pass over the DAG. Terms are grouped by height (longest
+path down to a leaf), every group only depends on the lower ones and is scored at once with
+fisher_exact_vec. Term populations are handled as bitmaps (elim, parent_child) or as weight
+arrays aligned with the rows of the population matrix (weight_single_pass).
+"""
+from typing import Iterator, Literal, Union, get_args
+import numpy as np
+
+from .tree import GO_tree
+from .proteins import popcount
+from . import profiling
+from .statistics import OraNormalizer, OraAlternative, ora_population, population_matrix, \
+                        sample_matrix, fisher_exact_vec, _ora_records
+from uniprot_redis.store.schemas import UniprotAC, UniprotDatum
+
+TopologyAlgorithm = Literal["elim", "weight_single_pass", "parent_child"]
+
+@profiling.timed("score_ora_topology")
+def score_ora_topology(tree:GO_tree, delta_prot:Union[ Iterator[UniprotDatum], Iterator[UniprotAC]],
+                          algorithm:TopologyAlgorithm="elim", norm:OraNormalizer="background",
+                          alternative:OraAlternative="greater", cutoff:float=0.01)->np.recarray:
+    """
+    Topology aware counterpart of score_ora_table
+    algorithm: "elim", "weight_single_pass" or "parent_child", see module docstring
+    cutoff: p-value below which a term is significant, and its proteins eliminated from its ancestors (elim only)
+    alternative defaults to "greater" (enrichment), which the elim and weight algorithms are designed for.
+    Returns a record array with one row per GO term carrying at least one protein of delta_prot,
+    in concrete_nodes order, in the score_ora_table format. Counts are those of the final test of
+    each term (eg: after elimination), weighted counts are rounded.
+    """
+    N, pop_key        = ora_population(tree, norm)
+    nodes, M, columns = tree.cached( ("population_matrix", pop_key), lambda: population_matrix(tree, N, pop_key) )
+    in_delta = sample_matrix([delta_prot], columns).toarray()[:, 0] > 0
+    children, parents = _row_adjacency(tree, nodes)
+
+    if algorithm == "elim":
+        s11, s12, s21, s22, odds_ratio, p_value = _elim(M, in_delta, children, parents, alternative, cutoff)
+    elif algorithm == "weight_single_pass":
+        s11, s12, s21, s22, odds_ratio, p_value = _weight(M, in_delta, children, parents, alternative)
+    elif algorithm == "parent_child":
+        s11, s12, s21, s22, odds_ratio, p_value = _parent_child(M, in_delta, parents, alternative)
+    else:
+        raise ValueError(f"Unknown algorithm \"{algorithm}\", valid ones are {get_args(TopologyAlgorithm)}")
+
+    # same rows as score_ora_table: terms whose population holds at least one delta protein
+    hit = np.flatnonzero( M @ in_delta.astype(np.int64) )
+    return _ora_records([ nodes[i]['_id'] for i in hit ], [ nodes[i]['name'] for i in hit ],
+                        *[ _[hit] for _ in (s11, s12, s21, s22, odds_ratio, p_value) ])
+
+def _row_adjacency(tree:GO_tree, nodes:list[dict])->tuple[list[list[int]], list[list[int]]]:
+    """ children and parents of each population matrix row, as row indices """
+    row = { n['_id'] : i for i, n in enumerate(nodes) }
+    children = [ [] for _ in nodes ]
+    parents  = [ [] for _ in nodes ]
+    for i, n in enumerate(nodes):
+        for child_id in tree.successors(n['_id']):
+            if child_id in row:
+                children[i].append(row[child_id])
+                parents[ row[child_id] ].append(i)
+    return children, parents
+
+def _levels(children:list[list[int]])->list[np.ndarray]:
+    """ rows grouped by height, leaves first """
+    height = [ -1 ] * len(children)
+    for i in range(len(children)):
+        stack = [ i ]
+        while stack:
+            j = stack[-1]
+            pending = [ c for c in children[j] if height[c] < 0 ]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            if height[j] < 0:
+                height[j] = 1 + max( (height[c] for c in children[j]), default=-1 )
+    height = np.array(height, dtype=np.int64)
+    order  = np.argsort(height, kind="stable")
+    bounds = np.flatnonzero(np.diff(height[order])) + 1
+    return np.split(order, bounds) if len(order) else []
+
+def _row_bitmaps(M)->list[int]:
+    """ python int bitmap of the columns of each row of a CSR matrix """
+    n_bytes = (M.shape[1] + 7) // 8
+    bitmaps = []
+    for i in range(M.shape[0]):
+        cols = M.indices[ M.indptr[i]:M.indptr[i + 1] ]
+        mask = np.zeros(n_bytes, dtype=np.uint8)
+        np.bitwise_or.at(mask, cols >> 3, (1 << (cols & 7)).astype(np.uint8))
+        bitmaps.append( int.from_bytes(mask.tobytes(), "little") )
+    return bitmaps
+
+def _counts(K, s11, n, total):
+    """ contingency table of terms of K proteins, s11 of them in the n delta proteins, out of total """
+    s11 = np.asarray(s11, dtype=np.int64)
+    s12 = n - s11
+    s21 = np.asarray(K, dtype=np.int64) - s11
+    s22 = total - n - s21
+    return s11, s12, s21, s22
+
+def _elim(M, in_delta, children, parents, alternative, cutoff):
+    n_rows   = M.shape[0]
+    genes    = _row_bitmaps(M)
+    delta    = int.from_bytes(np.packbits(in_delta, bitorder="little").tobytes(), "little")
+    n, total = int(in_delta.sum()), M.shape[1]
+    removed  = [ 0 ] * n_rows # proteins of the significant descendants of each term
+    stats    = np.zeros((6, n_rows))
+    for rows in _levels(children):
+        effective = [ genes[i] & ~removed[i] for i in rows ]
+        s11, s12, s21, s22 = _counts([ popcount(e) for e in effective ], [ popcount(e & delta) for e in effective ], n, total)
+        odds_ratio, p_value = fisher_exact_vec(s11, s12, s21, s22, alternative)
+        stats[:, rows] = s11, s12, s21, s22, odds_ratio, p_value
+        for i, e, p in zip(rows.tolist(), effective, p_value.tolist()):
+            eliminated = removed[i] | e if p < cutoff else removed[i]
+            if eliminated:
+                for j in parents[i]:
+                    removed[j] |= eliminated
+    return _unstack(stats)
+
+def _weight(M, in_delta, children, parents, alternative):
+    """ single bottom-up pass approximation of topGO's weight algorithm
+        Each level is tested once with the weights inherited from the children, then the weights of
+        the proteins of children more significant than their parent are lowered by the p-value ratio,
+        and the level is tested again. Unlike topGO, a parent more significant than its children does
+        not lower their weights in turn and children are never re-scored, so that a term p-value only
+        depends on its descendants. Weighted counts are rounded to integers for the Fisher tests.
+    """
+    n_rows   = M.shape[0]
+    n, total = int(in_delta.sum()), M.shape[1]
+    weights  = [ None ] * n_rows
+    p_values = np.ones(n_rows)
+    stats    = np.zeros((6, n_rows))
+
+    def weighted_tests(rows):
+        K   = [ np.rint(weights[i].sum()) for i in rows ]
+        s11 = [ np.rint(weights[i][ in_delta[ M.indices[ M.indptr[i]:M.indptr[i + 1] ] ] ].sum()) for i in rows ]
+        s11, s12, s21, s22 = _counts(K, s11, n, total)
+        return (s11, s12, s21, s22) + fisher_exact_vec(s11, s12, s21, s22, alternative)
+
+    for rows in _levels(children):
+        positions = {}
+        # protein weights are inherited from the children, as their lowest value
+        for i in rows.tolist():
+            cols = M.indices[ M.indptr[i]:M.indptr[i + 1] ]
+            w    = np.ones(len(cols))
+            for c in children[i]:
+                positions[(i, c)] = np.searchsorted(cols, M.indices[ M.indptr[c]:M.indptr[c + 1] ])
+                w[ positions[(i, c)] ] = np.minimum(w[ positions[(i, c)] ], weights[c])
+            weights[i] = w
+        p_value = weighted_tests(rows)[-1]
+        # children more significant than their parent lower the weight of their proteins in the parent
+        for i, p in zip(rows.tolist(), p_value.tolist()):
+            for c in children[i]:
+                if p_values[c] < p:
+                    weights[i][ positions[(i, c)] ] *= p_values[c] / p
+        stats[:, rows] = weighted_tests(rows)
+        p_values[rows] = stats[5, rows]
+    return _unstack(stats)
+
+def _parent_child(M, in_delta, parents, alternative):
+    genes = _row_bitmaps(M)
+    delta = int.from_bytes(np.packbits(in_delta, bitorder="little").tobytes(), "little")
+    K, s11, n, total = [], [], [], []
+    everything = (1 << M.shape[1]) - 1
+    for i, g in enumerate(genes):
+        # roots are tested against the whole population
+        universe = everything
+        if parents[i]:
+            universe = 0
+            for j in parents[i]:
+                universe |= genes[j]
+        # percolated populations are nested, the term ones lie within its universe
+        K.append(popcount(g))
+        s11.append(popcount(g & delta))
+        n.append(popcount(universe & delta))
+        total.append(popcount(universe))
+    n, total = np.array(n, dtype=np.int64), np.array(total, dtype=np.int64)
+    s11, s12, s21, s22 = _counts(K, s11, n, total)
+    return (s11, s12, s21, s22) + fisher_exact_vec(s11, s12, s21, s22, alternative)
+
+def _unstack(stats:np.ndarray):
+    s11, s12, s21, s22 = [ _.astype(np.int64) for _ in stats[:4] ]
+    return s11, s12, s21, s22, stats[4], stats[5]
@@ -1,12 +1,16 @@
 import networkx as nx
-from typing import Iterator, Union, NewType, Literal, get_args
+from typing import Callable, Hashable, Iterable, Iterator, Union, NewType, Literal, get_args
 from networkx.classes.digraph import DiGraph
-from .io_obo import obo_node_buffer_iter
+from .io_obo import obo_stanza_iter
 from uniprot_redis.store.schemas import UniprotDatum, UniprotAC
 from pyproteinsext.uniprot import Entry as Uniprot
 
 from .type_checkers import literal_arg_checker
-import sys
+from .proteins import ProteinIndex, ProteinSet, ProteinRef
+from .closure import ClosureIndex
+from . import profiling
+from collections import Counter
+import sys, threading
 
 NodeID   = NewType("NodeID", str)
 NodeName = NewType("NodeName", str)
@@ -15,19 +19,121 @@ PercolateType = Literal["background", "measured", "both"]
 
 import re
 
+GO_ID = re.compile(r'^GO:[0-9]+')
 
-class GO_tree(nx.DiGraph):
+class _Obsolete:
+    """ resolution table record of an obsolete term without replaced_by """
+    __slots__ = ("node_id", "node")
+
+    def __init__(self, node_id:NodeID, node:dict):
+        self.node_id = node_id
+        self.node    = node
+
+class LoadSummary:
+    """ Outcome of a protein load into a GO_tree """
     def __init__(self):
+        self.records     = 0         # protein records read
+        self.proteins    = set()     # uniprot ACs attached to at least one GO term
+        self.annotations = 0         # protein x GO term attachments
+        self.unmatched   = Counter() # GO identifiers not found in the tree -> number of records
+        self.obsolete    = Counter() # obsolete GO terms without replacement -> number of attached proteins
+
+    def __repr__(self):
+        return f"LoadSummary({self.records} records, {len(self.proteins)} proteins, " + \
+               f"{self.annotations} annotations, {len(self.unmatched)} unmatched GO ids)"
+
+    def report(self, fp=None):
+        fp = sys.stderr if fp is None else fp
+        if self.unmatched:
+            most_common = ', '.join(f"{go_id} ({n})" for go_id, n in self.unmatched.most_common(5))
+            fp.write(f"{len(self.unmatched)} GO identifiers not found in tree, eg: {most_common}\n")
+        if self.obsolete:
+            most_common = ', '.join(f"{go_id} ({n})" for go_id, n in self.obsolete.most_common(5))
+            fp.write(f"{len(self.obsolete)} obsolete GO terms with no valid term to replace them carry proteins, eg: {most_common}\n")
+
+class GO_tree(nx.DiGraph):
+    def __init__(self, compact=False):
+        """ compact: store node protein populations over a tree-wide protein index (see ProteinSet)
+            instead of python sets of UniprotDatum. Populations take about 3 times less memory,
+            but percolation is about 2 times slower and loading or scoring the whole tree is not faster.
+        """
+        self.version     = 0
+        self._closure    = None
+        self._resolution = None
+        self._cache      = {}
+        self._cache_lock = threading.Lock()
+        self._cache_version = 0
         super().__init__()
+        self.protein_index       = ProteinIndex() if compact else None
         self.protein_load_status = (False, False)
         self.percolated_status   = (False, False)
-        self.uniprot_omega       = (set(), set()) # background uniprot data, measured uniprot data
+        self.uniprot_omega       = (self.new_protein_set(), self.new_protein_set()) # background uniprot data, measured uniprot data
         self.names_index = {}
+        self.slim_map    = {} # GO identifier left out of a GO slim -> its closest slim terms, see reader
+        self._direct     = {} # population -> direct annotations index, see _direct_annotations
+        self.obsolete_warnings = Counter()
+
+    @property
+    def compact(self)->bool:
+        return not self.protein_index is None
+
+    def new_protein_set(self, proteins:Iterable[Union[UniprotDatum, Uniprot]]=())->Union[set, ProteinSet]:
+        """ Returns a new protein collection of the tree representation: python set or ProteinSet bitmap """
+        if not self.compact:
+            return set(proteins)
+        if isinstance(proteins, ProteinSet):
+            return proteins.copy()
+        return ProteinSet(self.protein_index, proteins)
+
+    @property
+    def closure(self)->ClosureIndex:
+        """ Transitive closure index of the DAG, built on first access and dropped on any node/edge mutation """
+        if self._closure is None:
+            self._closure = ClosureIndex(self)
+        return self._closure
+
+    def _topology_changed(self):
+        self._closure    = None
+        self._resolution = None
+        self._changed()
+
+    def _changed(self):
+        """ bump the version of the tree, invalidating the cached values """
+        self.version += 1
+
+    def cached(self, key:Hashable, build:Callable):
+        """ build() memoized under key until the tree version changes (protein load/clear, percolation, mutation)
+            Safe to share between threads reading the tree: build() runs outside the lock, so that readers are
+            not serialized behind it, and the first value published for a key is the one everybody gets
+        """
+        with self._cache_lock:
+            if self._cache_version != self.version:
+                self._cache = {}
+                self._cache_version = self.version
+            cache = self._cache
+            if key in cache:
+                return cache[key]
+        value = build()
+        with self._cache_lock:
+            # a tree change while building left cache detached, value is returned but not kept
+            return cache.setdefault(key, value)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_cache_lock']
+        state['_cache'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault('slim_map', {})
+        self._cache_lock = threading.Lock()
+
     def add_node(self, id, **params):
         """
         nx add_node wrapper to account for node aliases
         """
-
+        self._topology_changed()
         super(GO_tree, self).add_node(id, **params)
         if 'name' in params:
             self.names_index[ params['name'] ] = id
@@ -38,7 +144,56 @@ class GO_tree(nx.DiGraph):
             for alt_id in alt_ids:
                 super(GO_tree, self).add_node(alt_id, alias_to = real_n, _id = alt_id)
     
-    def get_go_node(self, node_id:Union[NodeID, NodeName], many_to_consider=False)->Union[dict, list[dict]]:
+    # nx mutators wrappers for closure index invalidation
+    def add_nodes_from(self, *args, **kwargs):
+        self._topology_changed()
+        super(GO_tree, self).add_nodes_from(*args, **kwargs)
+
+    def remove_node(self, *args, **kwargs):
+        self._topology_changed()
+        super(GO_tree, self).remove_node(*args, **kwargs)
+
+    def remove_nodes_from(self, *args, **kwargs):
+        self._topology_changed()
+        super(GO_tree, self).remove_nodes_from(*args, **kwargs)
+
+    def add_edge(self, *args, **kwargs):
+        self._topology_changed()
+        super(GO_tree, self).add_edge(*args, **kwargs)
+
+    def add_edges_from(self, *args, **kwargs):
+        self._topology_changed()
+        super(GO_tree, self).add_edges_from(*args, **kwargs)
+
+    def remove_edge(self, *args, **kwargs):
+        self._topology_changed()
+        super(GO_tree, self).remove_edge(*args, **kwargs)
+
+    def remove_edges_from(self, *args, **kwargs):
+        self._topology_changed()
+        super(GO_tree, self).remove_edges_from(*args, **kwargs)
+
+    def clear(self):
+        self._topology_changed()
+        super(GO_tree, self).clear()
+
+    def clear_edges(self):
+        self._topology_changed()
+        super(GO_tree, self).clear_edges()
+
+    def ancestor_ids(self, node_id:Union[NodeID, NodeName])->set[NodeID]:
+        """ ids of all the ancestors of a node, from the closure index """
+        return set( self.closure.ancestors(self.get_go_node(node_id)['_id']) )
+
+    def descendant_ids(self, node_id:Union[NodeID, NodeName])->set[NodeID]:
+        """ ids of all the descendants of a node, from the closure index """
+        return set( self.closure.descendants(self.get_go_node(node_id)['_id']) )
+
+    def is_ancestor(self, ancestor_id:Union[NodeID, NodeName], node_id:Union[NodeID, NodeName])->bool:
+        """ True if ancestor_id is a strict ancestor of node_id, aliases are forwarded to their concrete node """
+        return self.closure.is_ancestor( self.get_go_node(ancestor_id)['_id'], self.get_go_node(node_id)['_id'] )
+
+    def get_go_node(self, node_id:Union[NodeID, NodeName], many_to_consider=False, warn=True)->Union[dict, list[dict]]:
         """
         nx G.node wrapper for the automatic forward of alias go_id to concrete node 
         
@@ -87,35 +242,79 @@ class GO_tree(nx.DiGraph):
 
         Seems like the above reciprocal, the term itself no longer used and replaced by a single 
         term. We silently forward from the deprecated to the replacement one. 
+
+        Identifiers, alt_ids and names are resolved through a table built on first call and dropped
+        on any node/edge mutation. Warnings on obsolete terms are written once per term, all accesses
+        being counted in the obsolete_warnings attribute. warn=False skips them altogether.
         """
 
-        isGOterm = lambda value: True if re.match(r'^GO:[0-9]+', value) else False
+        if self._resolution is None:
+            self._resolution = self._resolution_table()
+        try:
+            resolved = self._resolution[node_id]
+        except KeyError:
+            if not GO_ID.match(node_id):
+                raise KeyError(f"This value \"{node_id}\" is not a GO identifier or a GO name") from None
+            raise KeyError(node_id) from None
+        if not profiling.STATS is None:
+            profiling.STATS.count("get_go_node")
+            if not type(resolved) is _Obsolete and resolved.get('_id', node_id) != node_id and GO_ID.match(node_id):
+                profiling.STATS.count("alias_forwards")
+        if not type(resolved) is _Obsolete:
+            return resolved
+        return self._resolve_obsolete(resolved, many_to_consider, warn)
 
-        if not isGOterm(node_id):
-            if not node_id in self.names_index:
-                raise KeyError(f"This value \"{node_id}\" is not a GO identifier or a GO name")
-            node_id = self.names_index[node_id]
+    def resolve_many(self, node_ids:Iterable[Union[NodeID, NodeName]], many_to_consider=False, warn=True)->dict[str, Union[dict, list[dict], None]]:
+        """ get_go_node over many identifiers or names at once
+            Returns a dictionary of the resolved values, identifiers unknown to the tree are left out
+        """
+        resolved = {}
+        for node_id in node_ids:
+            try:
+                resolved[node_id] = self.get_go_node(node_id, many_to_consider, warn)
+            except KeyError:
+                continue
+        return resolved
 
-        _ = self.nodes[node_id]
-        
-        if "alias_to" in _:
-            return _["alias_to"]
-        
-        if not 'is_obsolete' in _: 
-            return _
-        
-        if 'replaced_by' in _:
-            return self.nodes[ _['replaced_by'] ]
-        
+    def _resolution_table(self)->dict[str, Union[dict, "_Obsolete"]]:
+        """ every GO identifier, alt_id and name mapped to its concrete node,
+            or to an _Obsolete record for the obsolete terms that can not be forwarded to a single node
+        """
+        table = {}
+        for node_id, _ in self.nodes.items():
+            if "alias_to" in _:
+                table[node_id] = _["alias_to"]
+            elif not 'is_obsolete' in _:
+                table[node_id] = _
+            elif 'replaced_by' in _:
+                if _['replaced_by'] in self.nodes:
+                    table[node_id] = self.nodes[ _['replaced_by'] ]
+            else:
+                table[node_id] = _Obsolete(node_id, _)
+        for name, node_id in self.names_index.items():
+            if node_id in table and not GO_ID.match(name):
+                table[name] = table[node_id]
+        return table
+
+    def _resolve_obsolete(self, obsolete:"_Obsolete", many_to_consider:bool, warn:bool)->Union[dict, list[dict], None]:
+        profiling.count("obsolete_forwards")
+        _ = obsolete.node
         if not 'consider' in _:
-            sys.stderr.write(f"{node_id} is an obsolete GO term with no valid term to replace it\n")
+            if warn:
+                self._warn_obsolete(obsolete.node_id, f"{obsolete.node_id} is an obsolete GO term with no valid term to replace it\n")
             return _
         if not many_to_consider:
-            sys.stderr.write(f"{node_id} is an obsolete GO term, please consider \"{ ','.join(_['consider']) }\"\n")
+            if warn:
+                self._warn_obsolete(obsolete.node_id, f"{obsolete.node_id} is an obsolete GO term, please consider \"{ ','.join(_['consider']) }\"\n")
             return None
-        return [ self.get_go_node(valid_go_id) for valid_go_id in _['consider'] ]
-    
- 
+        return [ self.get_go_node(valid_go_id, warn=warn) for valid_go_id in _['consider'] ]
+
+    def _warn_obsolete(self, node_id:NodeID, message:str):
+        """ obsolete term accesses are counted in obsolete_warnings, only the first one is written to stderr """
+        if not node_id in self.obsolete_warnings:
+            sys.stderr.write(message)
+        self.obsolete_warnings[node_id] += 1
+
     def view_go_node(self, go_id:str)->dict:
         """ returns string representation of concrete node where proteins values are simply represented by their uniprotID """
         n = self.get_go_node(go_id)
@@ -156,38 +355,209 @@ class GO_tree(nx.DiGraph):
                     yield _
 
     @literal_arg_checker
-    def load_proteins(self, k:ProteinsType, protein_coll:Iterator[ Union[UniprotDatum, Uniprot] ]) -> None:
+    @profiling.timed("load_proteins")
+    def load_proteins(self, k:ProteinsType, protein_coll:Iterator[ Union[UniprotDatum, Uniprot] ]) -> LoadSummary:
         """
         Iterate through a uniprot datum collection and attach UniprotDatum to 
         corresponding concerte node to background or measured attribute
         we eventually forward obsolete entry to their many valid nodes
+        GO identifiers missing from the tree are reported once, in the returned LoadSummary
         """
         self.clear_proteins(k)
+        summary = LoadSummary()
         for unip_datum in protein_coll:
-            for go_datum in unip_datum.go:
-                try:
-                    go_node = self.get_go_node(go_datum.id, many_to_consider=True)
-                    go_node = [ go_node ] if not type(go_node) is list else go_node
-                    for g in go_node:
-                        if not k in g:
-                            g[k] = set()
-                        g[k].add(unip_datum)
-                except KeyError as e:
-                    print(f"{go_datum.id} not found")
-                    print(e)
+            self._attach_protein(k, unip_datum, [ go_datum.id for go_datum in unip_datum.go ], summary)
+
+        self.protein_load_status = (True, self.protein_load_status[1]) if k == "background" \
+        else (self.protein_load_status[0], True)
+        self._changed()
+        summary.report()
+        return summary
+
+    @literal_arg_checker
+    @profiling.timed("load_annotations")
+    def load_annotations(self, k:ProteinsType, annotations:Iterator[ tuple[UniprotAC, Iterable[str]] ]) -> LoadSummary:
+        """
+        Streaming counterpart of load_proteins, from (uniprot AC, GO identifiers) records
+        as produced by the obogo.annotations readers (UniProt XML, UniProt TSV, GAF).
+        Records are attached one at a time, the same protein may appear in several records.
+        Proteins are stored as ProteinRef records, carrying their uniprot accession only.
+        """
+        self.clear_proteins(k)
+        summary = LoadSummary()
+        refs    = {}
+        for uniprot_id, go_ids in annotations:
+            if not uniprot_id in refs:
+                refs[uniprot_id] = ProteinRef(uniprot_id)
+            self._attach_protein(k, refs[uniprot_id], go_ids, summary)
 
         self.protein_load_status = (True, self.protein_load_status[1]) if k == "background" \
         else (self.protein_load_status[0], True)
+        self._changed()
+        summary.report()
+        return summary
+
+    def _attach_protein(self, k:ProteinsType, protein:Union[UniprotDatum, Uniprot, ProteinRef], go_ids:Iterable[str], summary:"LoadSummary")->list[NodeID]:
+        """ attach protein to the nodes of go_ids, returns the ids of the nodes it was attached to """
+        attached = []
+        for go_id in go_ids:
+            try:
+                go_node = self._annotation_nodes(go_id)
+            except KeyError:
+                summary.unmatched[go_id] += 1
+                profiling.count("unmatched_go_ids")
+                continue
+            for g in go_node:
+                if 'is_obsolete' in g:
+                    summary.obsolete[g['_id']] += 1
+                if not k in g:
+                    g[k] = self.new_protein_set()
+                g[k].add(protein)
+                summary.annotations += 1
+                attached.append(g['_id'])
+        summary.records += 1
+        if attached:
+            summary.proteins.add(protein.id)
+        return attached
+
+    def _annotation_nodes(self, go_id:str)->list[dict]:
+        """ nodes a protein annotated with go_id is attached to: the resolved node, the consider nodes
+            of an obsolete term, or the closest slim terms of a term left out of a GO slim
+        """
+        try:
+            go_node = self.get_go_node(go_id, many_to_consider=True, warn=False)
+        except KeyError:
+            if not go_id in self.slim_map:
+                raise
+            profiling.count("slim_forwards")
+            # through the resolution table rather than self.nodes, which ArrayGOTree builds on each access
+            return [ self.get_go_node(slim_id) for slim_id in self.slim_map[go_id] ]
+        return [ go_node ] if not type(go_node) is list else go_node
+
+    def _direct_annotations(self, k:ProteinsType)->dict[UniprotAC, tuple]:
+        """ uniprot AC -> (protein, ids of the nodes it is directly attached to) for population k
+            Built from the node protein sets on first use, then maintained by add/remove_proteins
+        """
+        if not k in self._direct:
+            direct = {}
+            for node_id, n_dict in self.nodes.items():
+                for p in n_dict.get(k, ()):
+                    if not p.id in direct:
+                        direct[p.id] = (p, set())
+                    direct[p.id][1].add(node_id)
+            self._direct[k] = direct
+        return self._direct[k]
+
+    def _is_percolated(self, k:ProteinsType)->bool:
+        return self.percolated_status[0] if k == "background" else self.percolated_status[1]
+
+    @literal_arg_checker
+    def add_proteins(self, k:ProteinsType, protein_coll:Iterable[ Union[UniprotDatum, Uniprot] ]) -> LoadSummary:
+        """ Attach additional UniprotDatum to an already loaded population, without reloading it
+            If the population was percolated, the new proteins are added to the perc_ sets of
+            their nodes and of their ancestors only, and to the omega population.
+        """
+        return self._add(k, ( (unip_datum, [ go_datum.id for go_datum in unip_datum.go ]) for unip_datum in protein_coll ))
+
+    @literal_arg_checker
+    def add_annotations(self, k:ProteinsType, annotations:Iterable[ tuple[UniprotAC, Iterable[str]] ]) -> LoadSummary:
+        """ add_proteins counterpart of load_annotations, from (uniprot AC, GO identifiers) records """
+        direct = self._direct_annotations(k)
+        return self._add(k, ( (direct[uniprot_id][0] if uniprot_id in direct else ProteinRef(uniprot_id), go_ids)
+                              for uniprot_id, go_ids in annotations ))
+
+    def _add(self, k:ProteinsType, records:Iterable[tuple]) -> LoadSummary:
+        direct  = self._direct_annotations(k)
+        summary = LoadSummary()
+        for protein, go_ids in records:
+            attached = self._attach_protein(k, protein, go_ids, summary)
+            if not attached:
+                continue
+            if not protein.id in direct:
+                direct[protein.id] = (protein, set())
+            direct[protein.id][1].update(attached)
+            if not self._is_percolated(k):
+                continue
+            # nodes left out of the percolation (eg: obsolete ones) have no perc_ set
+            percolated = False
+            for node_id in self._with_ancestors(attached):
+                n_dict = self.nodes[node_id]
+                if f"perc_{k}" in n_dict:
+                    n_dict[f"perc_{k}"].add(protein)
+                    percolated = True
+            if percolated:
+                omega = self.uniprot_omega[0] if k == "background" else self.uniprot_omega[1]
+                omega.add(protein)
+        self._changed()
+        summary.report()
+        return summary
+
+    @literal_arg_checker
+    def remove_proteins(self, k:ProteinsType, proteins:Iterable[ Union[UniprotDatum, Uniprot, UniprotAC] ]):
+        """ Detach proteins (or uniprot ACs) from all the nodes of a population """
+        direct = self._direct_annotations(k)
+        for p in proteins:
+            uniprot_id = p if isinstance(p, str) else p.id
+            if uniprot_id in direct:
+                self._remove(k, uniprot_id, set(direct[uniprot_id][1]))
+
+    @literal_arg_checker
+    def remove_annotations(self, k:ProteinsType, annotations:Iterable[ tuple[UniprotAC, Iterable[str]] ]):
+        """ Detach proteins from some of their GO terms only, from (uniprot AC, GO identifiers) records
+            If the population was percolated, a protein is dropped from the perc_ set of an ancestor
+            only if none of the nodes still carrying it lies below this ancestor.
+        """
+        direct = self._direct_annotations(k)
+        for uniprot_id, go_ids in annotations:
+            if not uniprot_id in direct:
+                continue
+            node_ids = set()
+            for go_id in go_ids:
+                try:
+                    go_node = self._annotation_nodes(go_id)
+                except KeyError:
+                    continue
+                node_ids.update(g['_id'] for g in go_node)
+            self._remove(k, uniprot_id, node_ids & direct[uniprot_id][1])
+
+    def _remove(self, k:ProteinsType, uniprot_id:UniprotAC, node_ids:set[NodeID]):
+        self._changed()
+        direct = self._direct[k]
+        protein, carriers = direct[uniprot_id]
+        for node_id in node_ids:
+            self.nodes[node_id][k].discard(protein)
+        carriers -= node_ids
+        if not carriers:
+            del direct[uniprot_id]
+        if not self._is_percolated(k):
+            return
+        # nodes still reaching a carrier keep the protein in their perc_ set
+        still_carried = self._with_ancestors(carriers)
+        for node_id in self._with_ancestors(node_ids) - still_carried:
+            n_dict = self.nodes[node_id]
+            if f"perc_{k}" in n_dict:
+                n_dict[f"perc_{k}"].discard(protein)
+        if not any(f"perc_{k}" in self.nodes[node_id] for node_id in carriers):
+            omega = self.uniprot_omega[0] if k == "background" else self.uniprot_omega[1]
+            omega.discard(protein)
+
+    def _with_ancestors(self, node_ids:Iterable[NodeID])->set[NodeID]:
+        nodes = set(node_ids)
+        for node_id in list(nodes):
+            nodes.update(self.closure.ancestors(node_id))
+        return nodes
 
     @literal_arg_checker
     def clear_proteins(self, k: ProteinsType):
         """ clear all the protein lists: "perc_" and "classic" of the specified type: "background" or "measured" """
+        self._direct.pop(k, None)
         for node_dic in self.nodes.values():
             _ = node_dic.pop(k, None)
             if f"perc_{k}" in node_dic:
                 _ = node_dic.pop(f"perc_{k}", None)
         self.protein_load_status = (False, self.protein_load_status[1]) if k == "background" \
         else (self.protein_load_status[0], False)
+        self._changed()
 
     @property
     def root_ids(self)->set[NodeID]:
@@ -200,71 +570,61 @@ class GO_tree(nx.DiGraph):
     @literal_arg_checker
     def get_proteins(self, node_id:NodeID, k:ProteinsType="background", deep=True)->set[UniprotDatum]:
         """ Get all UniprotDatum attached to subtree rooted at provided node id """
+        curr_node = self.get_go_node(node_id)
+        if not deep:
+            return curr_node[k] if k in curr_node else self.new_protein_set()
 
-        def _get_proteins(node_id, deep)->set[UniprotDatum]:
-            curr_node = self.get_go_node(node_id)
-            results   = curr_node[k] if k in curr_node else set()
-            if not deep:
-                return results
-            
-            for next_node_id in self.successors(node_id):
-                results |= _get_proteins(next_node_id, deep)
-            return results
-            
-        return _get_proteins(node_id, deep)
+        results = self.new_protein_set(curr_node[k]) if k in curr_node else self.new_protein_set()
+        for next_node_id in self.closure.descendants(curr_node['_id']):
+            next_node = self.nodes[next_node_id]
+            if k in next_node:
+                results |= next_node[k]
+        return results
     
     @property
     def leave_ids(self)->Iterator[NodeID]:
-        for d in self.concrete_nodes():
-            bot = True
-            for _ in self.successors(d['_id']):
-                bot = False
-                break
-            if bot:
-                yield d['_id']
+        for node_id in self.closure.leaves:
+            if not self.maybe_concrete(node_id) is None:
+                yield node_id
     
+    def percolation_order(self)->Iterator[NodeID]:
+        """ Iterate over all node ids, children first (ie: reverse topological order of the is_a DAG) """
+        return reversed(self.closure.order)
+
     @property
     def ora_rdy(self):
         return self.protein_load_status[0] and self.protein_load_status[1] and \
                self.percolated_status[0]   and self.percolated_status[1]
 
     @literal_arg_checker
+    @profiling.timed("percolate")
     def percolate(self, percol_type:PercolateType="both"):
         """ makes the perc_background/measure attribute of one go_node the union of its descendants
-            A parent node will pbbly be visited more than as all its descendant must bubble up their proteins
+            Nodes are processed once each, children first (reverse topological order), so that the
+            perc_ set of a node is built from its own proteins and the perc_ sets of its direct children.
+            Only the leaves and their ancestors are percolated.
         """
         #assert(self.precolate_rdy)
-        def uniprot_upercolator(go_id:str, buffer_bkg:set[UniprotDatum],  buffer_mea:set[UniprotDatum]):
-            """ makes the proteins attribute of one go_node the union of its descendants
-                A parent node will pbbly be visited more than as all its descendant must bubble up their proteins
-            """
-            #print(f"Visiting {go_id}")
-            #print(f"Target tree curr members:{tree_tgt.nodes}")
-            # Check if current node has already been visited
+        perc_keys = [ k for k in get_args(ProteinsType) if percol_type in ["both", k] ]
+        leaves    = set(self.leave_ids)
+        visited   = set()
+        unions    = 0
+        for go_id in self.percolation_order():
+            children = [ c for c in super(GO_tree, self).successors(go_id) if c in visited ]
+            if not children and not go_id in leaves:
+                continue
+            visited.add(go_id)
+            unions += len(children) * len(perc_keys)
             n_dict = self.nodes[go_id]
-            if percol_type in ["both", "background"]:
-                if 'perc_background' in n_dict:
-                    n_dict['perc_background'] = n_dict['perc_background'] | buffer_bkg
-                else :
-                    n_dict['perc_background'] = n_dict['background'] | buffer_bkg if 'background' in n_dict \
-                                                else buffer_bkg
-        
-            if percol_type in ["both", "measured"]:
-                if 'perc_measured' in n_dict:
-                    n_dict['perc_measured'] = n_dict['perc_measured'] | buffer_mea
+            for k in perc_keys:
+                # Previous percolation results are kept, as repeated calls used to accumulate
+                if f"perc_{k}" in n_dict:
+                    perc = n_dict[f"perc_{k}"]
                 else:
-                    n_dict['perc_measured'] = n_dict['measured']      | buffer_mea if 'measured' in n_dict \
-                                                else buffer_mea
-             
-            for go_id_pred in self.predecessors(go_id):                        
-                uniprot_upercolator( go_id_pred, 
-                    n_dict['perc_background'].copy() if percol_type in ["both", "background"] else set(),
-                    n_dict['perc_measured'].copy()   if percol_type in ["both", "measured"]  else set()
-                )
-               
-        for go_id in self.leave_ids:
-            uniprot_upercolator(go_id, set(), set())
-        
+                    perc = n_dict[k] if k in n_dict else self.new_protein_set()
+                # union returns a new collection, merging all the children at once
+                n_dict[f"perc_{k}"] = perc.union( *[ self.nodes[c][f"perc_{k}"] for c in children ] )
+
         for root_id in self.root_ids:
             if percol_type in ["both", "background"]:
                 root_bkg = self.get_go_node(root_id)['perc_background']
@@ -273,20 +633,175 @@ class GO_tree(nx.DiGraph):
                 root_mea = self.get_go_node(root_id)['perc_measured']
                 self.uniprot_omega = ( self.uniprot_omega[0],  self.uniprot_omega[1] | root_mea)  
         
+        profiling.count("percolated_nodes", len(visited))
+        profiling.count("set_unions", unions)
         self.percolated_status= ( True if percol_type in ["both", "background"] else self.percolated_status[0], 
                                   True if percol_type in ["both", "measured"]   else self.percolated_status[1] )
+        self._changed()
 
 # MAybe move to io
-def reader(obo_file_path:str, keep_obsolete=True, ns=None, relationships_to_consider = ['is_a'])-> DiGraph :
-    G = GO_tree() #nx.DiGraph()
+@profiling.timed("reader")
+def reader(obo_file_path:str, keep_obsolete=True, ns=None, relationships_to_consider = ['is_a'], compact=False,
+           root=None, subset=None)-> DiGraph :
+    """ Build a GO_tree from an obo file
+        ns: namespace, or collection of namespaces (eg: "biological_process"), terms of other namespaces are skipped
+        root: GO identifier, or collection of identifiers, only these terms and their descendants are kept
+        subset: GO slim, as a subset name (eg: "goslim_generic") or a collection of GO identifiers,
+                only these terms are kept, each one linked to its closest ancestors within the subset.
+                Other terms (and their alt_ids) are mapped to their closest slim ancestors in the
+                slim_map attribute, so that load_proteins attaches their proteins to these slim terms.
+        Obsolete terms are kept (if keep_obsolete) only when they can still be forwarded to a kept term.
+    """
+    if ns is None and root is None and subset is None:
+        G = GO_tree(compact=compact) #nx.DiGraph()
 
-    for node_buffer in obo_node_buffer_iter(open(obo_file_path, 'r')):
-        if not keep_obsolete and node_buffer.is_obsolete:
-            continue
-        G.add_node(node_buffer['id'], **node_buffer.nx_node_param)
-        for relationship, node_parents in node_buffer.relationship_iter(relationships_to_consider).items():
-            for node_parent_id in node_parents:
-                G.add_edge(node_parent_id, node_buffer['id'], type=relationship)
+        with open(obo_file_path, 'r') as fp:
+            for node_buffer in obo_stanza_iter(fp):
+                if not keep_obsolete and node_buffer.is_obsolete:
+                    continue
+                G.add_node(node_buffer['id'], **node_buffer.nx_node_param)
+                for relationship, node_parents in node_buffer.relationship_iter(relationships_to_consider).items():
+                    for node_parent_id in node_parents:
+                        G.add_edge(node_parent_id, node_buffer['id'], type=relationship)
+
+        return G
+
+    namespaces = _as_set(ns)
+    with open(obo_file_path, 'r') as fp:
+        records = [ node_buffer for node_buffer in obo_stanza_iter(fp)
+                    if _keep_stanza(node_buffer, keep_obsolete, namespaces) ]
+    return _filtered_tree(records, relationships_to_consider, compact, root, subset)
+
+@profiling.timed("reader")
+def namespace_trees(obo_file_path:str, keep_obsolete=True, ns=None, relationships_to_consider = ['is_a'], compact=False)->dict[str, "GO_tree"]:
+    """ One GO_tree per namespace (biological_process, molecular_function, cellular_component), from a single parse
+        ns: restrict to some namespaces
+        Relationships between terms of different namespaces (eg: part_of) are dropped.
+    """
+    namespaces = _as_set(ns)
+    records    = {}
+    with open(obo_file_path, 'r') as fp:
+        for node_buffer in obo_stanza_iter(fp):
+            if not _keep_stanza(node_buffer, keep_obsolete, namespaces) or not 'namespace' in node_buffer:
+                continue
+            if not node_buffer['namespace'] in records:
+                records[ node_buffer['namespace'] ] = []
+            records[ node_buffer['namespace'] ].append(node_buffer)
+    return { namespace : _filtered_tree(ns_records, relationships_to_consider, compact)
+             for namespace, ns_records in records.items() }
+
+def _as_set(values:Union[None, str, Iterable[str]])->Union[None, set[str]]:
+    if values is None:
+        return None
+    return { values } if isinstance(values, str) else set(values)
 
+def _keep_stanza(node_buffer, keep_obsolete:bool, namespaces:Union[None, set[str]])->bool:
+    if not keep_obsolete and node_buffer.is_obsolete:
+        return False
+    return namespaces is None or ('namespace' in node_buffer and node_buffer['namespace'] in namespaces)
+
+def _filtered_tree(records:list, relationships_to_consider:list[str], compact:bool, root=None, subset=None)->"GO_tree":
+    """ GO_tree of the parsed records, restricted to the root descendants or to the subset terms
+        Edges are added once all nodes are known, those toward terms left out are dropped.
+    """
+    parents = {} # term -> [ (parent, relationship) ]
+    alt_ids = {} # alt_id -> term
+    for node_buffer in records:
+        parents[ node_buffer['id'] ] = [ (node_parent_id, relationship)
+            for relationship, node_parents in node_buffer.relationship_iter(relationships_to_consider).items()
+            for node_parent_id in node_parents ]
+        for alt_id in node_buffer.data.get('alt_id', []):
+            alt_ids[alt_id] = node_buffer['id']
+
+    if not root is None:
+        children = {}
+        for node_id, node_parents in parents.items():
+            for node_parent_id, _ in node_parents:
+                children.setdefault(node_parent_id, []).append(node_id)
+        kept  = set()
+        stack = [ alt_ids.get(root_id, root_id) for root_id in _as_set(root) ]
+        while stack:
+            node_id = stack.pop()
+            if node_id in kept or not node_id in parents:
+                continue
+            kept.add(node_id)
+            stack.extend(children.get(node_id, []))
+    elif not subset is None:
+        if isinstance(subset, str):
+            kept = set( node_buffer['id'] for node_buffer in records if subset in node_buffer.data.get('subset', []) )
+        else:
+            kept = set( alt_ids.get(node_id, node_id) for node_id in subset ) & parents.keys()
+    else:
+        kept = set(parents)
+
+    G = GO_tree(compact=compact)
+    closest = {}
+    for node_buffer in records:
+        node_id = node_buffer['id']
+        if node_id in kept:
+            G.add_node(node_id, **node_buffer.nx_node_param)
+        elif node_buffer.is_obsolete and \
+             any( forward_id in kept for forward_id in node_buffer.data.get('replaced_by', []) + node_buffer.consider_iter() ):
+            G.add_node(node_id, **node_buffer.nx_node_param)
+
+    if subset is None:
+        edges = ( (node_parent_id, node_id, relationship) for node_id in parents if node_id in kept
+                  for node_parent_id, relationship in parents[node_id] )
+    else:
+        edges   = ( (node_parent_id, node_id, relationship) for node_id in parents if node_id in kept
+                    for node_parent_id, relationship in sorted(_closest_kept_parents(node_id, parents, kept, closest)) )
+    G.add_edges_from( (node_parent_id, node_id, { 'type' : relationship })
+                      for node_parent_id, node_id, relationship in edges if node_parent_id in kept )
+    # is_a parents left out are dropped from _is_a, so that root_ids finds the roots of the filtered tree
+    for node_id in kept:
+        n_dict = G.nodes[node_id]
+        if not '_is_a' in n_dict:
+            continue
+        is_a = [ node_parent_id for node_parent_id, _, relationship in G.in_edges(node_id, data="type") if relationship == 'is_a' ]
+        if not is_a:
+            del n_dict['_is_a']
+        else:
+            n_dict['_is_a'] = is_a[0] if len(is_a) == 1 else is_a
+    if not subset is None:
+        G.slim_map = _slim_map(records, parents, alt_ids, kept, closest, G)
     return G
 
+def _slim_map(records:list, parents:dict, alt_ids:dict, kept:set[NodeID], closest:dict, G:"GO_tree")->dict[str, list[NodeID]]:
+    """ GO identifiers of the terms left out of a slim (and their alt_ids) -> their closest slim ancestors
+        Obsolete terms left out are mapped through their replaced_by, or else consider, terms.
+    """
+    def slim_ancestors(node_id):
+        if node_id in kept:
+            return { node_id }
+        return set( ancestor_id for ancestor_id, _ in _closest_kept_parents(node_id, parents, kept, closest) )
+
+    slim_map = {}
+    for node_buffer in records:
+        node_id = node_buffer['id']
+        if node_id in G:
+            continue
+        if node_buffer.is_obsolete:
+            forward_ids = node_buffer.data.get('replaced_by', []) or node_buffer.consider_iter()
+            ancestors   = set().union( *[ slim_ancestors(alt_ids.get(f, f)) for f in forward_ids if alt_ids.get(f, f) in parents ] )
+        else:
+            ancestors = slim_ancestors(node_id)
+        if ancestors:
+            slim_map[node_id] = sorted(ancestors)
+    for alt_id, node_id in alt_ids.items():
+        if not alt_id in G and node_id in slim_map:
+            slim_map[alt_id] = slim_map[node_id]
+    return slim_map
+
+def _closest_kept_parents(node_id:NodeID, parents:dict, kept:set[NodeID], closest:dict)->set[tuple[NodeID, str]]:
+    """ (ancestor, relationship) pairs of the closest kept ancestors of node_id,
+        relationship being the one of the first step up from node_id
+    """
+    result = set()
+    for node_parent_id, relationship in parents.get(node_id, []):
+        if node_parent_id in kept:
+            result.add( (node_parent_id, relationship) )
+            continue
+        if not node_parent_id in closest:
+            closest[node_parent_id] = set( ancestor_id for ancestor_id, _ in _closest_kept_parents(node_parent_id, parents, kept, closest) )
+        result.update( (ancestor_id, relationship) for ancestor_id in closest[node_parent_id] )
+    return result
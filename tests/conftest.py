@@ -0,0 +1,41 @@
+""" Shared fixtures: a small synthetic ontology and its proteins
+
+Trees are built fresh for each test (most of them mutate it), from an OBO file written once
+per session by benchmarks.synthetic.
+"""
+import contextlib, io
+import pytest
+
+from benchmarks.synthetic import make_obo, make_proteins
+from obogo import create_tree_from_obo
+
+N_TERMS    = 300
+N_PROTEINS = 200
+
+@pytest.fixture(scope="session")
+def ontology(tmp_path_factory):
+    """ (OBO file path, valid terms) """
+    obo_file_path = str(tmp_path_factory.mktemp("obo") / "release.obo")
+    return obo_file_path, make_obo(obo_file_path, n_terms=N_TERMS, seed=1)
+
+@pytest.fixture(scope="session")
+def proteins(ontology):
+    return make_proteins(ontology[1], n_proteins=N_PROTEINS, seed=1)
+
+@pytest.fixture
+def build(ontology, proteins):
+    """ build(compact, obo_file_path=None, n_background=None, **reader_kwargs): percolated tree,
+        background proteins are the first n_background ones, measured ones the first half of them
+    """
+    def _build(compact=False, obo_file_path=None, n_background=None, **reader_kwargs):
+        background = proteins[:n_background]
+        with contextlib.redirect_stderr(io.StringIO()):
+            tree = create_tree_from_obo(obo_file_path or ontology[0], compact=compact, **reader_kwargs)
+            tree.load_proteins("background", background)
+            tree.load_proteins("measured", background[:len(background) // 2])
+            tree.percolate()
+        return tree
+    return _build
+
+def ids(proteins)->set[str]:
+    return set([ _.id for _ in proteins ])
@@ -0,0 +1,72 @@
+import gzip
+import pytest
+
+from obogo import create_tree_from_obo
+from obogo.annotations import iter_uniprot_xml, iter_uniprot_tsv, iter_gaf, iter_annotations
+
+XML = """<?xml version="1.0" encoding="UTF-8"?>
+<uniprot xmlns="http://uniprot.org/uniprot">
+<entry dataset="Swiss-Prot">
+  <accession>P12345</accession>
+  <accession>Q00001</accession>
+  <dbReference type="GO" id="GO:0000001"/>
+  <dbReference type="PDB" id="1ABC"/>
+  <dbReference type="GO" id="GO:0000002"/>
+</entry>
+<entry dataset="TrEMBL">
+  <accession>P67890</accession>
+</entry>
+</uniprot>
+"""
+
+TSV = "Entry\tEntry Name\tGene Ontology IDs\n" \
+      "P12345\tA_HUMAN\tGO:0000001; GO:0000002\n" \
+      "P67890\tB_HUMAN\t\n" \
+      "truncated\n"
+
+GAF = "!gaf-version: 2.2\n" + "".join( "\t".join(fields) + "\n" for fields in [
+    ("UniProtKB", "P12345", "A", "enables",     "GO:0000001", "PMID:1", "IDA"),
+    ("UniProtKB", "P12345", "A", "NOT|enables", "GO:0000002", "PMID:1", "IDA"),
+    ("UniProtKB", "P67890", "B", "involved_in", "GO:0000002", "PMID:1", "IEA"),
+    ("RNAcentral", "URS0001", "C", "enables",   "GO:0000001", "PMID:1", "IEA"),
+] )
+
+def write(tmp_path, name, text):
+    file_path = tmp_path / name
+    if name.endswith(".gz"):
+        with gzip.open(file_path, "wt") as fp:
+            fp.write(text)
+    else:
+        file_path.write_text(text)
+    return str(file_path)
+
+def test_uniprot_xml(tmp_path):
+    records = list(iter_uniprot_xml(write(tmp_path, "p.xml", XML)))
+    assert records == [ ("P12345", [ "GO:0000001", "GO:0000002" ]), ("P67890", []) ]
+
+def test_uniprot_tsv(tmp_path):
+    records = list(iter_uniprot_tsv(write(tmp_path, "p.tsv", TSV)))
+    assert records == [ ("P12345", [ "GO:0000001", "GO:0000002" ]), ("P67890", []) ]
+    with pytest.raises(ValueError):
+        list(iter_uniprot_tsv(write(tmp_path, "bad.tsv", "Entry\tName\n")))
+
+def test_gaf_skips_not_qualifiers(tmp_path):
+    records = list(iter_gaf(write(tmp_path, "p.gaf", GAF)))
+    assert records == [ ("P12345", [ "GO:0000001" ]), ("P67890", [ "GO:0000002" ]) ]
+
+@pytest.mark.parametrize("name, text", [ ("p.xml.gz", XML), ("p.tab", TSV), ("p.gaf.gz", GAF) ])
+def test_iter_annotations_format(tmp_path, name, text):
+    assert ("P12345", [ "GO:0000001" ]) == next( (ac, go_ids[:1]) for ac, go_ids in iter_annotations(write(tmp_path, name, text)) )
+
+def test_iter_annotations_unknown_format():
+    with pytest.raises(ValueError):
+        iter_annotations("annotations.json")
+
+def test_load_annotations(ontology):
+    tree = create_tree_from_obo(ontology[0])
+    go_a, go_b = ontology[1][:2]
+    records = [ ("P12345", [ go_a, "GO:0000000" ]), ("P67890", [ go_b ]), ("P12345", [ go_b ]) ]
+    summary = tree.load_annotations("background", iter(records))
+    assert summary.records == 3 and summary.unmatched == { "GO:0000000": 1 }
+    assert { p.id for p in tree.get_go_node(go_a)['background'] } == { "P12345" }
+    assert { p.id for p in tree.get_go_node(go_b)['background'] } == { "P12345", "P67890" }
@@ -0,0 +1,49 @@
+import contextlib, io
+import pytest
+
+from obogo.array_tree import ArrayGOTree, array_reader
+from obogo.tree import GO_tree
+from obogo.statistics import score_ora_tree
+from test_percolate import percolated
+from test_statistics import assert_same_scores
+from conftest import ids
+
+def load(tree, proteins):
+    with contextlib.redirect_stderr(io.StringIO()):
+        tree.load_proteins("background", proteins)
+        tree.load_proteins("measured", proteins[:len(proteins) // 2])
+        tree.percolate()
+    return tree
+
+@pytest.mark.parametrize("compact", [ False, True ])
+def test_scores_match_go_tree(build, ontology, proteins, compact):
+    tree, array_tree = build(compact), load(array_reader(ontology[0], compact=compact), proteins)
+    assert { n['_id'] for n in array_tree.concrete_nodes() } == { n['_id'] for n in tree.concrete_nodes() }
+    assert array_tree.root_ids == tree.root_ids
+    assert percolated(array_tree, "background") == percolated(tree, "background")
+    for norm in ("background", "measured"):
+        sample = [ p.id for p in proteins[10:40] ]
+        assert_same_scores(list(score_ora_tree(tree, sample, norm)), list(score_ora_tree(array_tree, sample, norm)))
+
+def test_queries_match_go_tree(build):
+    tree = build()
+    array_tree = ArrayGOTree.from_networkx(tree)
+    for n in tree.concrete_nodes():
+        node_id = n['_id']
+        assert set(array_tree.successors(node_id)) == set(tree.successors(node_id))
+        assert array_tree.ancestor_ids(node_id) == tree.ancestor_ids(node_id)
+        assert ids(array_tree.get_proteins(node_id)) == ids(tree.get_proteins(node_id))
+    aliases = [ node_id for node_id, n in tree.nodes.items() if 'alias_to' in n ]
+    assert all( array_tree.get_go_node(node_id)['_id'] == tree.get_go_node(node_id)['_id'] for node_id in aliases )
+
+def test_networkx_round_trip(build):
+    tree = build()
+    G    = ArrayGOTree.from_networkx(tree).to_networkx()
+    assert isinstance(G, GO_tree) and G.ora_rdy
+    assert set(G.nodes) == set(tree.nodes)
+    assert set(G.edges(data="type")) == set(tree.edges(data="type"))
+    concrete = { n['_id'] : n for n in tree.concrete_nodes() }
+    for n in G.concrete_nodes():
+        assert n['name'] == concrete[ n['_id'] ]['name']
+        assert ids(n.get('perc_background', ())) == ids(concrete[ n['_id'] ].get('perc_background', ()))
+    assert ids(G.uniprot_omega[0]) == ids(tree.uniprot_omega[0])
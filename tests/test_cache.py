@@ -0,0 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor
+import pickle
+import threading
+
+from obogo.statistics import score_ora_table
+
+def test_cached_until_version_bump(build, proteins):
+    tree  = build()
+    calls = []
+    build_value = lambda: calls.append(1) or len(calls)
+    assert tree.cached("key", build_value) == 1 and tree.cached("key", build_value) == 1
+    tree.add_proteins("background", proteins[-5:])
+    assert tree.cached("key", build_value) == 2 and len(calls) == 2
+
+def test_population_matrix_rebuilt_on_change(build, proteins):
+    tree   = build(n_background=100)
+    sample = [ p.id for p in proteins[:20] ]
+    before = score_ora_table(tree, sample)
+    tree.add_proteins("background", proteins[100:])
+    after, fresh = score_ora_table(tree, sample), score_ora_table(build(), sample)
+    assert (before.s22 != after.s22).any() and (after.s22 == fresh.s22).all()
+
+def test_cached_shared_between_threads(build):
+    tree    = build()
+    barrier = threading.Barrier(4)
+    def build_value():
+        barrier.wait(timeout=5) # every thread builds, no reader waits for another
+        return object()
+    with ThreadPoolExecutor(4) as pool:
+        values = list(pool.map(lambda _: tree.cached("key", build_value), range(4)))
+    # the first value published is the one everybody gets
+    assert all( v is values[0] for v in values ) and tree.cached("key", build_value) is values[0]
+
+def test_cache_not_pickled(build):
+    tree = build()
+    tree.cached("key", lambda: 1)
+    loaded = pickle.loads(pickle.dumps(tree))
+    assert loaded.cached("key", lambda: 2) == 2
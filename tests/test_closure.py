@@ -0,0 +1,43 @@
+import networkx as nx
+import pytest
+
+from obogo import create_tree_from_obo
+from obogo.closure import ClosureIndex
+from obogo.tree import GO_tree
+
+@pytest.fixture(scope="module")
+def tree(ontology):
+    return create_tree_from_obo(ontology[0])
+
+def plain_graph(tree:GO_tree)->nx.DiGraph:
+    return nx.DiGraph( list(super(GO_tree, tree).edges()) )
+
+def test_closure_matches_networkx(tree):
+    G, closure = plain_graph(tree), tree.closure
+    for node_id in G:
+        assert set(closure.ancestors(node_id)) == nx.ancestors(G, node_id)
+        assert set(closure.descendants(node_id)) == nx.descendants(G, node_id)
+        assert closure.n_descendants(node_id) == len(nx.descendants(G, node_id))
+        assert closure.n_ancestors(node_id) == len(nx.ancestors(G, node_id))
+
+def test_closure_queries(tree):
+    G = plain_graph(tree)
+    leaf   = next( n for n in G if G.out_degree(n) == 0 and G.in_degree(n) > 0 )
+    parent = next(iter(G.predecessors(leaf)))
+    assert tree.is_ancestor(parent, leaf) and not tree.is_ancestor(leaf, parent) and not tree.is_ancestor(leaf, leaf)
+    assert tree.ancestor_ids(leaf) == nx.ancestors(G, leaf) and tree.descendant_ids(leaf) == set()
+
+def test_closure_reset_on_mutation(ontology):
+    tree = create_tree_from_obo(ontology[0])
+    leaf = next( n['_id'] for n in tree.concrete_nodes() if not tree.descendant_ids(n['_id']) and '_is_a' in n )
+    first = tree.closure
+    tree.add_node("GO:9999998", _id="GO:9999998", name="added")
+    tree.add_edge(leaf, "GO:9999998", type="is_a")
+    assert not tree.closure is first
+    assert leaf in tree.ancestor_ids("GO:9999998") and tree.descendant_ids(leaf) == { "GO:9999998" }
+
+def test_closure_of_a_dag():
+    G = nx.DiGraph([ ("a", "b"), ("a", "c"), ("b", "d"), ("c", "d"), ("x", "y") ])
+    closure = ClosureIndex(G)
+    assert set(closure.ancestors("d")) == { "a", "b", "c" } and set(closure.descendants("a")) == { "b", "c", "d" }
+    assert not closure.is_ancestor("x", "d") and closure.is_ancestor("a", "d")
@@ -0,0 +1,64 @@
+import re
+import pytest
+
+from obogo import create_tree_from_obo
+from obogo.diff import diff_trees, migrate_proteins
+from conftest import ids
+
+def _next_release(text:str, valid:list[str])->str:
+    """ release with a merged, a replaced and a removed term, and an added one
+        The changed terms are leaves nothing else refers to, so that reloading the proteins in
+        the next release and migrating them from the previous one must agree.
+    """
+    head, *stanzas = text.split("\n\n[Term]\n")
+    stanzas = [ "[Term]\n" + s for s in stanzas ]
+    leaves  = [ go_id for go_id in valid if text.count(go_id) == 1 and not f"id: {go_id}\nname" in head ]
+    leaves  = [ go_id for go_id in leaves
+                if not any( f"id: {go_id}\n" in s and ("alt_id" in s or not "is_a" in s) for s in stanzas ) ]
+    merged, replaced, removed = leaves[:3]
+    target = next( go_id for go_id in valid if not go_id in (merged, replaced, removed) )
+    out = []
+    for s in stanzas:
+        if f"id: {merged}\n" in s or f"id: {removed}\n" in s:
+            continue
+        if f"id: {target}\n" in s:
+            s = s.replace(f"id: {target}\n", f"id: {target}\nalt_id: {merged}\n", 1)
+        if f"id: {replaced}\n" in s:
+            s = re.sub(r"is_a: .*\n?", "", s).rstrip("\n") + f"\nis_obsolete: true\nreplaced_by: {target}"
+        out.append(s)
+    out.append(f"[Term]\nid: GO:9999999\nname: added term\nnamespace: biological_process\nis_a: {valid[0]} ! parent")
+    return "\n\n".join([ head ] + out) + "\n"
+
+@pytest.fixture(scope="session")
+def next_release(ontology, tmp_path_factory):
+    """ OBO file path of the next release of the ontology """
+    obo_file_path = str(tmp_path_factory.mktemp("obo") / "next_release.obo")
+    with open(ontology[0]) as fp, open(obo_file_path, "w") as out:
+        out.write(_next_release(fp.read(), ontology[1]))
+    return obo_file_path
+
+def populations(tree)->dict:
+    return { (node_id, k) : ids(n[k]) for node_id, n in tree.nodes.items()
+             for k in ("background", "measured", "perc_background", "perc_measured") if k in n }
+
+def test_diff_trees(build, next_release):
+    diff = diff_trees(build(), build(obo_file_path=next_release))
+    assert len(diff.merged) == len(diff.replaced) == len(diff.removed) == 1
+    assert diff.added == { "GO:9999999" } and not diff.obsoleted
+    assert diff.replaced == { list(diff.replaced)[0] : list(diff.merged.values())[0] }
+
+def test_diff_identical(build):
+    diff = diff_trees(build(), build())
+    assert not (diff.added or diff.removed or diff.merged or diff.replaced or diff.obsoleted)
+
+@pytest.mark.parametrize("compact", [ False, True ])
+@pytest.mark.parametrize("move", [ False, True ])
+def test_migrate_matches_reload(build, next_release, compact, move):
+    old      = build(compact)
+    new      = create_tree_from_obo(next_release, compact=compact)
+    reloaded = build(compact, obo_file_path=next_release)
+    migrate_proteins(old, new, move=move)
+    assert new.ora_rdy
+    assert populations(new) == populations(reloaded)
+    assert ids(new.uniprot_omega[0]) == ids(reloaded.uniprot_omega[0])
+    assert ids(new.uniprot_omega[1]) == ids(reloaded.uniprot_omega[1])
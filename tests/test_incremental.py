@@ -0,0 +1,25 @@
+import pytest
+
+from test_percolate import percolated, naive_percolation
+from conftest import ids
+
+@pytest.mark.parametrize("compact", [ False, True ])
+def test_add_remove_matches_reload(build, proteins, compact):
+    half   = len(proteins) // 2
+    tree   = build(compact, n_background=half)
+    tree.add_proteins("background", proteins[half:])
+    loaded = build(compact)
+    assert percolated(tree, "background") == percolated(loaded, "background")
+    assert ids(tree.uniprot_omega[0]) == ids(loaded.uniprot_omega[0])
+
+    tree.remove_proteins("background", proteins[half:])
+    loaded = build(compact, n_background=half)
+    assert percolated(tree, "background") == percolated(loaded, "background")
+    assert percolated(tree, "background") == naive_percolation(tree, "background")
+    assert ids(tree.uniprot_omega[0]) == ids(loaded.uniprot_omega[0])
+
+def test_remove_by_accession(build, proteins):
+    tree = build(n_background=50)
+    tree.remove_proteins("background", [ p.id for p in proteins[:10] ])
+    assert ids(tree.uniprot_omega[0]) == ids(proteins[10:50])
+    assert percolated(tree, "background") == naive_percolation(tree, "background")
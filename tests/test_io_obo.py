@@ -0,0 +1,56 @@
+import io
+import pytest
+
+from obogo.io_obo import obo_stanza_iter
+
+OBO = r"""format-version: 1.2
+! a header comment
+ontology: go
+
+[Term]
+id: GO:0000001
+name: mitochondrion inheritance
+namespace: biological_process
+def: "The distribution of \"mitochondria\" into daughter cells." [GOC:mcc, PMID:10873824] {source="x"}
+synonym: "mitochondrial inheritance" EXACT []
+is_a: GO:0048308 ! organelle inheritance
+is_a: GO:0048311 {source="GOC:x"} ! mitochondrion distribution
+relationship: part_of GO:0000002 ! some whole
+! a comment between tags
+
+[Typedef]
+id: part_of
+name: part of
+
+[Term]
+id: GO:0000002
+name: some whole
+is_obsolete: true
+consider: GO:0000003
+consider: GO:0000004"""
+
+def stanzas(text, chunk_size=1 << 20, **kwargs):
+    return list(obo_stanza_iter(io.StringIO(text), chunk_size=chunk_size, **kwargs))
+
+def test_term_values():
+    first, second = stanzas(OBO)
+    assert first['id'] == "GO:0000001" and first['name'] == "mitochondrion inheritance"
+    assert first['def'] == 'The distribution of "mitochondria" into daughter cells.'
+    assert first['synonym'] == "mitochondrial inheritance"
+    # comments and qualifiers are stripped
+    assert first['is_a'] == [ "GO:0048308", "GO:0048311" ]
+    assert first['part_of'] == "GO:0000002" and not 'relationship' in first
+    assert second.is_obsolete and second['consider'] == [ "GO:0000003", "GO:0000004" ]
+
+def test_stanza_types():
+    assert [ b.stanza for b in stanzas(OBO) ] == [ "Term", "Term" ]
+    typedefs = stanzas(OBO, stanzas=("Typedef",))
+    assert len(typedefs) == 1 and typedefs[0]['id'] == "part_of" and typedefs[0]['name'] == "part of"
+
+@pytest.mark.parametrize("chunk_size", [ 1, 7, 64 ])
+def test_chunk_boundaries(chunk_size):
+    assert [ b.data for b in stanzas(OBO, chunk_size) ] == [ b.data for b in stanzas(OBO) ]
+
+def test_malformed_line():
+    with pytest.raises(ValueError):
+        stanzas("[Term]\nid: GO:0000001\nno tag here\n")
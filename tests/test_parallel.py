@@ -0,0 +1,42 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pytest
+
+from obogo.parallel import SharedCSR, attach_csr, _row_view
+from obogo.statistics import score_ora_tree, score_ora_samples, population_matrix, ora_population
+from test_statistics import assert_same_scores
+
+@pytest.fixture(scope="module")
+def pool():
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        yield pool
+
+def matrix(tree):
+    N, pop_key = ora_population(tree, "background")
+    return population_matrix(tree, N, pop_key)[1]
+
+def test_shared_csr_round_trip(build):
+    M = matrix(build())
+    with SharedCSR(M) as shared, attach_csr(shared.descriptor) as S:
+        view = _row_view(S, 10, 40)
+        assert np.shares_memory(view.indices, S.indices) and np.shares_memory(view.data, S.data)
+        assert (view != M[10:40]).nnz == 0 and (S != M).nnz == 0
+        del S, view
+
+@pytest.mark.parametrize("compact", [ False, True ])
+def test_parallel_matches_serial(build, proteins, compact):
+    tree   = build(compact)
+    sample = [ p.id for p in proteins[10:40] ]
+    # a single sample splits the GO terms over the workers
+    assert_same_scores(list(score_ora_tree(tree, sample)), list(score_ora_tree(tree, sample, n_jobs=2)))
+
+def test_parallel_samples_with_executor(build, proteins, pool):
+    tree    = build()
+    samples = [ proteins[i:i + 20] for i in range(0, 100, 20) ]
+    serial  = score_ora_samples(tree, samples)
+    # several samples split the samples over the workers, the pool is reused and left running
+    for _ in range(2):
+        batch = score_ora_samples(tree, samples, n_jobs=2, executor=pool)
+        assert np.array_equal(batch.s11, serial.s11) and np.array_equal(batch.s22, serial.s22)
+        assert np.allclose(batch.p_values, serial.p_values, equal_nan=True)
+    assert pool.submit(int, "1").result() == 1
@@ -0,0 +1,35 @@
+from obogo import create_tree_from_obo
+from obogo.tree import GO_tree
+from conftest import ids
+
+def naive_percolation(tree:GO_tree, k:str)->dict[str, set[str]]:
+    """ proteins of each concrete term and of all its descendants, walking down from every term """
+    perc = {}
+    for n in tree.concrete_nodes():
+        proteins, stack, seen = set(), [ n['_id'] ], set()
+        while stack:
+            node_id = stack.pop()
+            if node_id in seen:
+                continue
+            seen.add(node_id)
+            proteins |= ids(tree.nodes[node_id].get(k, ()))
+            stack.extend( super(GO_tree, tree).successors(node_id) )
+        perc[ n['_id'] ] = proteins
+    return perc
+
+def percolated(tree:GO_tree, k:str)->dict[str, set[str]]:
+    return { n['_id'] : ids(n.get(f"perc_{k}", ())) for n in tree.concrete_nodes() }
+
+def test_percolate_matches_naive(build):
+    tree = build()
+    for k in ("background", "measured"):
+        assert percolated(tree, k) == naive_percolation(tree, k)
+    assert ids(tree.uniprot_omega[0]) == set().union( *[ ids(n.get("background", ())) for n in tree.concrete_nodes() ] )
+    assert tree.ora_rdy
+
+def test_percolate_one_population(build, ontology, proteins):
+    tree = create_tree_from_obo(ontology[0])
+    tree.load_proteins("background", proteins)
+    tree.percolate("background")
+    assert tree.percolated_status == (True, False) and not tree.ora_rdy
+    assert percolated(tree, "background") == percolated(build(), "background")
@@ -0,0 +1,53 @@
+from concurrent.futures import ProcessPoolExecutor
+import math
+import numpy as np
+import pytest
+import scipy.stats as stats
+
+from obogo.permutation import score_ora_permutation, pvalue_lookup, random_samples
+from obogo.statistics import score_ora_table, score_ora_tree, ora_population, population_matrix
+
+@pytest.fixture(scope="module")
+def pool():
+    with ProcessPoolExecutor(max_workers=3) as pool:
+        yield pool
+
+def test_seeded_permutations_across_jobs(build, proteins, pool):
+    tree   = build()
+    sample = [ p.id for p in proteins[10:40] ]
+    serial = score_ora_permutation(tree, sample, n_permutations=300, seed=7, batch_size=32)
+    for n_jobs in (2, 3):
+        table = score_ora_permutation(tree, sample, n_permutations=300, seed=7, batch_size=32, n_jobs=n_jobs, executor=pool)
+        assert np.array_equal(table.empirical_p, serial.empirical_p) and np.array_equal(table.fwer, serial.fwer)
+    other = score_ora_permutation(tree, sample, n_permutations=300, seed=8, batch_size=32)
+    assert not np.array_equal(other.empirical_p, serial.empirical_p)
+
+def test_permutation_table(build, proteins):
+    tree   = build()
+    sample = [ p.id for p in proteins[10:40] ]
+    table  = score_ora_permutation(tree, sample, n_permutations=200, seed=1)
+    plain  = score_ora_table(tree, sample, alternative="greater")
+    assert list(table.go_id) == list(plain.go_id) and np.allclose(table.p_value, plain.p_value)
+    assert ((table.empirical_p >= 1 / 201) & (table.empirical_p <= 1)).all()
+    # minP adjusted values bound the per term ones
+    assert (table.fwer >= table.empirical_p).all()
+    # score_ora_tree permutations follow its two-sided Fisher tests
+    two_sided = score_ora_permutation(tree, sample, n_permutations=200, seed=1, alternative="two-sided")
+    scores    = list(score_ora_tree(tree, sample, n_permutations=200, seed=1))
+    assert [ s[-2:] for s in scores ] == [ (float(r.empirical_p), float(r.fwer)) for r in two_sided ]
+
+@pytest.mark.parametrize("alternative", [ "greater", "less", "two-sided" ])
+def test_pvalue_lookup(build, alternative):
+    tree = build()
+    N, pop_key = ora_population(tree, "background")
+    M, n, T    = population_matrix(tree, N, pop_key)[1], 25, len(N)
+    lookup, offsets = pvalue_lookup(M, n, alternative)
+    for i in np.flatnonzero(np.diff(M.indptr))[::10].tolist():
+        K = M.indptr[i + 1] - M.indptr[i]
+        for k in range(min(K, n) + 1):
+            _, p = stats.fisher_exact([ (k, n - k), (K - k, T - n - K + k) ], alternative=alternative)
+            assert math.isclose(lookup[offsets[i] + k], p, rel_tol=1e-6, abs_tol=1e-12)
+
+def test_random_samples():
+    R = random_samples(np.random.default_rng(0), 50, 10, 6)
+    assert R.shape == (50, 6) and (np.asarray(R.sum(axis=0)) == 10).all() and R.max() == 1
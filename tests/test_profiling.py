@@ -0,0 +1,59 @@
+import contextlib, io, logging
+
+from obogo import profiling, create_tree_from_obo
+from obogo.statistics import score_ora_tree, score_ora_table
+
+def test_disabled_by_default(build, proteins):
+    assert profiling.STATS is None
+    list(score_ora_tree(build(), proteins[:20]))
+    assert profiling.STATS is None
+
+def test_stages_and_counters(ontology, proteins):
+    calls = []
+    with profiling.profiled(hook=lambda stage, elapsed, stats: calls.append(stage)) as stats:
+        tree = create_tree_from_obo(ontology[0])
+        with contextlib.redirect_stderr(io.StringIO()):
+            tree.load_proteins("background", proteins)
+            tree.load_proteins("measured", proteins[:100])
+        tree.percolate()
+        scores = list(score_ora_tree(tree, proteins[:20]))
+        score_ora_table(tree, proteins[:20])
+    assert profiling.STATS is None
+    # nested stages complete before the ones calling them
+    assert [ stage for stage in calls if not stage in ("population_matrix", "score_ora_samples") ] == \
+           [ "reader", "load_proteins", "load_proteins", "percolate", "score_ora_tree", "score_ora_table" ]
+    assert stats.timers["load_proteins"][0] == 2 and all( total >= 0 for _, total in stats.timers.values() )
+    assert stats.counters["fisher_tests"] >= len(scores) and stats.counters["percolated_nodes"] > 0
+    assert stats.counters["get_go_node"] > 0 and set(stats.as_dict()) == { "timers", "counters" }
+
+def test_generator_stage_on_close(build, proteins):
+    tree = build()
+    with profiling.profiled() as stats:
+        scores = score_ora_tree(tree, proteins[:20])
+        next(scores)
+        assert not "score_ora_tree" in stats.timers
+        scores.close()
+    assert stats.timers["score_ora_tree"][0] == 1
+
+def test_profiled_restores_previous():
+    outer = profiling.enable()
+    try:
+        with profiling.profiled() as inner:
+            profiling.count("x")
+        assert profiling.STATS is outer and inner.counters["x"] == 1 and not outer.counters["x"]
+    finally:
+        profiling.disable()
+
+def test_node_without_attributes(ontology):
+    tree = create_tree_from_obo(ontology[0])
+    # an edge toward an unknown parent creates a bare node
+    tree.add_edge("GO:9999999", "GO:0000001", type="is_a")
+    with profiling.profiled() as stats:
+        tree.get_go_node("GO:9999999")
+    assert stats.counters["get_go_node"] == 1 and not stats.counters["alias_forwards"]
+
+def test_logging_hook(caplog):
+    with caplog.at_level(logging.INFO, logger="obogo"):
+        with profiling.profiled(hook=profiling.logging_hook()):
+            profiling.STATS.add_time("stage", 0.5)
+    assert "stage done in 0.5000s" in caplog.text
@@ -0,0 +1,55 @@
+import math, random
+import pytest
+
+from obogo.proteins import ProteinIndex, ProteinSet, ProteinRef
+from obogo.statistics import score_ora_tree
+from conftest import ids
+
+@pytest.fixture(scope="module")
+def index():
+    index = ProteinIndex()
+    for i in range(3000):
+        index.register(ProteinRef(f"P{i:05d}"))
+    return index
+
+# sizes on both sides of the sparse / dense (1/32 of the index) threshold
+@pytest.mark.parametrize("size_a, size_b", [ (0, 3), (5, 80), (50, 2000), (200, 0), (1500, 80), (2900, 2000) ])
+def test_protein_set_matches_set(index, size_a, size_b):
+    rng  = random.Random(size_a * 7 + size_b)
+    a, b = set(rng.sample(index.data, size_a)), set(rng.sample(index.data, size_b))
+    A, B = ProteinSet(index, a), ProteinSet(index, b)
+    assert ids(A | B) == ids(a | b) and ids(A & B) == ids(a & b) and ids(A - B) == ids(a - b)
+    assert ids(A.union(B, b)) == ids(a | b) and ids(A | b) == ids(b | A) == ids(a | b)
+    assert len(A) == len(a) and bool(A) == bool(a)
+    for p in rng.sample(index.data, 20):
+        assert (p in A) == (p in a) and (p.id in A) == (p in a)
+
+    C = A.copy()
+    C |= B
+    assert ids(C) == ids(a | b) and ids(A) == ids(a)
+    kept = list(a)[ len(a) // 2: ]
+    for p in list(a)[ :len(a) // 2 ]:
+        C.discard(p)
+    assert ids(C) == ids(set(kept) | (b - a))
+
+    D = ProteinSet(index)
+    for p in a:
+        D.add(p)
+    assert D == A
+    assert ProteinSet(index, bits=A.bits) == A and ProteinSet(index, positions=A.positions) == A
+
+def test_protein_set_storage(index):
+    sparse = ProteinSet(index, index.data[:10])
+    dense  = ProteinSet(index, index.data[::2])
+    assert not sparse.dense and dense.dense
+    assert list(sparse.positions) == list(range(10)) and list(dense.positions) == list(range(0, 3000, 2))
+    # back to positions well below the threshold
+    assert not (dense - ProteinSet(index, index.data[:2950])).dense
+
+def test_compact_scores_match_sets(build, proteins):
+    sets, compact = build(), build(compact=True)
+    assert isinstance(compact.uniprot_omega[0], ProteinSet)
+    sample = proteins[:25]
+    expected, scores = list(score_ora_tree(sets, sample)), list(score_ora_tree(compact, sample))
+    assert [ s[:3] + (s[5],) for s in scores ] == [ e[:3] + (e[5],) for e in expected ]
+    assert all( math.isclose(s[4], e[4]) for s, e in zip(scores, expected) )
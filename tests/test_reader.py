@@ -0,0 +1,29 @@
+import pytest
+
+from obogo import namespace_trees
+from obogo.statistics import score_ora_tree
+from benchmarks.synthetic import NAMESPACES
+from test_percolate import percolated, naive_percolation
+
+@pytest.mark.parametrize("filter", [ "ns", "root", "subset" ])
+def test_filtered_read(build, ontology, filter):
+    tree = build(**{ "ns" : dict(ns="biological_process"), "root" : dict(root="GO:0000001"),
+                     "subset" : dict(subset=ontology[1][::4]) }[filter])
+    roots = { n['_id'] for n in tree.concrete_nodes() if not any(True for _ in tree.predecessors(n['_id'])) }
+    assert tree.root_ids and tree.root_ids == roots
+    assert len(tree.uniprot_omega[0])
+    assert percolated(tree, "background") == naive_percolation(tree, "background")
+    # a table with a non empty complement, summing up to the whole population
+    scores = list(score_ora_tree(tree, [ p.id for p in tree.uniprot_omega[0] ][:20]))
+    assert any( s22 > 0 for *_, [ _, ( _, s22 ) ] in scores )
+    assert all( sum(map(sum, table)) == len(tree.uniprot_omega[0]) for *_, table in scores )
+
+def test_namespace_filter(build):
+    tree = build(ns="molecular_function")
+    assert { n['namespace'] for n in tree.concrete_nodes() } == { "molecular_function" }
+
+def test_namespace_trees(ontology):
+    trees = namespace_trees(ontology[0])
+    assert set(trees) == set(NAMESPACES)
+    for namespace, tree in trees.items():
+        assert len(tree.root_ids) == 1 and { n['namespace'] for n in tree.concrete_nodes() } == { namespace }
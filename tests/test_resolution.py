@@ -0,0 +1,45 @@
+import pytest
+
+from obogo import create_tree_from_obo
+
+@pytest.fixture
+def tree(ontology):
+    return create_tree_from_obo(ontology[0])
+
+def obsolete_ids(tree, forward:str)->list[str]:
+    return [ node_id for node_id, n in tree.nodes.items() if n.get('is_obsolete') and forward in n ]
+
+def test_resolution_table(tree):
+    for n in tree.concrete_nodes():
+        assert tree.get_go_node(n['_id']) is n and tree.get_go_node(n['name']) is n
+    aliases = [ node_id for node_id, n in tree.nodes.items() if 'alias_to' in n ]
+    assert aliases and all( tree.get_go_node(node_id) is tree.nodes[node_id]['alias_to'] for node_id in aliases )
+    for node_id in obsolete_ids(tree, 'replaced_by'):
+        assert tree.get_go_node(node_id) is tree.nodes[ tree.nodes[node_id]['replaced_by'] ]
+    with pytest.raises(KeyError):
+        tree.get_go_node("GO:9999999")
+    with pytest.raises(KeyError):
+        tree.get_go_node("not a term name")
+
+def test_consider_warns_once(tree, capsys):
+    node_id = obsolete_ids(tree, 'consider')[0]
+    assert tree.get_go_node(node_id) is None and tree.get_go_node(node_id) is None
+    assert capsys.readouterr().err.count(node_id) == 1 and tree.obsolete_warnings[node_id] == 2
+    considered = tree.get_go_node(node_id, many_to_consider=True)
+    assert [ n['_id'] for n in considered ] == tree.nodes[node_id]['consider']
+    tree.get_go_node(node_id, warn=False)
+    assert not capsys.readouterr().err and tree.obsolete_warnings[node_id] == 2
+
+def test_resolution_reset_on_mutation(tree):
+    tree.get_go_node("GO:0000001")
+    tree.add_node("GO:9999999", _id="GO:9999999", name="added")
+    assert tree.get_go_node("GO:9999999")['name'] == "added"
+
+def test_resolve_many(tree, capsys):
+    replaced, considered = obsolete_ids(tree, 'replaced_by')[0], obsolete_ids(tree, 'consider')[0]
+    node_ids = [ "GO:0000001", tree.nodes["GO:0000002"]['name'], replaced, considered, "GO:9999999" ]
+    resolved = tree.resolve_many(node_ids, warn=False)
+    assert list(resolved) == node_ids[:4] and resolved[considered] is None
+    assert all( resolved[node_id] is tree.get_go_node(node_id) for node_id in node_ids[:3] )
+    assert [ n['_id'] for n in tree.resolve_many([ considered ], many_to_consider=True)[considered] ] == tree.nodes[considered]['consider']
+    assert not capsys.readouterr().err
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import numpy as np
+
+from obogo.service import OraService, ResultCache, sample_key
+from obogo.statistics import score_ora_table
+
+def test_sample_key(proteins):
+    sample = [ p.id for p in proteins[:10] ]
+    assert sample_key(sample) == sample_key(sample[::-1] + sample[:3]) == sample_key(proteins[:10])
+    assert sample_key(sample) != sample_key(sample[1:])
+
+def test_result_cache_lru_bytes():
+    cache = ResultCache(max_bytes=100)
+    cache.put("a", 1, size=40)
+    cache.put("b", 2, size=40)
+    assert cache.get("a") == 1 # a is now the most recently used
+    cache.put("c", 3, size=40)
+    assert not "b" in cache and "a" in cache and "c" in cache and cache.n_bytes == 80
+    cache.put("a", 4, size=70)
+    assert list(cache._entries) == [ "a" ] and cache.n_bytes == 70
+    cache.put("big", 5, size=101)
+    assert not "big" in cache and cache.n_bytes == 70
+    assert cache.get("b") is None and (cache.hits, cache.misses) == (1, 1)
+    cache.discard_if(lambda k: k == "a")
+    assert not len(cache) and cache.n_bytes == 0
+
+def test_result_cache_pickled_size():
+    cache = ResultCache(max_bytes=1 << 20)
+    cache.put("a", np.zeros(1000))
+    assert 8000 < cache.n_bytes < 9000
+
+def test_coalescing_and_cache(build, proteins):
+    tree   = build()
+    sample = [ p.id for p in proteins[:30] ]
+    async def run():
+        async with OraService(tree) as service:
+            tables = await asyncio.gather(*[ service.score_ora_table(sample[::-1] if i % 2 else sample) for i in range(4) ])
+            assert service.computed == 1 and service.coalesced == 3
+            cached = await service.score_ora_table(sample)
+            assert service.computed == 1 and service.cache.hits == 1 and cached is tables[0]
+            # other parameters are other requests
+            await service.score_ora_table(sample, alternative="greater")
+            assert service.computed == 2
+            return tables
+    tables = asyncio.run(run())
+    expected = score_ora_table(tree, sample)
+    assert all( t is tables[0] for t in tables ) and list(tables[0].go_id) == list(expected.go_id)
+
+def test_version_bump_invalidates(build, proteins):
+    tree   = build(n_background=150)
+    sample = [ p.id for p in proteins[:30] ]
+    async def run():
+        async with OraService(tree) as service:
+            before = await service.score_ora_table(sample)
+            tree.add_proteins("background", proteins[150:])
+            after  = await service.score_ora_table(sample)
+            assert service.computed == 2 and len(service.cache) == 1
+            return before, after
+    before, after = asyncio.run(run())
+    assert (after.s22 == score_ora_table(tree, sample).s22).all() and (before.s22 != after.s22).any()
+
+def test_cancelled_caller(build, proteins):
+    tree    = build()
+    sample  = [ p.id for p in proteins[:30] ]
+    release = threading.Event()
+    async def run():
+        async with OraService(tree) as service:
+            first = asyncio.ensure_future(service._submit(("blocked",), frozenset(sample), lambda: release.wait(5) and "done"))
+            await asyncio.sleep(0)
+            second = asyncio.ensure_future(service._submit(("blocked",), frozenset(sample), lambda: "other"))
+            await asyncio.sleep(0)
+            first.cancel()
+            release.set()
+            assert await second == "done" and service.coalesced == 1
+    asyncio.run(run())
+
+def test_cache_disabled(build, proteins):
+    async def run():
+        async with OraService(build(), max_cache_bytes=0) as service:
+            await service.compute_node_ora(proteins[:30], "GO:0000001")
+            await service.compute_node_ora(proteins[:30], "GO:0000001")
+            assert service.computed == 2 and not len(service.cache)
+    asyncio.run(run())
@@ -0,0 +1,74 @@
+import zipfile
+import numpy as np
+import pytest
+
+from obogo import save_tree, load_tree, load_population, create_tree_from_obo
+from obogo.snapshot import read_snapshot
+from obogo.statistics import ORA_error, score_ora_samples, score_population
+from conftest import ids
+
+POPULATIONS = ("background", "measured", "perc_background", "perc_measured")
+
+@pytest.fixture
+def snapshot(build, tmp_path):
+    tree = build()
+    file_path = str(tmp_path / "tree.npz")
+    save_tree(tree, file_path)
+    return tree, file_path
+
+@pytest.mark.parametrize("mmap", [ True, False ])
+@pytest.mark.parametrize("compact", [ False, True ])
+def test_load_tree_round_trip(snapshot, mmap, compact):
+    tree, file_path = snapshot
+    loaded = load_tree(file_path, mmap=mmap, compact=compact)
+    assert loaded.compact == compact and set(loaded.nodes) == set(tree.nodes)
+    assert set(loaded.edges(data="type")) == set(tree.edges(data="type"))
+    for node_id, n in tree.nodes.items():
+        for k in POPULATIONS:
+            assert ids(loaded.nodes[node_id].get(k, ())) == ids(n.get(k, ()))
+    assert loaded.ora_rdy and ids(loaded.uniprot_omega[1]) == ids(tree.uniprot_omega[1])
+
+def test_read_snapshot_mmap(snapshot):
+    _, file_path = snapshot
+    mapped, read = read_snapshot(file_path), read_snapshot(file_path, mmap=False)
+    assert set(mapped) == set(read)
+    assert any( isinstance(a, np.memmap) for a in mapped.values() )
+    for k, a in read.items():
+        assert mapped[k].dtype == a.dtype and np.array_equal(mapped[k], a)
+
+def test_read_snapshot_local_extra_field(snapshot, tmp_path):
+    """ member data is located from the local header, whatever its extra field """
+    _, file_path = snapshot
+    padded = str(tmp_path / "padded.npz")
+    with zipfile.ZipFile(file_path) as src, zipfile.ZipFile(padded, "w", zipfile.ZIP_STORED) as dst:
+        for info in src.infolist():
+            info.extra = b"\xfe\xca\x05\x00extra"
+            dst.writestr(info, src.read(info))
+    expected = read_snapshot(file_path, mmap=False)
+    for k, a in read_snapshot(padded).items():
+        assert np.array_equal(a, expected[k])
+
+def test_read_snapshot_compressed(tmp_path):
+    file_path = str(tmp_path / "compressed.npz")
+    np.savez_compressed(file_path, a=np.arange(10))
+    with pytest.raises(ValueError):
+        read_snapshot(file_path)
+    assert np.array_equal(read_snapshot(file_path, mmap=False)["a"], np.arange(10))
+
+@pytest.mark.parametrize("norm", [ "background", "measured" ])
+def test_load_population(snapshot, proteins, norm):
+    tree, file_path = snapshot
+    samples = [ proteins[:30], proteins[40:60] ]
+    nodes, M, columns = load_population(file_path, norm)
+    assert [ n['_id'] for n in nodes ] == [ n['_id'] for n in tree.concrete_nodes() ]
+    expected, batch = score_ora_samples(tree, samples, norm), score_population(nodes, M, columns, samples)
+    assert np.array_equal(batch.s11, expected.s11) and np.array_equal(batch.s22, expected.s22)
+    assert np.allclose(batch.p_values, expected.p_values, equal_nan=True)
+
+def test_load_population_not_ready(ontology, proteins, tmp_path):
+    tree = create_tree_from_obo(ontology[0])
+    tree.load_proteins("background", proteins)
+    file_path = str(tmp_path / "tree.npz")
+    save_tree(tree, file_path)
+    with pytest.raises(ORA_error):
+        load_population(file_path)
@@ -0,0 +1,52 @@
+import math
+import pytest
+import numpy as np
+import scipy.stats as stats
+
+from obogo.statistics import score_ora_tree, score_ora_table, score_ora_samples, adjust_pvalues, ora_table_iter
+
+def assert_same_scores(expected:list[tuple], scores:list[tuple]):
+    """ same terms and contingency tables, p-values and odds ratios up to float rounding """
+    assert [ s[0] for s in scores ] == [ e[0] for e in expected ]
+    for s, e in zip(scores, expected):
+        assert s[2] == e[2] and s[5] == e[5]
+        assert s[3] == e[3] or ( math.isnan(s[3]) and math.isnan(e[3]) ) or math.isclose(s[3], e[3])
+        assert math.isclose(s[4], e[4], rel_tol=1e-9, abs_tol=1e-12)
+
+@pytest.mark.parametrize("compact", [ False, True ])
+@pytest.mark.parametrize("norm", [ "background", "measured" ])
+def test_vectorized_matches_serial(build, proteins, compact, norm):
+    tree   = build(compact)
+    sample = [ p.id for p in proteins[10:40] ]
+    serial = list(score_ora_tree(tree, sample, norm))
+    assert serial
+    table  = score_ora_table(tree, sample, norm)
+    assert_same_scores(serial, list(ora_table_iter(table)))
+    assert_same_scores(serial, list(score_ora_tree(tree, sample, norm, vectorized=True)))
+    assert (table.s11 + table.s12 + table.s21 + table.s22 == len(tree.uniprot_omega[0 if norm == "background" else 1])).all()
+
+@pytest.mark.parametrize("alternative", [ "greater", "less" ])
+def test_vectorized_alternatives(build, proteins, alternative):
+    table = score_ora_table(build(), proteins[:30], alternative=alternative)
+    for r in table:
+        _, p_value = stats.fisher_exact([ (r.s11, r.s12), (r.s21, r.s22) ], alternative=alternative)
+        assert math.isclose(r.p_value, p_value, rel_tol=1e-9, abs_tol=1e-12)
+
+def test_batch_matches_single_samples(build, proteins):
+    tree    = build()
+    samples = [ proteins[:30], [ p.id for p in proteins[50:60] ], [] ]
+    batch   = score_ora_samples(tree, samples, correction="bh")
+    assert len(batch) == 3 and batch.go_ids == [ n['_id'] for n in tree.concrete_nodes() ]
+    for i, sample in enumerate(samples):
+        table = score_ora_table(tree, sample)
+        assert_same_scores(list(ora_table_iter(table)), list(ora_table_iter(batch.table(i))))
+    assert not len(batch.table(2)) and np.isnan(batch.p_values[2]).all()
+
+def test_adjust_pvalues():
+    p = np.array([ 0.01, np.nan, 0.04, 0.03, 0.5 ])
+    bh = adjust_pvalues(p, "bh")
+    assert np.isnan(bh[1])
+    assert np.allclose(bh[ ~np.isnan(p) ], stats.false_discovery_control(p[ ~np.isnan(p) ]))
+    assert np.allclose(adjust_pvalues(p, "bonferroni")[ ~np.isnan(p) ], [ 0.04, 0.16, 0.12, 1.0 ])
+    with pytest.raises(ValueError):
+        adjust_pvalues(p, "holm")
@@ -0,0 +1,34 @@
+import networkx as nx
+
+from benchmarks.synthetic import NAMESPACES, make_obo, make_proteins, synthetic_accession
+from obogo import create_tree_from_obo
+from obogo.tree import GO_tree
+from conftest import N_TERMS
+
+def test_make_obo_seeded(tmp_path):
+    a, b, c = ( str(tmp_path / f"{name}.obo") for name in "abc" )
+    assert make_obo(a, n_terms=200, seed=3) == make_obo(b, n_terms=200, seed=3)
+    make_obo(c, n_terms=200, seed=4)
+    with open(a) as fa, open(b) as fb, open(c) as fc:
+        text = fa.read()
+        assert text == fb.read() and text != fc.read()
+
+def test_make_obo_tree(ontology):
+    obo_file_path, valid = ontology
+    tree = create_tree_from_obo(obo_file_path)
+    concrete = { n['_id'] : n for n in tree.concrete_nodes() }
+    assert set(valid) <= set(concrete) and not any( 'is_obsolete' in concrete[go_id] for go_id in valid )
+    obsolete = [ f"GO:{i:07d}" for i in range(1, N_TERMS + 1) if not f"GO:{i:07d}" in concrete ]
+    assert obsolete and all( tree.nodes[go_id].get('is_obsolete') for go_id in obsolete )
+    assert all( 'replaced_by' in tree.nodes[go_id] or 'consider' in tree.nodes[go_id] for go_id in obsolete )
+    assert tree.root_ids == set(valid[:len(NAMESPACES)])
+    assert nx.is_directed_acyclic_graph(nx.DiGraph( list(super(GO_tree, tree).edges()) ))
+    assert any( n.get('alt_id') for n in concrete.values() )
+
+def test_make_proteins(ontology, proteins):
+    valid = set(ontology[1])
+    assert [ p.id for p in proteins ] == [ synthetic_accession(i) for i in range(len(proteins)) ]
+    assert len({ p.id for p in proteins }) == len(proteins)
+    assert all( 1 <= len(p.go) <= 8 and { go.id for go in p.go } <= valid for p in proteins )
+    again = make_proteins(ontology[1], n_proteins=len(proteins), seed=1)
+    assert [ [ go.id for go in p.go ] for p in again ] == [ [ go.id for go in p.go ] for p in proteins ]
@@ -0,0 +1,87 @@
+import contextlib, io, math
+import pytest
+import scipy.stats as stats
+
+from obogo import create_tree_from_obo
+from obogo.topology import score_ora_topology
+from obogo.statistics import score_ora_table
+from conftest import ids
+
+def populations(tree)->dict[str, set[str]]:
+    return { n['_id'] : ids(n.get("perc_background", ())) for n in tree.concrete_nodes() }
+
+def naive_elim(tree, sample:set[str], cutoff:float)->dict[str, tuple]:
+    """ (s11, p-value) of each term, proteins of significant terms being removed from all their ancestors """
+    genes, total = populations(tree), ids(tree.uniprot_omega[0])
+    n, results, removed = len(sample & total), {}, {}
+    def visit(node_id):
+        if node_id in results:
+            return
+        removed[node_id] = set()
+        for child_id in tree.successors(node_id):
+            if child_id in genes:
+                visit(child_id)
+                removed[node_id] |= removed[child_id]
+                if results[child_id][1] < cutoff:
+                    removed[node_id] |= genes[child_id] - removed[child_id]
+        effective = genes[node_id] - removed[node_id]
+        s11 = len(effective & sample)
+        table = [ (s11, n - s11), (len(effective) - s11, len(total) - n - len(effective) + s11) ]
+        results[node_id] = (s11, stats.fisher_exact(table, alternative="greater")[1])
+    for node_id in genes:
+        visit(node_id)
+    return results
+
+@pytest.fixture(scope="module")
+def scored(ontology, proteins):
+    with contextlib.redirect_stderr(io.StringIO()):
+        tree = create_tree_from_obo(ontology[0])
+        tree.load_proteins("background", proteins)
+        tree.load_proteins("measured", proteins[:100])
+        tree.percolate()
+    # a sample concentrated on a subtree, so that some terms are significant
+    leaf   = max(populations(tree).items(), key=lambda kv: len(kv[1]) if not any(True for _ in tree.successors(kv[0])) else 0)[0]
+    parent = next(iter(tree.predecessors(leaf)))
+    sample = sorted(populations(tree)[parent])[:30]
+    return tree, sample
+
+@pytest.mark.parametrize("cutoff", [ 0.05, 1e-3 ])
+def test_elim_matches_naive(scored, cutoff):
+    tree, sample = scored
+    expected = naive_elim(tree, set(sample), cutoff)
+    table    = score_ora_topology(tree, sample, "elim", cutoff=cutoff)
+    assert (table.p_value < cutoff).any()
+    for r in table:
+        assert r.s11 == expected[r.go_id][0]
+        assert math.isclose(r.p_value, expected[r.go_id][1], rel_tol=1e-9, abs_tol=1e-12)
+
+def test_elim_without_significant_terms(scored):
+    tree, sample = scored
+    plain, table = score_ora_table(tree, sample, alternative="greater"), score_ora_topology(tree, sample, "elim", cutoff=0)
+    assert list(table.go_id) == list(plain.go_id) and (table.s11 == plain.s11).all() and (table.s22 == plain.s22).all()
+
+def test_parent_child(scored):
+    tree, sample = scored
+    genes, total = populations(tree), ids(tree.uniprot_omega[0])
+    for r in score_ora_topology(tree, sample, "parent_child"):
+        parents  = [ parent_id for parent_id in tree.predecessors(r.go_id) if parent_id in genes ]
+        universe = set().union( *[ genes[parent_id] for parent_id in parents ] ) if parents else total
+        assert r.s11 == len(genes[r.go_id] & set(sample)) and r.s11 + r.s12 == len(universe & set(sample))
+        assert r.s11 + r.s12 + r.s21 + r.s22 == len(universe)
+
+def test_weight_single_pass(scored):
+    tree, sample = scored
+    plain = { r.go_id : r for r in score_ora_table(tree, sample, alternative="greater") }
+    table = score_ora_topology(tree, sample, "weight_single_pass")
+    assert list(table.go_id) == list(plain)
+    genes = populations(tree)
+    for r in table:
+        # weights never exceed 1, leaves keep their plain test
+        assert r.s11 <= plain[r.go_id].s11 and r.s11 + r.s21 <= plain[r.go_id].s11 + plain[r.go_id].s21
+        if not any( child_id in genes for child_id in tree.successors(r.go_id) ):
+            assert r.s11 == plain[r.go_id].s11 and math.isclose(r.p_value, plain[r.go_id].p_value, rel_tol=1e-9)
+    assert any( r.s11 < plain[r.go_id].s11 for r in table )
+
+def test_unknown_algorithm(scored):
+    with pytest.raises(ValueError):
+        score_ora_topology(*scored, algorithm="weight")